@@ -16,12 +16,12 @@ sys.path.append('..')
 
 from etl.connectors.nwea import NWEAAssessmentConnector
 from etl.connectors._base import FileConnector
-from etl.transformers.column_transformers import JSONColumnNormalizer
 from etl.exporters._base import FileExporter
 from etl.pipelines._base import ETLPipeline
 from etl.transformers.dataframe_transformers import (
     DuplicateValueTransformer,
     ColumnNameTransformer,
+    MultiJSONFlattener,
 )
 from etl.validators.column_validators import (
     ColumnNameValidator,
@@ -47,90 +47,80 @@ connector = NWEAAssessmentConnector(
 )
 
 # Transformation steps for ETL pipeline
-json_1 = JSONColumnNormalizer(
-    col="lexile",
-    new_col_names=None,
-    drop_original_col=True,
-    col_mapping={
-        "score": "LEXILE_SCORE",
-        "min": "LEXILE_MIN",
-        "max": "LEXILE_MAX",
-        "range": "LEXILE_RANGE",
-    },
-    explode_col=False,
-    missing_cols_mapping={
-        "LEXILE_SCORE": None,
-        "LEXILE_MIN": None,
-        "LEXILE_MAX": None,
-        "LEXILE_RANGE": None,
-    },
-)
-
-json_2 = JSONColumnNormalizer(
-    col="instructionalAreas",
-    drop_original_col=True,
-    new_col_names=[
-        "INSTRUCTIONAL_AREA_BID",
-        "INSTRUCTIONAL_AREA_NAME",
-        "INSTRUCTIONAL_AREA_SCORE",
-        "INSTRUCTIONAL_AREA_STD_ERR",
-        "INSTRUCTIONAL_AREA_LOW",
-        "INSTRUCTIONAL_AREA_HIGH",
-    ],
-    explode_col=True,
-    missing_cols_mapping={
-        "INSTRUCTIONAL_AREA_BID": np.nan,
-        "INSTRUCTIONAL_AREA_NAME": None,
-        "INSTRUCTIONAL_AREA_SCORE": np.nan,
-        "INSTRUCTIONAL_AREA_STD_ERR": np.nan,
-        "INSTRUCTIONAL_AREA_LOW": np.nan,
-        "INSTRUCTIONAL_AREA_HIGH": np.nan,
-    },
-)
-
-json_3 = JSONColumnNormalizer(
-    col="quantile",
-    new_col_names=None,
-    drop_original_col=True,
-    col_mapping={
-        "score": "QUANTILE_SCORE",
-        "minimum": "QUANTILE_MIN",
-        "maximum": "QUANTILE_MAX",
-        "range": "QUANTILE_RANGE",
-        "original": "QUANTILE_ORIGINAL",
-    },
-)
-
-json_4 = JSONColumnNormalizer(
-    col="norms",
-    new_col_names=[
-        "NORMS_PERCENTILE",
-        "NORMS_REFERENCE",
-        "NORMS_TYPE",
-    ],
-    drop_original_col=True,
-    explode_col=True,
-    missing_cols_mapping={
-        "NORMS_PERCENTILE": np.nan,
-        "NORMS_REFERENCE": None,
-        "NORMS_TYPE": None,
-    },
-)
-
-json_5 = JSONColumnNormalizer(
-    col="items",
-    new_col_names=None,
-    drop_original_col=True,
-    col_mapping={
-        "shown": "ITEMS_SHOWN",
-        "correct": "ITEMS_CORRECT",
-        "total": "ITEMS_TOTAL",
-    },
-    explode_col=False,
-    missing_cols_mapping={
-        "ITEMS_SHOWN": np.nan,
-        "ITEMS_CORRECT": np.nan,
-        "ITEMS_TOTAL": np.nan,
+# every json column is flattened in one pass over the records, the lists are
+# written to child tables instead of multiplying the test results by norms x
+# instructional areas.  They're keyed by the columns the results are deduped
+# on, so the child rows of a dropped duplicate are dropped with it
+json_flattener = MultiJSONFlattener(
+    key=["testResultBid", "modifiedDateTime"],
+    specs={
+        "lexile": {
+            "col_mapping": {
+                "score": "LEXILE_SCORE",
+                "min": "LEXILE_MIN",
+                "max": "LEXILE_MAX",
+                "range": "LEXILE_RANGE",
+            },
+            "missing_cols_mapping": {
+                "LEXILE_SCORE": None,
+                "LEXILE_MIN": None,
+                "LEXILE_MAX": None,
+                "LEXILE_RANGE": None,
+            },
+        },
+        "instructionalAreas": {
+            "col_mapping": {
+                "instructionalAreaBid": "INSTRUCTIONAL_AREA_BID",
+                "instructionalAreaName": "INSTRUCTIONAL_AREA_NAME",
+                "score": "INSTRUCTIONAL_AREA_SCORE",
+                "standardError": "INSTRUCTIONAL_AREA_STD_ERR",
+                "scoreLow": "INSTRUCTIONAL_AREA_LOW",
+                "scoreHigh": "INSTRUCTIONAL_AREA_HIGH",
+            },
+            "missing_cols_mapping": {
+                "INSTRUCTIONAL_AREA_BID": np.nan,
+                "INSTRUCTIONAL_AREA_NAME": None,
+                "INSTRUCTIONAL_AREA_SCORE": np.nan,
+                "INSTRUCTIONAL_AREA_STD_ERR": np.nan,
+                "INSTRUCTIONAL_AREA_LOW": np.nan,
+                "INSTRUCTIONAL_AREA_HIGH": np.nan,
+            },
+            "child_table": "INSTRUCTIONAL_AREAS",
+        },
+        "quantile": {
+            "col_mapping": {
+                "score": "QUANTILE_SCORE",
+                "minimum": "QUANTILE_MIN",
+                "maximum": "QUANTILE_MAX",
+                "range": "QUANTILE_RANGE",
+                "original": "QUANTILE_ORIGINAL",
+            },
+        },
+        "norms": {
+            "col_mapping": {
+                "percentile": "NORMS_PERCENTILE",
+                "reference": "NORMS_REFERENCE",
+                "type": "NORMS_TYPE",
+            },
+            "missing_cols_mapping": {
+                "NORMS_PERCENTILE": np.nan,
+                "NORMS_REFERENCE": None,
+                "NORMS_TYPE": None,
+            },
+            "child_table": "NORMS",
+        },
+        "items": {
+            "col_mapping": {
+                "shown": "ITEMS_SHOWN",
+                "correct": "ITEMS_CORRECT",
+                "total": "ITEMS_TOTAL",
+            },
+            "missing_cols_mapping": {
+                "ITEMS_SHOWN": np.nan,
+                "ITEMS_CORRECT": np.nan,
+                "ITEMS_TOTAL": np.nan,
+            },
+        },
     },
 )
 
@@ -182,7 +172,7 @@ name_transformer = ColumnNameTransformer(
 )
 
 dupe_transformer = DuplicateValueTransformer(
-    subset=["testResultBid", "modifiedDateTime", "INSTRUCTIONAL_AREA_BID"],
+    subset=["testResultBid", "modifiedDateTime"],
 )
 
 # validators for ETL pipeline
@@ -212,18 +202,11 @@ name_validator = ColumnNameValidator(
         "ITEMS_SHOWN",
         "ITEMS_CORRECT",
         "ITEMS_TOTAL",
-        "NORMS_PERCENTILE",
         "QUANTILE_SCORE",
         "QUANTILE_MAX",
         "QUANTILE_MIN",
         "QUANTILE_RANGE",
         "QUANTILE_ORIGINAL",
-        "INSTRUCTIONAL_AREA_BID",
-        "INSTRUCTIONAL_AREA_NAME",
-        "INSTRUCTIONAL_AREA_SCORE",
-        "INSTRUCTIONAL_AREA_STD_ERR",
-        "INSTRUCTIONAL_AREA_LOW",
-        "INSTRUCTIONAL_AREA_HIGH",
         "LEXILE_SCORE",
         "LEXILE_MIN",
         "LEXILE_MAX",
@@ -234,7 +217,7 @@ name_validator = ColumnNameValidator(
 )
 
 dupe_validator = DuplicateValueValidator(
-    subset=["TEST_RESULT_BID", "MODIFIED_DATE_TIME", "INSTRUCTIONAL_AREA_BID"],
+    subset=["TEST_RESULT_BID", "MODIFIED_DATE_TIME"],
 )
 
 # Exporter for ETL pipeline
@@ -245,11 +228,7 @@ if __name__ == "__main__":
     pipe = ETLPipeline(
         connector=connector,
         transformers=[
-            json_1,
-            json_2,
-            json_3,
-            json_4,
-            json_5,
+            json_flattener,
             dupe_transformer,
             name_transformer,
         ],
@@ -0,0 +1,351 @@
+"""
+Token managers that cache API access tokens until they expire.
+
+Tokens are kept in memory and in a lock-protected file on disk, so every
+thread and every worker process in a pool share one token instead of each
+re-authenticating.  Tokens are refreshed shortly before they expire, and a
+401 only triggers a refresh if the token that failed is still the current
+one, so many concurrent 401s cause a single refresh.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - windows has no fcntl
+    fcntl = None
+
+from etl.connectors._http import session_pool
+
+
+TOKEN_CACHE_DIR = os.environ.get(
+    "ETL_TOKEN_CACHE_DIR", os.path.join(tempfile.gettempdir(), "etl_tokens")
+)
+
+
+class _BaseTokenManager(metaclass=ABCMeta):
+    """Base class for token managers"""
+
+    def __init__(
+        self,
+        cache_path: str = None,
+        refresh_margin: int = 300,
+        default_ttl: int = 3600,
+    ):
+        """Initialize the class
+        Args:
+            cache_path (str): Path of the file the token is shared through,
+                if None the token is only cached in memory
+            refresh_margin (int): # of seconds before expiry to refresh the token
+            default_ttl (int): # of seconds a token lives if the API doesn't say
+        """
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self.num_refreshes_ = 0
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.RLock()
+
+    @abstractmethod
+    def _request_token(self) -> tuple:
+        """Request a new token from the API
+
+        Returns:
+            tuple: (token, # of seconds until the token expires or None)
+        """
+        pass
+
+    def get_token(self):
+        """Get a valid token, only requesting a new one if the cached token
+        is missing or about to expire
+
+        Returns:
+            Token, the type depends on the API
+        """
+        if self._is_fresh(self._expires_at):
+            return self._token
+
+        with self._lock:
+            # another thread may have refreshed the token while we waited
+            if self._is_fresh(self._expires_at):
+                return self._token
+
+            with self._file_lock():
+                cached = self._read_cache()
+                if cached is not None and self._is_fresh(cached["expires_at"]):
+                    self._token = cached["token"]
+                    self._expires_at = cached["expires_at"]
+                    return self._token
+
+                token, expires_in = self._request_token()
+                self.num_refreshes_ += 1
+                if expires_in is None:
+                    expires_in = self.default_ttl
+
+                self._token = token
+                self._expires_at = time.time() + float(expires_in)
+                self._write_cache()
+
+            return self._token
+
+    def invalidate(self, token) -> None:
+        """Mark a token as rejected by the API, ie after a 401
+
+        Only the token that failed is invalidated, so if another thread or
+        process has already refreshed it the new token is kept.
+
+        Args:
+            token: Token that was rejected
+        """
+        with self._lock:
+            with self._file_lock():
+                if self._token == token:
+                    self._expires_at = 0.0
+
+                cached = self._read_cache()
+                if cached is not None and cached["token"] == token:
+                    self._expires_at = 0.0
+                    self._write_cache()
+
+    def _is_fresh(self, expires_at: float) -> bool:
+        """Check if a token expiring at expires_at can still be used"""
+        return time.time() < expires_at - self.refresh_margin
+
+    @contextmanager
+    def _file_lock(self):
+        """Lock the cache file, so only one process refreshes the token"""
+        if self.cache_path is None or fcntl is None:
+            yield
+            return
+
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(f"{self.cache_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_cache(self):
+        """Read the token shared by other processes
+
+        Returns:
+            dict: token and expires_at, or None if there is no usable cache
+        """
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return None
+
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            logging.warning(f"Could not read token cache {self.cache_path}: {e}")
+            return None
+
+    def _write_cache(self) -> None:
+        """Share the current token with other processes"""
+        if self.cache_path is None:
+            return
+
+        # tokens are credentials, so only the current user can read them
+        tmp_path = f"{self.cache_path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"token": self._token, "expires_at": self._expires_at}, f)
+        os.replace(tmp_path, self.cache_path)
+
+
+def _default_cache_path(name: str, *secrets) -> str:
+    """Build a cache file path that's unique to a set of credentials"""
+    digest = hashlib.sha256("|".join(str(s) for s in secrets).encode()).hexdigest()
+    return os.path.join(TOKEN_CACHE_DIR, f"{name}_{digest[:16]}.json")
+
+
+class NWEATokenManager(_BaseTokenManager):
+    """Token manager for the NWEA API
+
+    Example Usage
+    -------------
+        >>> token_manager = NWEATokenManager()
+        >>> headers = token_manager.get_headers()
+        >>> resp = session_pool.get(url, headers=headers)
+        >>> if resp.status_code == 401:
+        >>>     token_manager.invalidate_headers(headers)
+        >>>     headers = token_manager.get_headers()
+    """
+
+    def __init__(
+        self,
+        token_url: str = "https://api.nwea.org/auth/v1/token",
+        grant_type: str = "client_credentials",
+        auth_code: str = None,
+        api_key: str = None,
+        cache_path: str = None,
+        refresh_margin: int = 300,
+    ):
+        """Initialize the class
+        Args:
+            token_url (str): URL to connect for authentication
+            grant_type (str): Type of grant to use for authentication
+            auth_code (str): NWEA auth code, defaults to the NWEA_AUTH env variable
+            api_key (str): NWEA api key, defaults to the NWEA_API env variable
+            cache_path (str): Path of the file the token is shared through
+            refresh_margin (int): # of seconds before expiry to refresh the token
+        """
+        self.token_url = token_url
+        self.grant_type = grant_type
+        self.auth_code = auth_code if auth_code is not None else os.environ.get("NWEA_AUTH")
+        self.api_key = api_key if api_key is not None else os.environ.get("NWEA_API")
+
+        if cache_path is None:
+            cache_path = _default_cache_path("nwea", token_url, self.auth_code, self.api_key)
+
+        super().__init__(cache_path, refresh_margin)
+
+    def _request_token(self) -> tuple:
+        """Request a new access token from the NWEA API"""
+        token_headers = {
+            "Authorization": self.auth_code,
+            "apikey": self.api_key,
+            "grant_type": self.grant_type,
+            "Content-Length": "0",
+        }
+
+        resp_json = session_pool.post(self.token_url, headers=token_headers).json()
+
+        return resp_json["access_token"], resp_json.get("expires_in")
+
+    def get_headers(self) -> dict:
+        """Get the headers to connect to the NWEA API with a valid token
+
+        Returns:
+            dict: API headers
+        """
+        return {
+            "Content/Type": "application/json",
+            "apikey": self.api_key,
+            "Authorization": f"Bearer {self.get_token()}",
+        }
+
+    def invalidate_headers(self, headers: dict) -> None:
+        """Invalidate the token in a set of headers that got a 401
+
+        Args:
+            headers (dict): API headers that were rejected
+        """
+        self.invalidate(headers["Authorization"].replace("Bearer ", "", 1))
+
+
+class ClassLinkTokenManager(_BaseTokenManager):
+    """Token manager for the bearer tokens of every ClassLink district
+
+    The token is a list of dicts with each district's bearer and
+    oneroster_application_id.
+    """
+
+    def __init__(
+        self,
+        bearer: str,
+        url: str = "https://oneroster-proxy.classlink.io/applications",
+        cache_path: str = None,
+        default_ttl: int = 3600,
+    ):
+        """Initialize the class
+        Args:
+            bearer (str): ClassLink bearer token used to list the districts
+            url (str): URL to list the districts' applications
+            cache_path (str): Path of the file the tokens are shared through
+            default_ttl (int): # of seconds to keep the district tokens
+        """
+        self.bearer = bearer
+        self.url = url
+
+        if cache_path is None:
+            cache_path = _default_cache_path("classlink", url, bearer)
+
+        super().__init__(cache_path, refresh_margin=0, default_ttl=default_ttl)
+
+    def _request_token(self) -> tuple:
+        """Request every district's bearer token from ClassLink"""
+        resp = session_pool.get(self.url, headers={"Authorization": f"Bearer {self.bearer}"})
+        resp.raise_for_status()
+
+        tokens = [
+            {
+                "bearer": application["bearer"],
+                "oneroster_application_id": application["oneroster_application_id"],
+            }
+            for application in resp.json()["applications"]
+        ]
+
+        return tokens, None
+
+
+class CleverTokenManager(_BaseTokenManager):
+    """Token manager for the access tokens of every Clever district
+
+    The token is a list of each district's access token.
+    """
+
+    def __init__(
+        self,
+        bearer: str,
+        url: str = "https://clever.com/oauth/tokens",
+        cache_path: str = None,
+        default_ttl: int = 3600,
+    ):
+        """Initialize the class
+        Args:
+            bearer (str): Clever basic auth credentials used to list the districts
+            url (str): URL to list the districts' tokens
+            cache_path (str): Path of the file the tokens are shared through
+            default_ttl (int): # of seconds to keep the district tokens
+        """
+        self.bearer = bearer
+        self.url = url
+
+        if cache_path is None:
+            cache_path = _default_cache_path("clever", url, bearer)
+
+        super().__init__(cache_path, refresh_margin=0, default_ttl=default_ttl)
+
+    def _request_token(self) -> tuple:
+        """Request every district's access token from Clever"""
+        resp = session_pool.get(self.url, headers={"Authorization": f"Basic {self.bearer}"})
+        if resp.status_code != 200:
+            raise Exception(
+                f"Failed to retrieve districts keys. Status code: {resp.status_code}, "
+                f"Response: {resp.text}"
+            )
+
+        return [district["access_token"] for district in resp.json()["data"]], None
+
+
+@lru_cache(maxsize=None)
+def get_nwea_token_manager(
+    token_url: str = "https://api.nwea.org/auth/v1/token",
+    grant_type: str = "client_credentials",
+    auth_code: str = None,
+    api_key: str = None,
+) -> NWEATokenManager:
+    """Get the NWEA token manager shared by the whole process
+
+    Args:
+        token_url (str): URL to connect for authentication
+        grant_type (str): Type of grant to use for authentication
+        auth_code (str): NWEA auth code, defaults to the NWEA_AUTH env variable
+        api_key (str): NWEA api key, defaults to the NWEA_API env variable
+
+    Returns:
+        NWEATokenManager: Token manager for the credentials
+    """
+    return NWEATokenManager(token_url, grant_type, auth_code, api_key)
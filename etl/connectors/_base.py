@@ -1,14 +1,23 @@
 """
 Contains base classes for connectors to external systems:  API's, databases, etc.
 """
-import time
+import asyncio
+import contextvars
+import json
 import os
 import logging
+import queue
+import threading
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
 import pandas as pd
 
+from etl.connectors._http import session_pool
+from etl.connectors._json import get_decoder
+from etl.connectors._retry import RetryPolicy, retry_policy as shared_retry_policy
+
 
 class _BaseConnector(metaclass=ABCMeta):
     """Base class for all connectors"""
@@ -44,7 +53,9 @@ class _BaseAPIConnector(_BaseConnector):
         params: dict = None,
         headers: dict = None,
         retry_https_codes: list = [],
-        return_data = True
+        return_data = True,
+        retry_policy: RetryPolicy = None,
+        json_decoder: str = None,
     ):
         """Initialize the class
         Args:
@@ -53,6 +64,10 @@ class _BaseAPIConnector(_BaseConnector):
             headers (dict): Headers to pass to the API
             retry_https_codes (list): api status codes that will invoke another api request
             return_data (bool): Whether or not to return the data from pull_data()
+            retry_policy (RetryPolicy): Backoff, retry budget and circuit breaker
+                used for every request, defaults to the policy shared by the process
+            json_decoder (str): JSON decoder for responses, one of auto, orjson,
+                ujson or stdlib, defaults to the ETL_JSON_DECODER env variable
         """
 
         super().__init__(return_data)
@@ -61,6 +76,8 @@ class _BaseAPIConnector(_BaseConnector):
         self.params = params
         self.headers = headers
         self.retry_https_codes = retry_https_codes
+        self.retry_policy = retry_policy if retry_policy is not None else shared_retry_policy
+        self.json_decoder = get_decoder(json_decoder)
 
     @abstractmethod
     def _validate_response(self):
@@ -87,6 +104,61 @@ class _BaseAPIConnector(_BaseConnector):
         """Filter the data from API response"""
         pass
 
+    @abstractmethod
+    def iter_pages(self):
+        """Iterate over the API's responses one page at a time
+
+        Yields:
+            dict: JSON response of each page
+        """
+        pass
+
+    def iter_record_batches(self, batch_size: int = 1000):
+        """Iterate over the API's records in dataframes of batch_size rows,
+        so only one batch of records is held in memory at a time
+
+        Args:
+            batch_size (int): # of records in each batch, the last may be smaller
+
+        Yields:
+            pd.DataFrame: Batch of records
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1: {batch_size}")
+
+        records = []
+        for page in self.iter_pages():
+            records.extend(self._get_page_records(page))
+
+            while len(records) >= batch_size:
+                yield self._format_records(records[:batch_size])
+                records = records[batch_size:]
+
+        if records:
+            yield self._format_records(records)
+
+    def _get_page_records(self, page: dict) -> list:
+        """Get the records from a page of the API response
+
+        Args:
+            page (dict): JSON response of a page
+
+        Returns:
+            list: Records on the page
+        """
+        return page
+
+    def _format_records(self, records: list) -> pd.DataFrame:
+        """Format records from the API into a dataframe
+
+        Args:
+            records (list): Records from the API
+
+        Returns:
+            pd.DataFrame: Formatted records
+        """
+        return pd.DataFrame(records)
+
     def _connect(self) -> None:
         """Private method to connect to the API
 
@@ -94,46 +166,203 @@ class _BaseAPIConnector(_BaseConnector):
             None
         """
         self._authenticate()
-        self.req = requests.get(self.url, params=self.params, headers=self.headers)
+        self.req = self.retry_policy.get(
+            self.url,
+            retry_statuses=self.retry_https_codes,
+            params=self.params,
+            headers=self.headers,
+        )
+
+# (semaphore, executor) of the _run_async() call a task belongs to
+_async_run_state = contextvars.ContextVar("async_run_state")
 
-    def _recursive_api_connect(
+
+class _BaseAsyncAPIConnector(_BaseAPIConnector):
+    """Base class for API connectors that keep several requests in flight at once
+
+    Requests are still made with the blocking ``requests`` library, but each one
+    runs on a worker thread and is awaited from an asyncio event loop.  A
+    semaphore bounds the number of requests in flight, so many entities (ie,
+    school bids) can be paginated concurrently without flooding the API.
+    """
+
+    def __init__(
         self,
-        max_attempts: int = 5,
-        num_attempts: int = 0,
-        wait_time: int = 1,
-        time_added: int = 0,
-    ) -> None:
+        url: str,
+        params: dict = None,
+        headers: dict = None,
+        retry_https_codes: list = [],
+        return_data=True,
+        max_concurrency: int = 10,
+        retry_policy: RetryPolicy = None,
+        json_decoder: str = None,
+    ):
+        """Initialize the class
+        Args:
+            url (str): URL to connect to
+            params (dict): Parameters to pass to the API
+            headers (dict): Headers to pass to the API
+            retry_https_codes (list): api status codes that will invoke another api request
+            return_data (bool): Whether or not to return the data from pull_data()
+            max_concurrency (int): Max number of requests in flight at once
+            retry_policy (RetryPolicy): Backoff, retry budget and circuit breaker
+                used for every request, defaults to the policy shared by the process
+            json_decoder (str): JSON decoder for responses, one of auto, orjson,
+                ujson or stdlib, defaults to the ETL_JSON_DECODER env variable
+        """
+        super().__init__(
+            url,
+            params,
+            headers,
+            retry_https_codes,
+            return_data,
+            retry_policy,
+            json_decoder,
+        )
+
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1: {max_concurrency}")
+
+        self.max_concurrency = max_concurrency
+
+    async def _async_get(
+        self, url: str, params: dict = None, headers: dict = None
+    ) -> requests.Response:
+        """Make a GET request without blocking the event loop, retries and
+        their backoff happen on the worker thread
+
+        Args:
+            url (str): URL to connect to
+            params (dict): Parameters to pass to the API
+            headers (dict): Headers to pass to the API
+
+        Returns:
+            requests.Response: Response from the API
         """
-        Repeatedly try to connect to an API if there is a connection issue
-        w/ recursion
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            return await loop.run_in_executor(
+                self._executor,
+                lambda: self.retry_policy.get(
+                    url,
+                    retry_statuses=self.retry_https_codes,
+                    params=params,
+                    headers=headers,
+                ),
+            )
+
+    async def _run_async(self, coros: list, max_concurrency: int = None):
+        """Run coroutines concurrently, yielding their results as they complete
+
+        The semaphore and thread pool are created here because asyncio
+        primitives are bound to the event loop that is running them.
 
         Args:
-            max_attempts (int): # of times to try and connect
-            num_attempts (int): counter for current # of tries, should stay at 1
-            wait_time (int): how long to wait inbetween connections
-            time_added (int): additional time to add between each attempt
+            coros (list): Coroutines to run
+            max_concurrency (int): Max number of requests in flight, defaults
+                to self.max_concurrency
+
+        Yields:
+            Result of each coroutine, in completion order
+        """
+        max_concurrency = (
+            max_concurrency if max_concurrency is not None else self.max_concurrency
+        )
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1: {max_concurrency}")
+
+        # every thread keeps a connection to the API open
+        session_pool.reserve(self.url, max_concurrency)
+        executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        # tasks copy the context they're created in, so concurrent runs on
+        # the same connector each keep their own semaphore and threads
+        _async_run_state.set((asyncio.Semaphore(max_concurrency), executor))
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # only reached early if the caller stops consuming results
+            for task in tasks:
+                task.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _iter_async(self, results, name: str = None, max_queued: int = None):
+        """Iterate over an async iterator from synchronous code
+
+        The iterator runs on an event loop in a background thread, so its
+        requests stay in flight while the caller works on the results that
+        have already arrived.  At most max_queued results wait for the
+        caller, after that the iterator waits too, so a slow caller doesn't
+        have every page buffered in memory.
+
+        Args:
+            results: Async iterator, ie from an async generator method
+            name (str): Name of the background thread
+            max_queued (int): # of results waiting for the caller at most,
+                defaults to max_concurrency
+
+        Yields:
+            Each result of the async iterator
         """
-        # updates stopping criteria for recursion
-        wait_time += time_added
-        num_attempts += 1
-
-        print(f"Attempt #{num_attempts} to connect to API")
-        if num_attempts >= max_attempts:
-            # won't be used, just here to make sure the recursion stops
-            return None
-
-        logging.info(
-            f"""Waiting {wait_time} seconds to reconnect to the API due
-                     to {self.req.status_code} status code"""
+        queued = queue.Queue(maxsize=max_queued or self.max_concurrency)
+        finished = object()
+        stopped = threading.Event()
+
+        def put(item) -> None:
+            """Wait for room in the queue, unless the caller has stopped"""
+            while not stopped.is_set():
+                try:
+                    queued.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        async def produce():
+            loop = asyncio.get_running_loop()
+            async for result in results:
+                if stopped.is_set():
+                    break
+                # waits on a thread, so requests in flight carry on meanwhile
+                await loop.run_in_executor(None, put, result)
+
+        def run():
+            try:
+                asyncio.run(produce())
+            except Exception as e:
+                put(e)
+            finally:
+                put(finished)
+
+        thread = threading.Thread(
+            target=run, name=name or f"{type(self).__name__}-async", daemon=True
         )
-        time.sleep(wait_time)
+        thread.start()
 
-        self._connect()
+        try:
+            while True:
+                result = queued.get()
+                if result is finished:
+                    break
+                if isinstance(result, Exception):
+                    raise result
+
+                yield result
+
+        finally:
+            # the caller stopped early, the loop cancels the remaining requests
+            stopped.set()
+
+    @property
+    def _semaphore(self) -> asyncio.Semaphore:
+        """Semaphore bounding the requests in flight for the current run"""
+        return _async_run_state.get()[0]
+
+    @property
+    def _executor(self) -> ThreadPoolExecutor:
+        """Threads the requests of the current run are made on"""
+        return _async_run_state.get()[1]
 
-        if self.req.status_code in self.retry_https_codes:
-            self._recursive_api_connect(wait_time=wait_time, 
-                                        time_added=time_added,
-                                        num_attempts=num_attempts)
 
 class FileConnector(_BaseConnector):
     """Loads data from a file
@@ -148,17 +377,53 @@ class FileConnector(_BaseConnector):
         >>> connector.pulled_data_
             PARENT_BID MAX(MODIFIED_DATETIME)
             0 00000000-0000-0000-0000-000000000000 2020-12-15 13:09:00
+
+        # columnar files only read the columns that are asked for
+        >>> connector = FileConnector(
+        >>>     method = 'parquet',
+        >>>     file_path = 'data/results.parquet',
+        >>>     columns = ['STUDENT_BID', 'TEST_DATE'])
+
+        # large files can be read a chunk at a time
+        >>> for chunk in connector.pull_chunks(chunksize = 100000):
+        >>>     ...
     """
 
-    def __init__(self, method: str, file_path: str, return_data = False):
+    methods = ["pandas", "raw", "json", "parquet", "feather", "ipc"]
+
+    extensions = {
+        "pandas": [".csv", ".txt", ".json"],
+        "raw": [".csv", ".txt", ".json"],
+        "json": [".csv", ".txt", ".json", ".jsonl"],
+        "parquet": [".parquet", ".pq"],
+        "feather": [".feather"],
+        "ipc": [".arrow", ".ipc"],
+    }
+
+    def __init__(
+        self,
+        method: str,
+        file_path: str,
+        return_data = False,
+        columns: list = None,
+        memory_map: bool = True,
+    ):
         """Initialize the class
         Args:
-            method (str): method to use to load the data, one of (pandas, raw, json)
+            method (str): method to use to load the data, one of (pandas, raw,
+                json, parquet, feather, ipc)
             file_path (str): Path to the file to load
+            return_data (bool): Whether or not to return the data from pull_data()
+            columns (list): Columns to load, None for all of them.  Parquet,
+                Feather and Arrow IPC files skip reading the other columns
+            memory_map (bool): Whether to memory map Feather and Arrow IPC
+                files, so only the pages that are used are read from disk
         """
         super().__init__(return_data)
         self.method = method
         self.file_path = file_path
+        self.columns = columns
+        self.memory_map = memory_map
 
     def _connect(self) -> None:
         """Private method to connect to the file
@@ -172,29 +437,72 @@ class FileConnector(_BaseConnector):
     def pull_data(self, **load_kwargs) -> None:
         """Pull the data from the file
         Args:
-            **load_kwargs: Keyword arguments to pass to the pandas read_csv function
+            **load_kwargs: Keyword arguments to pass to the pandas read function
         Returns:
             None
         """
+        self._validate_method()
         self._validate_file_path()
         self._load_file(**load_kwargs)
 
         if self.return_data:
             return self.pulled_data_
 
+    def pull_chunks(self, chunksize: int = 100000, **load_kwargs):
+        """Pull the data from the file a chunk at a time, so only one chunk
+        is held in memory
+
+        Args:
+            chunksize (int): # of rows in each chunk, the last may be smaller
+            **load_kwargs: Keyword arguments to pass to the pandas read function
+
+        Yields:
+            pandas.DataFrame: Chunk of the file
+        """
+        self._validate_method()
+        self._validate_file_path()
+
+        if chunksize < 1:
+            raise ValueError(f"chunksize must be at least 1: {chunksize}")
+
+        if self.method == "pandas":
+            yield from pd.read_csv(
+                self.file_path, chunksize=chunksize, usecols=self.columns, **load_kwargs
+            )
+
+        elif self.method == "json":
+            # only JSON lines can be split into chunks
+            yield from pd.read_json(
+                self.file_path, lines=True, chunksize=chunksize, **load_kwargs
+            )
+
+        elif self.method == "parquet":
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(self.file_path, memory_map=self.memory_map)
+            for batch in parquet_file.iter_batches(
+                batch_size=chunksize, columns=self.columns
+            ):
+                yield batch.to_pandas()
+
+        elif self.method in ["feather", "ipc"]:
+            table = self._read_arrow_table()
+            for batch in table.to_batches(max_chunksize=chunksize):
+                yield batch.to_pandas()
+
+        else:
+            raise ValueError(f"Can't read {self.method} files in chunks")
+
     def _load_file(self, **load_kwargs) -> None:
         """Load the data from the file
         Args:
             file_path (str): Path to the file to load
-            **load_kwargs: Keyword arguments to pass to the pandas read_csv function
+            **load_kwargs: Keyword arguments to pass to the pandas read function
         Returns:
             None
         """
 
-        if self.method not in ["pandas", "raw", "json"]:
-            raise ValueError(
-                f"Invalid method: {self.method}, must be one of pandas, raw, json"
-            )
+        self._validate_method()
 
         if self.method == "pandas":
             self._load_pandas(**load_kwargs)
@@ -202,6 +510,12 @@ class FileConnector(_BaseConnector):
         elif self.method == "json":
             self._load_json()
 
+        elif self.method == "parquet":
+            self._load_parquet(**load_kwargs)
+
+        elif self.method in ["feather", "ipc"]:
+            self._load_arrow()
+
         else:
             self._load_raw()
 
@@ -213,9 +527,55 @@ class FileConnector(_BaseConnector):
         Returns:
             pandas.DataFrame: DataFrame containing the loaded data
         """
+        if self.columns is not None:
+            load_kwargs.setdefault("usecols", self.columns)
 
         self.pulled_data_ = pd.read_csv(self.file_path, **load_kwargs)
 
+    def _load_parquet(self, **load_kwargs) -> pd.DataFrame:
+        """Load the columns asked for from a Parquet file
+        Args:
+            **load_kwargs: Keyword arguments to pass to the pandas read_parquet function
+
+        Returns:
+            pandas.DataFrame: DataFrame containing the loaded data
+        """
+        self.pulled_data_ = pd.read_parquet(
+            self.file_path, columns=self.columns, **load_kwargs
+        )
+
+    def _load_arrow(self) -> pd.DataFrame:
+        """Load the columns asked for from a Feather or Arrow IPC file
+
+        Returns:
+            pandas.DataFrame: DataFrame containing the loaded data
+        """
+        self.pulled_data_ = self._read_arrow_table().to_pandas()
+
+    def _read_arrow_table(self) -> "pyarrow.Table":
+        """Read a Feather or Arrow IPC file, memory mapped so the columns
+        that aren't asked for are never read from disk
+
+        Returns:
+            pyarrow.Table: Table with the columns asked for
+        """
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        if self.method == "feather":
+            return feather.read_table(
+                self.file_path, columns=self.columns, memory_map=self.memory_map
+            )
+
+        file_path = os.fspath(self.file_path)
+        source = pa.memory_map(file_path) if self.memory_map else pa.OSFile(file_path)
+        table = pa.ipc.open_file(source).read_all()
+
+        if self.columns is not None:
+            table = table.select(self.columns)
+
+        return table
+
     def _load_raw(self) -> str:
         """Load the data as raw text
         Returns:
@@ -234,6 +594,13 @@ class FileConnector(_BaseConnector):
         with open(self.file_path, "r") as f:
             self.pulled_data_ = json.load(f)
 
+    def _validate_method(self) -> None:
+        """Validate the method"""
+        if self.method not in self.methods:
+            raise ValueError(
+                f"Invalid method: {self.method}, must be one of {', '.join(self.methods)}"
+            )
+
     def _validate_file_path(self) -> None:
         """Validate the file path"""
         if not self.file_path:
@@ -251,21 +618,78 @@ class FileConnector(_BaseConnector):
         if os.path.getsize(self.file_path) == 0:
             raise ValueError(f"File is empty: {self.file_path}")
 
-        if not os.path.splitext(self.file_path)[1] in [".csv", '.txt', '.json']:
-            raise ValueError(f"File is not a CSV, TXT, or JSON: {self.file_path}")
+        extensions = self.extensions.get(self.method, [])
+        if not os.path.splitext(self.file_path)[1] in extensions:
+            raise ValueError(
+                f"File is not one of {', '.join(extensions)}: {self.file_path}"
+            )
         
 class _DatabaseConnector(_BaseConnector):
-    """Base class for all database Connectors"""
+    """Base class for all database Connectors
 
-    def __init__(self, connection_string: str, return_data = False):
+    Engines, and their connection pools, are shared by every connector in the
+    process with the same connection string, so queries don't pay for
+    setting up a new engine each time.
+
+    Example Usage
+    -------------
+        >>> connector = OracleDatabaseConnector(connection_string)
+        >>> connector.load("SELECT * FROM cutoffs")
+        >>> connector.data_
+
+        # stream a large result set with a server-side cursor
+        >>> for chunk in connector.load_chunks("SELECT * FROM roster", chunksize = 50000):
+        >>>     ...
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        return_data = False,
+        engine_kwargs: dict = None,
+        arraysize: int = 10000,
+        prefetchrows: int = 10000,
+    ):
         """Initialize the class
         Args:
             connection_string (str): Connection string to use to connect to the database
             return_data (bool): Whether or not to return the data from pull_data()
+            engine_kwargs (dict): Keyword arguments to pass to create_engine,
+                ie pool_size, only used by the first connector with the
+                connection string
+            arraysize (int): # of rows fetched from the database per round
+                trip when streaming with load_chunks()
+            prefetchrows (int): # of rows returned with the query's first
+                round trip when streaming, for drivers that support it
         """
 
         super().__init__(return_data)
         self.connection_string = connection_string
+        self.engine_kwargs = engine_kwargs if engine_kwargs is not None else {}
+        self.arraysize = arraysize
+        self.prefetchrows = prefetchrows
+
+    def _connect(self) -> "sqlalchemy.engine.base.Engine":
+        """Private method to connect to the database
+
+        Returns:
+            sqlalchemy.engine.base.Engine: Engine shared by the process
+        """
+        self.engine_ = self._get_connection()
+        return self.engine_
+
+    def pull_data(self, query: str, **load_kwargs) -> pd.DataFrame:
+        """Pull the data for a query from the database
+        Args:
+            query (str): Query to run against the database
+            **load_kwargs: Keyword arguments to pass to the pandas read_sql function
+        Returns:
+            pd.DataFrame: Data, if return_data is True
+        """
+        self.load(query, **load_kwargs)
+
+        if self.return_data:
+            return self.data_
 
     def load(self, query: str, **load_kwargs) -> None:
         """Load the data from the database
@@ -280,6 +704,32 @@ class _DatabaseConnector(_BaseConnector):
 
         self.data_ = pd.read_sql(query, self._get_connection(), **load_kwargs)
 
+    def load_chunks(self, query: str, chunksize: int = 50000, **load_kwargs):
+        """Stream the results of a query with a server-side cursor, so only
+        one chunk of rows is held in memory at a time
+
+        Args:
+            query (str): Query to run against the database
+            chunksize (int): # of rows in each chunk, the last may be smaller
+            **load_kwargs: Keyword arguments to pass to the pandas read_sql function
+
+        Yields:
+            pd.DataFrame: Chunk of the results
+        """
+        self._validate_query(query)
+
+        if chunksize < 1:
+            raise ValueError(f"chunksize must be at least 1: {chunksize}")
+
+        with self._get_connection().connect() as connection:
+            connection = connection.execution_options(
+                stream_results=True,
+                max_row_buffer=max(chunksize, self.arraysize),
+                arraysize=self.arraysize,
+                prefetchrows=self.prefetchrows,
+            )
+            yield from pd.read_sql(query, connection, chunksize=chunksize, **load_kwargs)
+
     def _validate_query(self, query: str) -> None:
         """Validate the query
         Args:
@@ -302,6 +752,46 @@ class _DatabaseConnector(_BaseConnector):
         Returns:
             sqlalchemy.engine.base.Engine: Connection to the database
         """
-        from sqlalchemy import create_engine
+        return _get_engine(self.connection_string, **self.engine_kwargs)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _get_engine(connection_string: str, **engine_kwargs) -> "sqlalchemy.engine.base.Engine":
+    """Get the engine for a connection string, creating it the first time
+
+    Args:
+        connection_string (str): Connection string to use to connect to the database
+        **engine_kwargs: Keyword arguments to pass to create_engine
+
+    Returns:
+        sqlalchemy.engine.base.Engine: Engine shared by the process
+    """
+    from sqlalchemy import create_engine, event
+
+    with _engines_lock:
+        engine, pid = _engines.get(connection_string, (None, None))
+
+        if engine is not None and pid != os.getpid():
+            # a forked worker process can't share its parent's connections
+            engine.dispose(close=False)
+            engine = None
+
+        if engine is None:
+            engine = create_engine(connection_string, **engine_kwargs)
+            event.listen(engine, "before_cursor_execute", _set_cursor_fetch_sizes)
+            _engines[connection_string] = (engine, os.getpid())
+
+        return engine
+
+
+def _set_cursor_fetch_sizes(conn, cursor, statement, parameters, context, executemany):
+    """Apply the arraysize and prefetchrows execution options to the cursor
+    before the query runs, drivers without prefetchrows ignore it"""
+    options = context.execution_options if context is not None else {}
 
-        return create_engine(self.connection_string)
+    for option in ["arraysize", "prefetchrows"]:
+        if option in options and hasattr(cursor, option):
+            setattr(cursor, option, options[option])
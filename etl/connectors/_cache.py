@@ -0,0 +1,253 @@
+"""
+On-disk cache of API responses shared by every connector and script.
+
+Responses are keyed by URL, params and tenant.  Bodies are stored gzipped
+under the hash of their content, so pages that come back unchanged are only
+stored once.  In "revalidate" mode cached pages are re-requested with
+``If-None-Match`` / ``If-Modified-Since``, and a 304 is answered from the
+cache instead of downloading the page again.  In "replay" mode runs are
+served entirely from the cache, so transformations and benchmarks can be
+re-run offline.
+
+The cache is off unless ETL_HTTP_CACHE_MODE is set to revalidate or replay.
+"""
+import os
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+HTTP_CACHE_DIR = os.environ.get(
+    "ETL_HTTP_CACHE_DIR", os.path.join(tempfile.gettempdir(), "etl_http_cache")
+)
+HTTP_CACHE_MODE = os.environ.get("ETL_HTTP_CACHE_MODE", "off")
+
+# only these headers are needed to rebuild a response from the cache
+_STORED_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+
+class CacheMissError(requests.exceptions.RequestException):
+    """Raised in replay mode for a request that isn't in the cache"""
+
+
+class ResponseCache:
+    """Content-addressed cache of GET responses
+
+    Example Usage
+    -------------
+        >>> cache = ResponseCache(cache_dir="data/http_cache", mode="revalidate")
+        >>> resp = cache.request(session_pool, "GET", url, tenant=district, headers=headers)
+        >>> cache.stats()
+        {'hits': 0, 'not_modified': 120, 'misses': 4, 'stored': 4}
+    """
+
+    modes = ["off", "revalidate", "replay"]
+
+    def __init__(self, cache_dir: str = HTTP_CACHE_DIR, mode: str = "revalidate"):
+        """Initialize the class
+        Args:
+            cache_dir (str): Directory the responses are stored in
+            mode (str): one of off, revalidate (ask the server if cached
+                responses changed) or replay (never call the server)
+        """
+        if mode not in self.modes:
+            raise ValueError(f"Invalid mode: {mode}, must be one of {', '.join(self.modes)}")
+
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self._stats = {"hits": 0, "not_modified": 0, "misses": 0, "stored": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether responses are read from and written to the cache"""
+        return self.mode != "off"
+
+    def request(
+        self, session, method: str, url: str, tenant: str = None, **kwargs
+    ) -> requests.Response:
+        """Make a request through the cache
+
+        Only successful GET requests are cached, anything else is passed
+        straight to the session.
+
+        Args:
+            session: Session or session pool to make the request with
+            method (str): HTTP method, ie GET or POST
+            url (str): URL to connect to
+            tenant (str): Tenant the request is made for, part of the cache key
+            **kwargs: Keyword arguments to pass to requests, ie params, headers
+
+        Returns:
+            requests.Response: Response from the server or the cache
+        """
+        if not self.enabled or method.upper() != "GET":
+            return session.request(method, url, **kwargs)
+
+        key = self.make_key(url, kwargs.get("params"), tenant)
+        entry = self._read_entry(key)
+
+        if self.mode == "replay":
+            if entry is None:
+                self._count("misses")
+                raise CacheMissError(f"{url} is not in the response cache")
+            self._count("hits")
+            return self._build_response(url, entry)
+
+        if entry is not None:
+            kwargs["headers"] = self._add_validators(kwargs.get("headers"), entry)
+
+        resp = session.request(method, url, **kwargs)
+
+        if resp.status_code == 304 and entry is not None:
+            self._count("not_modified")
+            return self._build_response(url, entry)
+
+        self._count("misses")
+        if resp.status_code == 200:
+            self._write_entry(key, url, resp)
+
+        return resp
+
+    @staticmethod
+    def make_key(url: str, params: dict = None, tenant: str = None) -> str:
+        """Build the cache key for a request
+
+        Args:
+            url (str): URL of the request
+            params (dict): Parameters of the request
+            tenant (str): Tenant the request is made for
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+        params = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        key = json.dumps([url, params, tenant])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def stats(self) -> dict:
+        """Count cache hits, 304s answered from the cache, misses and stores"""
+        with self._lock:
+            return dict(self._stats)
+
+    def log_stats(self) -> None:
+        """Log how many responses came from the cache"""
+        if self.enabled:
+            logging.info(f"Response cache ({self.mode}): {self.stats()}")
+
+    def _count(self, stat: str) -> None:
+        """Increment a stat"""
+        with self._lock:
+            self._stats[stat] += 1
+
+    @staticmethod
+    def _add_validators(headers: dict, entry: dict) -> dict:
+        """Add conditional request headers for a cached response"""
+        headers = dict(headers or {})
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        return headers
+
+    def _build_response(self, url: str, entry: dict) -> requests.Response:
+        """Rebuild a response from a cache entry"""
+        with gzip.open(self._body_path(entry["body"]), "rb") as f:
+            body = f.read()
+
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = url
+        resp.headers = CaseInsensitiveDict(entry["headers"])
+        resp.encoding = entry.get("encoding")
+        resp._content = body
+        resp.from_cache = True
+
+        return resp
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, "entries", key[:2], f"{key}.json")
+
+    def _body_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "bodies", digest[:2], f"{digest}.gz")
+
+    def _read_entry(self, key: str):
+        """Read the cache entry for a key
+
+        Returns:
+            dict: Cache entry, or None if there isn't a usable one
+        """
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (ValueError, OSError) as e:
+            logging.warning(f"Could not read response cache entry {path}: {e}")
+            return None
+
+        if not os.path.exists(self._body_path(entry["body"])):
+            return None
+
+        return entry
+
+    def _write_entry(self, key: str, url: str, resp: requests.Response) -> None:
+        """Store a response's body, if it's new, and point the key's entry at it"""
+        body = resp.content
+        digest = hashlib.sha256(body).hexdigest()
+
+        body_path = self._body_path(digest)
+        if not os.path.exists(body_path):
+            self._write_atomic(body_path, gzip.compress(body))
+
+        entry = {
+            "url": url,
+            "body": digest,
+            "headers": {
+                name: resp.headers[name]
+                for name in _STORED_HEADERS
+                if name in resp.headers
+            },
+            "encoding": resp.encoding,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "stored_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._write_atomic(self._entry_path(key), json.dumps(entry).encode())
+        self._count("stored")
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        """Write a file so readers never see it half written
+
+        Responses can hold student data, so like the token cache only the
+        current user can read the files or list the directories.
+        """
+        missing = []
+        directory = os.path.dirname(path)
+        while directory and not os.path.isdir(directory):
+            missing.append(directory)
+            directory = os.path.dirname(directory)
+        for directory in reversed(missing):
+            # makedirs only gives the last directory its mode
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+# every connector and script in the process shares this cache
+response_cache = ResponseCache(mode=HTTP_CACHE_MODE)
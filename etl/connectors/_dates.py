@@ -0,0 +1,222 @@
+"""
+Date format detection shared by the connectors and validation.
+
+Dates from a source and field nearly always come in one layout, so instead
+of trying strptime, dateutil and pandas on every value, the layout is
+detected once from a small sample and cached by (source, field).  Values
+are then parsed with that format, and only the values it doesn't match go
+through the slow parsers.
+"""
+import logging
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+
+# most specific first, so '.%f' isn't skipped for a shorter format
+DATE_FORMATS = [
+    "%Y-%m-%dT%H:%M:%S.%f%z",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f%z",
+    "%Y-%m-%d %H:%M:%S%z",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y",
+    "%d-%m-%Y",
+    "%d-%b-%y",
+    "%Y%m%d",
+]
+
+
+def infer_date_format(sample: list, formats: list = None):
+    """Detect the format of date strings
+
+    Args:
+        sample (list): Date strings to detect the format of
+        formats (list): Candidate strptime formats, defaults to DATE_FORMATS
+
+    Returns:
+        str: Format that parses the most values, the first of them on a tie,
+            None if none parse any
+    """
+    formats = formats if formats is not None else DATE_FORMATS
+    sample = [value for value in sample if isinstance(value, str)]
+
+    best_format, best_count = None, 0
+    for date_format in formats:
+        count = 0
+        for value in sample:
+            try:
+                datetime.strptime(value, date_format)
+                count += 1
+            except ValueError:
+                pass
+
+        if count == len(sample):
+            return date_format if count else None
+        if count > best_count:
+            best_format, best_count = date_format, count
+
+    return best_format
+
+
+class DateFormatCache:
+    """Cache of the detected date format of each source and field
+
+    Example Usage
+    -------------
+        >>> date_formats = DateFormatCache()
+        >>> dates = date_formats.parse(data["modifiedDateTime"], "nwea", "modifiedDateTime")
+        >>> date_formats.get_format("nwea", "modifiedDateTime")
+        '%Y-%m-%dT%H:%M:%S.%f%z'
+    """
+
+    def __init__(self, sample_size: int = 20, formats: list = None):
+        """Initialize the class
+        Args:
+            sample_size (int): # of values the format is detected from
+            formats (list): Candidate strptime formats, defaults to DATE_FORMATS
+        """
+        self.sample_size = sample_size
+        self.formats = formats if formats is not None else DATE_FORMATS
+        self._formats = {}
+        self._lock = threading.Lock()
+
+    def get_format(self, source: str, field: str, values=None):
+        """Get the format of a source's field, detecting it from values the
+        first time
+
+        Args:
+            source (str): Where the dates come from, ie nwea
+            field (str): Field or column the dates are in
+            values (list | pd.Series): Values to detect the format from
+
+        Returns:
+            str: Cached format, None if it hasn't been detected
+        """
+        with self._lock:
+            date_format = self._formats.get((source, field))
+
+        if date_format is None and values is not None:
+            date_format = self._detect(source, field, values)
+
+        return date_format
+
+    def matches(self, value: str, source: str, field: str) -> bool:
+        """Whether a date string parses with its field's format, detecting
+        the format from it if there isn't one yet.  A value in another format
+        doesn't replace the cached one, it's left to the slower parsers
+
+        Args:
+            value (str): Date string
+            source (str): Where the date comes from
+            field (str): Field the date is in
+
+        Returns:
+            bool: True if the value is a date in a known format
+        """
+        date_format = self.get_format(source, field)
+        if date_format is None:
+            return self._detect(source, field, [value]) is not None
+
+        try:
+            datetime.strptime(value, date_format)
+            return True
+        except ValueError:
+            return False
+
+    def parse(self, values, source: str, field: str) -> pd.Series:
+        """Parse date strings with their field's format
+
+        Values the format doesn't match are parsed one by one with pandas,
+        and become NaT if that fails too.
+
+        Args:
+            values (list | pd.Series): Date strings or datetimes
+            source (str): Where the dates come from
+            field (str): Field or column the dates are in
+
+        Returns:
+            pd.Series: Parsed dates
+        """
+        values = values if isinstance(values, pd.Series) else pd.Series(values)
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+
+        date_format = self.get_format(source, field, values)
+        if date_format is not None:
+            parsed = pd.to_datetime(values, format=date_format, errors="coerce")
+        else:
+            parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+
+        failed = parsed.isna() & values.notna()
+        if failed.any():
+            if failed.mean() > 0.5 and date_format is not None:
+                # the source changed layout, detect it again next time
+                logging.warning(
+                    f"{failed.sum()} {source} {field} values don't match {date_format}"
+                )
+                with self._lock:
+                    self._formats.pop((source, field), None)
+
+            parsed = self._parse_slow(values, parsed, failed)
+
+        return parsed
+
+    def clear(self) -> None:
+        """Forget every detected format"""
+        with self._lock:
+            self._formats.clear()
+
+    def _detect(self, source: str, field: str, values):
+        """Detect and cache the format of a field from a sample of values"""
+        sample = []
+        for value in values:
+            if isinstance(value, str):
+                sample.append(value)
+                if len(sample) >= self.sample_size:
+                    break
+
+        date_format = infer_date_format(sample, self.formats)
+        if date_format is not None:
+            with self._lock:
+                self._formats[(source, field)] = date_format
+
+        return date_format
+
+    @staticmethod
+    def _parse_slow(values: pd.Series, parsed: pd.Series, failed: pd.Series) -> pd.Series:
+        """Parse the values the format didn't match one by one"""
+        try:
+            slow = pd.to_datetime(values[failed], format="mixed", errors="coerce")
+        except ValueError:
+            # values in several timezones can only be combined in UTC
+            slow = pd.to_datetime(values[failed], format="mixed", errors="coerce", utc=True)
+
+        # keep the timezone of the values parsed with the format
+        if parsed.dt.tz is not None and slow.dt.tz is None:
+            slow = slow.dt.tz_localize(parsed.dt.tz)
+        elif parsed.dt.tz is None and slow.dt.tz is not None:
+            if parsed.notna().any():
+                slow = slow.dt.tz_convert(None)
+            else:
+                parsed = parsed.dt.tz_localize(slow.dt.tz)
+
+        parsed = parsed.copy()
+        parsed[failed] = slow
+        return parsed
+
+
+def is_date_value(value) -> bool:
+    """Whether a value is already a date or datetime"""
+    return isinstance(value, (date, np.datetime64))
+
+
+# every connector in the process shares the detected formats
+date_formats = DateFormatCache()
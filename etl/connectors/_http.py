@@ -0,0 +1,188 @@
+"""
+Process-wide pool of HTTP sessions shared by every connector and script.
+
+Calling ``requests.get`` directly opens a new TCP + TLS connection for every
+request.  Going through the session pool instead keeps one keep-alive
+``requests.Session`` per host, so pagination loops and per-student fan-outs
+reuse warm connections.
+"""
+import os
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool:
+    """Keeps one keep-alive session, with its own connection pool, per host
+
+    Example Usage
+    -------------
+        >>> from etl.connectors._http import session_pool
+        >>> session_pool.configure(pool_sizes={"api.nwea.org": 20})
+        >>> resp = session_pool.get("https://api.nwea.org/students/v2/...", headers=headers)
+        >>> session_pool.stats()
+        {'api.nwea.org': {'requests': 100, 'new_connections': 4, 'reused_connections': 96}}
+    """
+
+    def __init__(self, pool_sizes: dict = None, default_pool_size: int = 10):
+        """Initialize the class
+        Args:
+            pool_sizes (dict): Mapping of host to the max # of connections kept open to it
+            default_pool_size (int): Max # of connections kept open to hosts not in pool_sizes
+        """
+        self.pool_sizes = pool_sizes if pool_sizes is not None else {}
+        self.default_pool_size = default_pool_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def configure(self, pool_sizes: dict = None, default_pool_size: int = None) -> None:
+        """Change the pool sizes, sessions that are already open are recreated
+
+        Args:
+            pool_sizes (dict): Mapping of host to the max # of connections kept open to it
+            default_pool_size (int): Max # of connections kept open to hosts not in pool_sizes
+        """
+        with self._lock:
+            if pool_sizes is not None:
+                self.pool_sizes.update(pool_sizes)
+            if default_pool_size is not None:
+                self.default_pool_size = default_pool_size
+            self._close_sessions()
+
+    def reserve(self, url: str, pool_size: int) -> None:
+        """Make sure the pool of a url's host keeps at least pool_size
+        connections open, so that many threads can reuse them at once.
+        Connections beyond the pool size are thrown away after every request
+
+        Args:
+            url (str): URL that will be requested
+            pool_size (int): # of connections that will be in use at once
+        """
+        host = urlsplit(url).netloc
+
+        with self._lock:
+            if self.pool_sizes.get(host, self.default_pool_size) >= pool_size:
+                return
+
+            self.pool_sizes[host] = pool_size
+            # recreated with the bigger pool on its next request
+            session = self._sessions.pop(host, None)
+            if session is not None:
+                session.close()
+
+    def get_session(self, url: str) -> requests.Session:
+        """Get the session for the host of a url, creating it if necessary
+
+        Args:
+            url (str): URL that will be requested
+
+        Returns:
+            requests.Session: Session for the url's host
+        """
+        host = urlsplit(url).netloc
+
+        with self._lock:
+            # a forked worker process can't share sockets with its parent,
+            # so it gets its own sessions
+            if os.getpid() != self._pid:
+                self._sessions = {}
+                self._pid = os.getpid()
+
+            if host not in self._sessions:
+                self._sessions[host] = self._create_session(host)
+
+            return self._sessions[host]
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Make a request through the session for the url's host
+
+        Args:
+            method (str): HTTP method, ie GET or POST
+            url (str): URL to connect to
+            **kwargs: Keyword arguments to pass to requests, ie params, headers
+
+        Returns:
+            requests.Response: Response from the server
+        """
+        return self.get_session(url).request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Make a GET request, same signature as requests.get"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Make a POST request, same signature as requests.post"""
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        """Count how often connections were reused versus newly opened
+
+        Returns:
+            dict: Mapping of host to its # of requests, new and reused connections
+        """
+        stats = {}
+        with self._lock:
+            for host, session in self._sessions.items():
+                num_requests = 0
+                num_connections = 0
+                # the same adapter is mounted for http and https
+                adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+                for adapter in adapters.values():
+                    pools = adapter.poolmanager.pools
+                    for key in pools.keys():
+                        num_requests += pools[key].num_requests
+                        num_connections += pools[key].num_connections
+
+                stats[host] = {
+                    "requests": num_requests,
+                    "new_connections": num_connections,
+                    "reused_connections": max(num_requests - num_connections, 0),
+                }
+
+        return stats
+
+    def log_stats(self) -> None:
+        """Log connection reuse for every host"""
+        for host, host_stats in self.stats().items():
+            logging.info(
+                f"{host}: {host_stats['requests']} requests, "
+                f"{host_stats['reused_connections']} on reused connections, "
+                f"{host_stats['new_connections']} new connections"
+            )
+
+    def close(self) -> None:
+        """Close every open session"""
+        with self._lock:
+            self._close_sessions()
+
+    def _create_session(self, host: str) -> requests.Session:
+        """Create a session whose connection pool is sized for the host
+
+        Args:
+            host (str): Host the session will connect to
+
+        Returns:
+            requests.Session: New session
+        """
+        pool_size = self.pool_sizes.get(host, self.default_pool_size)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+    def _close_sessions(self) -> None:
+        """Close every open session, caller must hold the lock"""
+        for session in self._sessions.values():
+            session.close()
+        self._sessions = {}
+
+
+# every fetch in the process goes through this pool
+session_pool = SessionPool()
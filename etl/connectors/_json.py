@@ -0,0 +1,193 @@
+"""
+JSON decoders for API responses.
+
+``resp.json()`` decodes the body to a str and parses it with the stdlib json
+module, which is a large share of the CPU time for 10,000-record pages.  The
+decoders here parse the raw bytes of the body, with orjson or ujson when one
+is installed and the stdlib otherwise.
+
+The decoder is picked with the ETL_JSON_DECODER environment variable or the
+json_decoder argument of the connectors:  auto (default), orjson, ujson or
+stdlib.
+
+Run ``python -m etl.connectors._json [page.json ...]`` to benchmark the
+installed decoders on saved pages, or on a generated ClassLink sized page.
+"""
+import os
+import json
+import time
+import logging
+
+
+JSON_DECODER = os.environ.get("ETL_JSON_DECODER", "auto")
+
+
+class _StdlibDecoder:
+    """Decoder using the json module from the standard library"""
+
+    name = "stdlib"
+
+    @staticmethod
+    def loads(data):
+        # json detects the encoding of bytes itself, but still decodes them
+        # to a str internally, only orjson parses the bytes directly
+        return json.loads(data)
+
+
+class _OrjsonDecoder:
+    """Decoder using orjson, which parses bytes directly"""
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self.loads = orjson.loads
+
+
+class _UjsonDecoder:
+    """Decoder using ujson"""
+
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+
+        self.loads = ujson.loads
+
+
+_DECODERS = {
+    "orjson": _OrjsonDecoder,
+    "ujson": _UjsonDecoder,
+    "stdlib": _StdlibDecoder,
+}
+
+# fastest first
+_AUTO_ORDER = ["orjson", "ujson", "stdlib"]
+
+
+def get_decoder(name: str = None):
+    """Get a JSON decoder by name
+
+    Args:
+        name (str): one of auto, orjson, ujson or stdlib, defaults to the
+            ETL_JSON_DECODER environment variable.  auto picks the fastest
+            decoder that's installed
+
+    Returns:
+        Decoder with a loads(bytes) method
+    """
+    name = name if name is not None else JSON_DECODER
+
+    if name == "auto":
+        for candidate in _AUTO_ORDER:
+            try:
+                return _DECODERS[candidate]()
+            except ImportError:
+                continue
+
+    if name not in _DECODERS:
+        raise ValueError(
+            f"Invalid JSON decoder: {name}, must be one of auto, {', '.join(_DECODERS)}"
+        )
+
+    try:
+        return _DECODERS[name]()
+    except ImportError:
+        logging.warning(f"{name} is not installed, decoding JSON with the stdlib")
+        return _StdlibDecoder()
+
+
+# decoder used when a connector or script doesn't pick one
+default_decoder = get_decoder()
+
+
+def decode_response(resp, decoder=None):
+    """Decode the JSON body of a response from its raw bytes
+
+    Args:
+        resp (requests.Response): Response to decode
+        decoder: Decoder from get_decoder(), defaults to the configured one
+
+    Returns:
+        Decoded JSON
+    """
+    decoder = decoder if decoder is not None else default_decoder
+    return decoder.loads(resp.content)
+
+
+def benchmark(pages: list, names: list = None, repeat: int = 5) -> dict:
+    """Time each installed decoder on pages of raw JSON
+
+    Args:
+        pages (list): Raw bytes of each page
+        names (list): Decoders to compare, defaults to every installed one
+        repeat (int): # of times to decode every page, the fastest run is kept
+
+    Returns:
+        dict: Mapping of decoder name to seconds per page
+    """
+    names = names if names is not None else list(_DECODERS)
+    results = {}
+
+    for name in names:
+        try:
+            decoder = _DECODERS[name]()
+        except ImportError:
+            continue
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for page in pages:
+                decoder.loads(page)
+            best = min(best, time.perf_counter() - start)
+
+        results[name] = best / len(pages)
+
+    return results
+
+
+def _make_sample_page(num_records: int = 10000) -> bytes:
+    """Generate a page shaped like a ClassLink classes response"""
+    classes = [
+        {
+            "sourcedId": f"class-{i}",
+            "status": "active",
+            "title": f"Algebra I - Period {i % 8}",
+            "dateLastModified": "2024-09-23T19:56:55.000Z",
+            "classCode": f"MATH-{i}",
+            "classType": "scheduled",
+            "location": "Room 101",
+            "grades": ["09", "10"],
+            "subjects": ["Mathematics"],
+            "subjectCodes": ["02052"],
+            "course": {"sourcedId": f"course-{i % 50}", "type": "course"},
+            "school": {"sourcedId": "school-1", "type": "org"},
+            "terms": [{"sourcedId": "term-1", "type": "academicSession"}],
+        }
+        for i in range(num_records)
+    ]
+    return json.dumps({"classes": classes}).encode()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        pages = []
+        for path in sys.argv[1:]:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+    else:
+        pages = [_make_sample_page()]
+
+    results = benchmark(pages)
+    baseline = results["stdlib"]
+    print(f"Decoded {len(pages)} page(s), {sum(map(len, pages)) / len(pages) / 1e6:.1f} MB each")
+    for name, seconds in sorted(results.items(), key=lambda item: item[1]):
+        print(
+            f"{name:>8}: {seconds * 1000:8.1f} ms/page, "
+            f"saves {(baseline - seconds) * 1000:8.1f} ms/page vs stdlib"
+        )
+
@@ -0,0 +1,211 @@
+"""
+Parallel fetching for APIs paginated with limit/offset, ie ClassLink OneRoster.
+
+Every offset is known before the first page comes back, so instead of
+waiting for each page before asking for the next one, several offsets are
+requested at once.  Pages are still handed back in order, and paging stops at
+the first short page.
+
+Cursor paginated results that are ordered newest first, ie NWEA's, can stop
+early with StalePageStopper once the pages are older than the cutoff.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from etl.connectors._utils import max_date_mask
+
+
+class OffsetPaginator:
+    """Fetches limit/offset pages ahead of the caller, yielding them in order
+
+    Only one page is requested at first, so entities with a single page don't
+    cost any extra requests.  Each full page doubles the # of offsets in
+    flight, up to max_prefetch, so large districts quickly page in parallel.
+
+    Example Usage
+    -------------
+        >>> def fetch_page(offset):
+        >>>     resp = retry_policy.get(f"{url}?limit=1000&offset={offset}", headers=headers)
+        >>>     return resp.json()["classes"] if resp.status_code == 200 else None
+        >>> paginator = OffsetPaginator(fetch_page, page_size=1000, max_prefetch=8)
+        >>> for offset, records in paginator:
+        >>>     ...
+    """
+
+    def __init__(
+        self,
+        fetch_page,
+        page_size: int,
+        count_records=None,
+        max_prefetch: int = 4,
+        start: int = 0,
+        executor: ThreadPoolExecutor = None,
+    ):
+        """Initialize the class
+        Args:
+            fetch_page (callable): Takes an offset and returns that page
+            page_size (int): # of records on a full page, ie the limit
+            count_records (callable): Takes a page and returns its # of records,
+                or None if the page failed, defaults to len() with None for None
+            max_prefetch (int): max # of pages requested at once
+            start (int): offset of the first page
+            executor (ThreadPoolExecutor): Executor to fetch pages on, so many
+                paginators can share threads, defaults to one per iteration
+        """
+        if max_prefetch < 1:
+            raise ValueError(f"max_prefetch must be at least 1: {max_prefetch}")
+
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.count_records = (
+            count_records if count_records is not None else _count_records
+        )
+        self.max_prefetch = max_prefetch
+        self.start = start
+        self.executor = executor
+        self.num_requests_ = 0
+
+    def __iter__(self):
+        """Iterate over the pages in order of offset
+
+        Yields:
+            tuple: (offset, page), the last page is the first one that's short
+                or failed, pages requested past it are cancelled or discarded
+        """
+        executor = self.executor
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=self.max_prefetch)
+
+        pending = deque()
+        next_offset = self.start
+        window = 1
+
+        try:
+            while True:
+                while len(pending) < window:
+                    pending.append(
+                        (next_offset, executor.submit(self.fetch_page, next_offset))
+                    )
+                    self.num_requests_ += 1
+                    next_offset += self.page_size
+
+                offset, future = pending.popleft()
+                page = future.result()
+                num_records = self.count_records(page)
+
+                yield offset, page
+
+                if num_records is None or num_records < self.page_size:
+                    return
+
+                window = min(window * 2, self.max_prefetch)
+
+        finally:
+            # reached when paging ends, fails or the caller stops early
+            for _, future in pending:
+                future.cancel()
+            if self.executor is None:
+                executor.shutdown(wait=False)
+
+
+def _count_records(page) -> int:
+    """Count the records on a page, None if the page failed"""
+    return None if page is None else len(page)
+
+
+# order of modifiedDateTime within the results of each endpoint, only
+# endpoints that return their newest records first can stop paginating early
+RECORD_ORDER_BY_ENDPOINT = {
+    "https://api.nwea.org/test-results/v1/growth": "descending",
+}
+
+RECORD_ORDERS = [None, "ascending", "descending"]
+
+
+class StalePageStopper:
+    """Stops paginating results ordered newest first once a run of pages has
+    no records newer than the cutoff, every later page would be older still
+
+    Example Usage
+    -------------
+        >>> stopper = StalePageStopper(max_date, record_order="descending")
+        >>> for page in pages:
+        >>>     records.extend(filter_based_on_max_dates(page["testResults"], max_date))
+        >>>     if stopper.check(page["testResults"], page["pagination"]["hasNextPage"]):
+        >>>         break
+        >>> stopper.num_pages_skipped_
+    """
+
+    def __init__(
+        self,
+        max_date,
+        record_order: str = None,
+        stale_page_limit: int = 1,
+        date_col: str = "modifiedDateTime",
+    ):
+        """Initialize the class
+        Args:
+            max_date (datetime): Cutoff, None pulls every page
+            record_order (str): Order of date_col within the results, one of
+                None (unknown), ascending or descending, only descending stops
+            stale_page_limit (int): # of pages in a row with nothing newer than
+                max_date before paginating stops
+            date_col (str): Date the results are ordered by
+        """
+        if record_order not in RECORD_ORDERS:
+            raise ValueError(
+                f"Invalid record order: {record_order}, must be one of {RECORD_ORDERS}"
+            )
+        if stale_page_limit < 1:
+            raise ValueError(f"stale_page_limit must be at least 1: {stale_page_limit}")
+
+        self.max_date = max_date
+        self.record_order = record_order
+        self.stale_page_limit = stale_page_limit
+        self.date_col = date_col
+        self.num_stale_pages_ = 0
+        self.num_pages_skipped_ = 0
+        self.stopped_early_ = False
+        self._stale_run = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether paginating can stop before the last page"""
+        return self.max_date is not None and self.record_order == "descending"
+
+    def check(self, records: list, has_next_page: bool = True) -> bool:
+        """Check a page's records, before they're filtered on the cutoff
+
+        A cursor doesn't tell how many pages follow it, so num_pages_skipped_
+        counts the next page that's never requested, a lower bound on the
+        requests saved
+
+        Args:
+            records (list): Records on the page
+            has_next_page (bool): Whether another page follows this one, the
+                last page can't save any requests by stopping
+
+        Returns:
+            bool: True if paginating should stop after this page
+        """
+        if not self.enabled or not has_next_page:
+            return False
+
+        # a record without a date can't be shown to be stale, so neither can its page
+        dates = [record.get(self.date_col) for record in records]
+        if None in dates or (dates and max_date_mask(dates, self.max_date).any()):
+            self._stale_run = 0
+            return False
+
+        self._stale_run += 1
+        self.num_stale_pages_ += 1
+        self.stopped_early_ = self._stale_run >= self.stale_page_limit
+        if self.stopped_early_:
+            self.num_pages_skipped_ += 1
+
+        return self.stopped_early_
+
+
+def get_record_order(url: str):
+    """Get the declared order of records for an endpoint, None if unknown"""
+    return RECORD_ORDER_BY_ENDPOINT.get(url.rstrip("/"))
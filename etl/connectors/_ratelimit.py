@@ -0,0 +1,251 @@
+"""
+Adaptive rate limiter shared by every connector and script that calls an API.
+
+Each host, and each tenant on a host (ie a ClassLink district), gets its own
+token bucket.  The bucket's rate grows while the API answers normally and is
+halved when it answers 429 or 503 (additive increase, multiplicative
+decrease), so jobs settle just under the provider's real limit instead of
+sleeping for fixed periods.  Learned rates are saved to disk, so the next run
+starts from where the last one left off.
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from urllib.parse import urlsplit
+
+
+RATE_LIMIT_STATE_PATH = os.environ.get(
+    "ETL_RATE_LIMIT_STATE_PATH",
+    os.path.join(tempfile.gettempdir(), "etl_rate_limits.json"),
+)
+
+
+class TokenBucket:
+    """Token bucket that hands out requests at a given rate"""
+
+    def __init__(self, rate: float, burst: float = None):
+        """Initialize the class
+        Args:
+            rate (float): # of requests per second
+            burst (float): max # of requests that can be made at once after
+                the bucket has been idle, defaults to one second's worth
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = self.capacity
+        self.last_decrease_ = 0.0
+        self._updated_at = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        """Max # of tokens the bucket holds"""
+        return self.burst if self.burst is not None else max(self.rate, 1.0)
+
+    def reserve(self) -> float:
+        """Take a token, going into debt if there are none left
+
+        Returns:
+            float: # of seconds to wait before the token can be used
+        """
+        now = time.monotonic()
+        self.tokens = min(
+            self.tokens + (now - self._updated_at) * self.rate, self.capacity
+        )
+        self._updated_at = now
+        self.tokens -= 1
+
+        if self.tokens >= 0:
+            return 0.0
+
+        return -self.tokens / self.rate
+
+
+class AdaptiveRateLimiter:
+    """Keeps a token bucket per host and tenant whose rate adapts to the API
+
+    Example Usage
+    -------------
+        >>> rate_limiter = AdaptiveRateLimiter(initial_rate=5, max_rate=50)
+        >>> rate_limiter.acquire(url, tenant=application_id)
+        >>> resp = session_pool.get(url, headers=headers)
+        >>> rate_limiter.record(url, resp.status_code, tenant=application_id)
+        >>> rate_limiter.save()
+    """
+
+    def __init__(
+        self,
+        initial_rate: float = 10.0,
+        min_rate: float = 0.5,
+        max_rate: float = 100.0,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5,
+        throttle_statuses: list = [429, 503],
+        state_path: str = None,
+    ):
+        """Initialize the class
+        Args:
+            initial_rate (float): requests per second for a bucket with no saved rate
+            min_rate (float): lowest rate a bucket backs off to
+            max_rate (float): highest rate a bucket grows to
+            increase_step (float): requests per second added for every second
+                of healthy responses
+            decrease_factor (float): rate is multiplied by this on a throttle status
+            throttle_statuses (list): status codes meaning the API is overloaded
+            state_path (str): JSON file learned rates are saved to, if None
+                rates are only kept in memory
+        """
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f"decrease_factor must be between 0 and 1: {decrease_factor}")
+
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.throttle_statuses = list(throttle_statuses)
+        self.host_throttle_statuses = {}
+        self.state_path = state_path
+        self._buckets = {}
+        self._saved_rates = self._load_state()
+        self._lock = threading.Lock()
+        self._sleep = time.sleep
+
+    def configure(self, url: str, throttle_statuses: list) -> None:
+        """Set the status codes a host uses to say it's overloaded, for APIs
+        that don't stick to 429 and 503
+
+        Args:
+            url (str): URL (or host) of the API
+            throttle_statuses (list): status codes meaning the API is overloaded
+        """
+        with self._lock:
+            self.host_throttle_statuses[self._get_key(url)] = list(throttle_statuses)
+
+    def acquire(self, url: str, tenant: str = None) -> float:
+        """Block until a request to the url's host may be made
+
+        Args:
+            url (str): URL that will be requested
+            tenant (str): Tenant the request is made for, if the API limits
+                each tenant separately
+
+        Returns:
+            float: # of seconds waited
+        """
+        with self._lock:
+            wait_time = self._get_bucket(self._get_key(url, tenant)).reserve()
+
+        # sleep outside the lock, so other hosts aren't held up
+        if wait_time > 0:
+            self._sleep(wait_time)
+
+        return wait_time
+
+    def record(self, url: str, status_code: int, tenant: str = None) -> None:
+        """Adapt the bucket's rate to the API's response
+
+        Args:
+            url (str): URL that was requested
+            status_code (int): Status code of the response
+            tenant (str): Tenant the request was made for
+        """
+        key = self._get_key(url, tenant)
+        with self._lock:
+            bucket = self._get_bucket(key)
+            throttle_statuses = self.host_throttle_statuses.get(
+                self._get_key(url), self.throttle_statuses
+            )
+
+            if status_code in throttle_statuses:
+                # responses already in flight when the API started throttling
+                # would otherwise halve the rate several times over
+                now = time.monotonic()
+                if now - bucket.last_decrease_ < 1.0:
+                    return
+
+                bucket.rate = max(bucket.rate * self.decrease_factor, self.min_rate)
+                bucket.tokens = min(bucket.tokens, 0.0)
+                bucket.last_decrease_ = now
+                logging.info(
+                    f"{key} answered {status_code}, slowing down to {bucket.rate:.2f} requests/second"
+                )
+
+            elif status_code < 500:
+                # at r requests/second this adds increase_step every second
+                bucket.rate = min(
+                    bucket.rate + self.increase_step / bucket.rate, self.max_rate
+                )
+
+    def get_rate(self, url: str, tenant: str = None) -> float:
+        """Get the current rate for a host and tenant, in requests per second"""
+        with self._lock:
+            return self._get_bucket(self._get_key(url, tenant)).rate
+
+    def rates(self) -> dict:
+        """Get the learned rate of every bucket
+
+        Returns:
+            dict: Mapping of host (and tenant) to requests per second
+        """
+        with self._lock:
+            rates = dict(self._saved_rates)
+            rates.update({key: bucket.rate for key, bucket in self._buckets.items()})
+
+        return rates
+
+    def save(self) -> None:
+        """Save the learned rates, so the next run starts from them"""
+        if self.state_path is None:
+            return
+
+        with self._lock:
+            learned = {key: bucket.rate for key, bucket in self._buckets.items()}
+
+        # other jobs may have learned rates for other hosts since we loaded
+        rates = {**self._load_state(), **learned}
+
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(rates, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+        logging.info(f"Saved learned rate limits to {self.state_path}")
+
+    @staticmethod
+    def _get_key(url: str, tenant: str = None) -> str:
+        """Build the bucket key for a url's host and a tenant"""
+        host = urlsplit(url).netloc or url
+        return host if tenant is None else f"{host}/{tenant}"
+
+    def _get_bucket(self, key: str) -> TokenBucket:
+        """Get the bucket for a key, creating it if necessary, caller must hold the lock"""
+        if key not in self._buckets:
+            rate = self._saved_rates.get(key, self.initial_rate)
+            rate = min(max(rate, self.min_rate), self.max_rate)
+            self._buckets[key] = TokenBucket(rate)
+
+        return self._buckets[key]
+
+    def _load_state(self) -> dict:
+        """Load the rates saved by a previous run
+
+        Returns:
+            dict: Mapping of bucket key to requests per second
+        """
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return {}
+
+        try:
+            with open(self.state_path, "r") as f:
+                return {key: float(rate) for key, rate in json.load(f).items()}
+        except (ValueError, OSError, AttributeError) as e:
+            logging.warning(f"Could not read rate limits {self.state_path}: {e}")
+            return {}
+
+
+# every connector and script in the process shares these buckets
+rate_limiter = AdaptiveRateLimiter(state_path=RATE_LIMIT_STATE_PATH)
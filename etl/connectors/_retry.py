@@ -0,0 +1,327 @@
+"""
+Retry policy shared by every connector and script that calls an API.
+
+Replaces the recursive retry helpers and fixed sleeps with one policy that
+backs off exponentially with jitter, honours ``Retry-After`` headers, caps
+the total # of retries in a run and stops calling a host whose circuit
+breaker has tripped.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+
+from etl.connectors._cache import ResponseCache, response_cache
+from etl.connectors._http import session_pool
+from etl.connectors._ratelimit import AdaptiveRateLimiter, rate_limiter
+
+# status codes a server answers with when it's pacing or refusing a client,
+# the host itself is up, so they never trip the circuit breaker
+THROTTLE_STATUSES = (403, 429, 503)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a host whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stops requests to a host after too many consecutive failures
+
+    After reset_timeout seconds one trial request is let through, if it
+    succeeds the circuit closes again, otherwise it stays open.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        """Initialize the class
+        Args:
+            failure_threshold (int): # of consecutive failures that opens the circuit
+            reset_timeout (float): # of seconds to wait before a trial request
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = {}
+        self._opened_at = {}
+        self._lock = threading.Lock()
+
+    def allow_request(self, host: str) -> bool:
+        """Check if a request to the host is allowed
+
+        Args:
+            host (str): Host that will be requested
+
+        Returns:
+            bool: False if the circuit for the host is open
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+
+            if time.monotonic() - opened_at >= self.reset_timeout:
+                # half open, let one trial request through
+                self._opened_at[host] = time.monotonic()
+                return True
+
+            return False
+
+    def record_success(self, host: str) -> None:
+        """Close the circuit for a host after a successful request"""
+        with self._lock:
+            self._failures[host] = 0
+            self._opened_at.pop(host, None)
+
+    def record_failure(self, host: str) -> None:
+        """Count a failed request, opening the circuit at failure_threshold"""
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] >= self.failure_threshold:
+                if host not in self._opened_at:
+                    logging.error(
+                        f"Circuit opened for {host} after "
+                        f"{self._failures[host]} consecutive failures"
+                    )
+                self._opened_at[host] = time.monotonic()
+
+    def is_open(self, host: str) -> bool:
+        """Check if the circuit for a host is currently open"""
+        with self._lock:
+            return host in self._opened_at
+
+
+class RetryPolicy:
+    """Retries failed requests with exponential backoff and jitter
+
+    Example Usage
+    -------------
+        >>> retry_policy = RetryPolicy(max_attempts=5, retry_statuses=[429, 503, 504])
+        >>> resp = retry_policy.get(url, headers=headers, params=params)
+        >>> retry_policy.retries_used_
+        2
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        backoff_factor: float = 1.0,
+        max_backoff: float = 60.0,
+        jitter: bool = True,
+        retry_statuses: list = [429, 500, 502, 503, 504],
+        retry_budget: int = None,
+        circuit_breaker: CircuitBreaker = None,
+        max_retry_after: float = 600.0,
+        session=session_pool,
+        rate_limiter: AdaptiveRateLimiter = None,
+        cache: ResponseCache = None,
+    ):
+        """Initialize the class
+        Args:
+            max_attempts (int): # of times to try a request, including the first
+            backoff_factor (float): wait time before the first retry, doubled
+                with every attempt after that
+            max_backoff (float): longest time to wait between attempts
+            jitter (bool): Whether to randomize wait times, so concurrent
+                requests don't all retry at the same moment
+            retry_statuses (list): status codes that will be retried
+            retry_budget (int): max # of retries across every request made with
+                this policy, None for no limit
+            circuit_breaker (CircuitBreaker): Breaker to stop calling failing hosts
+            max_retry_after (float): longest Retry-After the policy will honour
+            session: Session or session pool the requests are made with
+            rate_limiter (AdaptiveRateLimiter): Paces every attempt and learns
+                from its response, None to send requests unpaced
+            cache (ResponseCache): Cache GET responses are served from and
+                stored in, None to always call the server
+        """
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = list(retry_statuses)
+        self.retry_budget = retry_budget
+        self.circuit_breaker = (
+            circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        )
+        self.max_retry_after = max_retry_after
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.retries_used_ = 0
+        self._lock = threading.Lock()
+        self._sleep = time.sleep
+
+    def get(
+        self, url: str, retry_statuses: list = None, tenant: str = None, **kwargs
+    ) -> requests.Response:
+        """Make a GET request with retries, same signature as requests.get"""
+        return self.request("GET", url, retry_statuses, tenant, **kwargs)
+
+    def post(
+        self, url: str, retry_statuses: list = None, tenant: str = None, **kwargs
+    ) -> requests.Response:
+        """Make a POST request with retries, same signature as requests.post"""
+        return self.request("POST", url, retry_statuses, tenant, **kwargs)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        retry_statuses: list = None,
+        tenant: str = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Make a request, retrying on connection errors and retry_statuses
+
+        Args:
+            method (str): HTTP method, ie GET or POST
+            url (str): URL to connect to
+            retry_statuses (list): status codes to retry for this request,
+                defaults to the policy's retry_statuses
+            tenant (str): Tenant the request is made for, rate limited
+                separately from other tenants on the same host
+            **kwargs: Keyword arguments to pass to requests, ie params, headers
+
+        Returns:
+            requests.Response: Last response from the server, which is not
+                successful if every attempt failed
+        """
+        host = urlsplit(url).netloc
+        if retry_statuses is None:
+            retry_statuses = self.retry_statuses
+
+        if self.cache is not None and self.cache.mode == "replay":
+            # replayed runs never touch the API, so skip pacing and retries
+            return self.cache.request(self.session, method, url, tenant, **kwargs)
+
+        for num_attempts in range(1, self.max_attempts + 1):
+            if not self.circuit_breaker.allow_request(host):
+                raise CircuitOpenError(f"Circuit is open for {host}, not calling {url}")
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(url, tenant)
+
+            try:
+                resp = self._send(method, url, tenant, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.circuit_breaker.record_failure(host)
+                if not self._can_retry(num_attempts):
+                    raise
+                wait_time = self.get_wait_time(num_attempts)
+                logging.info(f"Waiting {wait_time:.1f} seconds to reconnect to {host} due to {e}")
+                self._sleep(wait_time)
+                continue
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.record(url, resp.status_code, tenant)
+
+            self._record_status(host, resp.status_code)
+            if resp.status_code not in retry_statuses:
+                return resp
+
+            if not self._can_retry(num_attempts):
+                return resp
+
+            wait_time = self.get_wait_time(num_attempts, resp)
+            logging.info(
+                f"Waiting {wait_time:.1f} seconds to reconnect to {host} "
+                f"due to {resp.status_code} status code"
+            )
+            self._sleep(wait_time)
+
+        return resp
+
+    def _record_status(self, host: str, status_code: int) -> None:
+        """Tell the circuit breaker how a host answered, only server errors
+        count as failures, throttling answers count as neither"""
+        if status_code in THROTTLE_STATUSES:
+            return
+        if status_code >= 500:
+            self.circuit_breaker.record_failure(host)
+        else:
+            self.circuit_breaker.record_success(host)
+
+    def _send(self, method: str, url: str, tenant: str = None, **kwargs) -> requests.Response:
+        """Make a single attempt, through the cache if there is one"""
+        if self.cache is None:
+            return self.session.request(method, url, **kwargs)
+
+        return self.cache.request(self.session, method, url, tenant, **kwargs)
+
+    def reset_budget(self) -> None:
+        """Start a new run with the full retry budget"""
+        with self._lock:
+            self.retries_used_ = 0
+
+    def get_wait_time(self, num_attempts: int, resp: requests.Response = None) -> float:
+        """Get how long to wait before the next attempt
+
+        Args:
+            num_attempts (int): # of attempts made so far
+            resp (requests.Response): Last response, checked for Retry-After
+
+        Returns:
+            float: # of seconds to wait
+        """
+        retry_after = self._parse_retry_after(resp)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+
+        backoff = min(self.backoff_factor * 2 ** (num_attempts - 1), self.max_backoff)
+        if self.jitter:
+            # "full jitter", spreads out retries from concurrent requests
+            return random.uniform(0, backoff)
+
+        return backoff
+
+    def _can_retry(self, num_attempts: int) -> bool:
+        """Check if there are attempts and budget left, using up the budget"""
+        if num_attempts >= self.max_attempts:
+            return False
+
+        with self._lock:
+            if self.retry_budget is not None and self.retries_used_ >= self.retry_budget:
+                logging.warning(f"Retry budget of {self.retry_budget} retries used up")
+                return False
+            self.retries_used_ += 1
+
+        return True
+
+    @staticmethod
+    def _parse_retry_after(resp: requests.Response):
+        """Parse a Retry-After header, either # of seconds or an HTTP date
+
+        Returns:
+            float: # of seconds to wait, or None if there's no usable header
+        """
+        if resp is None:
+            return None
+
+        retry_after = resp.headers.get("Retry-After")
+        if not retry_after:
+            return None
+
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+# every connector and script in the process shares this policy, so they
+# share one retry budget and one view of which hosts are failing
+retry_policy = RetryPolicy(
+    retry_budget=int(os.environ.get("ETL_RETRY_BUDGET", 500)),
+    rate_limiter=rate_limiter,
+    cache=response_cache,
+)
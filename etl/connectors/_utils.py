@@ -5,25 +5,159 @@ Helper functions for connecting to and pulling data from the NWEA API.
 from datetime import datetime
 from dateutil.parser import parse
 
+import numpy as np
 import pandas as pd
 
+from etl.connectors._dates import date_formats, is_date_value
+
 
 def filter_based_on_max_dates(
-    result_set: list, max_date: datetime, date_col="modifiedDateTime"
+    result_set: list, max_date: datetime, date_col="modifiedDateTime", by_date=False
 ) -> list:
-    """Filter result set based off of max date currently in results data"""
+    """Filter result set based off of max date currently in results data
+
+    The dates of the whole page are parsed and compared at once, and the
+    dates of the records kept are converted to datetimes.  by_date compares
+    calendar days only, ignoring the time of day.
+    """
+    if not result_set:
+        return []
+
+    dates = parse_date_array([result[date_col] for result in result_set])
+    mask = max_date_mask(dates, max_date, by_date=by_date)
 
     results = []
-    for result in result_set:
-        if type(result[date_col]) is str:
-            date_string = format_date_string(result[date_col])
-            result[date_col] = convert_str_to_date(date_string)
-        if result[date_col] > max_date:
-            results.append(result)
+    for idx, date in zip(np.flatnonzero(mask).tolist(), dates[mask].tolist()):
+        result = result_set[idx]
+        result[date_col] = date
+        results.append(result)
 
     return results
 
 
+def max_date_mask(dates, max_date: datetime, by_date=False) -> np.ndarray:
+    """Boolean mask of the dates after max_date
+
+    Args:
+        dates (list | np.ndarray): Date strings, datetimes, or an array from
+            parse_date_array()
+        max_date (datetime | str): Cutoff, records must be newer than it,
+            None keeps every date
+        by_date (bool): Compare calendar days only
+
+    Returns:
+        np.ndarray: True for each date after max_date
+    """
+    dates = parse_date_array(dates)
+    if max_date is None:
+        return np.ones(len(dates), dtype=bool)
+
+    max_date = pd.Timestamp(max_date)
+    if max_date.tzinfo is not None:
+        max_date = max_date.tz_convert("UTC").tz_localize(None)
+    max_date = max_date.to_datetime64()
+
+    if by_date:
+        return dates.astype("datetime64[D]") > max_date.astype("datetime64[D]")
+
+    # records have whole seconds, so dropping max_date's fraction doesn't
+    # change any comparison
+    return dates > max_date.astype("datetime64[s]")
+
+
+def parse_date_array(values) -> np.ndarray:
+    """Parse dates to a datetime64[s] array in one pass, fractions of a second
+    and the trailing 'Z' are dropped like format_date_string() does
+
+    NWEA's 'YYYY-MM-DDTHH:MM:SS[.fff]Z' layout is parsed straight from the
+    bytes of the strings.  Other layouts and datetimes are parsed by numpy,
+    and anything numpy can't parse falls back to parsing each value.  Dates
+    with a UTC offset, ie '+05:00', are converted to UTC by pandas, since
+    the other parsers would drop the offset.
+    """
+    if isinstance(values, np.ndarray) and values.dtype == "datetime64[s]":
+        return values
+
+    if _has_utc_offset(values):
+        parsed = pd.to_datetime(pd.Series(values), utc=True, format="ISO8601")
+        return parsed.dt.tz_localize(None).to_numpy().astype("datetime64[s]")
+
+    try:
+        return _parse_iso_bytes(np.array(values, dtype="S19"))
+    except (ValueError, UnicodeEncodeError, TypeError):
+        pass
+
+    try:
+        # datetimes are converted with str(), which numpy also understands
+        return np.array(values, dtype="U19").astype("datetime64[s]")
+    except ValueError:
+        pass
+
+    return np.array(
+        [
+            convert_str_to_date(format_date_string(value))
+            if type(value) is str else value
+            for value in values
+        ],
+        dtype="datetime64[s]",
+    )
+
+
+def _has_utc_offset(values) -> bool:
+    """Whether any date string has a '+HH:MM' or '-HH:MM' offset after its time"""
+    return any(
+        type(value) is str and ("+" in value[19:] or "-" in value[19:])
+        for value in values
+    )
+
+
+# positions of the digits and separators in 'YYYY-MM-DDTHH:MM:SS'
+_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+_SEPARATORS = {4: b"-", 7: b"-", 13: b":", 16: b":"}
+
+
+def _parse_iso_bytes(values: np.ndarray) -> np.ndarray:
+    """Parse an 'S19' array of 'YYYY-MM-DDTHH:MM:SS' strings to datetime64[s]
+
+    Raises:
+        ValueError: if any value isn't in that layout
+    """
+    chars = np.frombuffer(values.tobytes(), dtype=np.uint8).reshape(-1, 19)
+
+    digits = chars[:, _DIGITS].astype(np.int64) - ord("0")
+    valid = ((digits >= 0) & (digits <= 9)).all()
+    for position, separator in _SEPARATORS.items():
+        valid &= (chars[:, position] == ord(separator)).all()
+    valid &= np.isin(chars[:, 10], [ord("T"), ord(" ")]).all()
+    if not valid:
+        raise ValueError("Dates are not in the 'YYYY-MM-DDTHH:MM:SS' layout")
+
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    hour = digits[:, 8] * 10 + digits[:, 9]
+    minute = digits[:, 10] * 10 + digits[:, 11]
+    second = digits[:, 12] * 10 + digits[:, 13]
+
+    if (
+        (month < 1).any() or (month > 12).any()
+        or (day < 1).any() or (day > 31).any()
+        or (hour > 23).any() or (minute > 59).any() or (second > 59).any()
+    ):
+        raise ValueError("Dates are out of range")
+
+    # days since the epoch of a proleptic Gregorian date
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    days = era * 146097 + day_of_era - 719468
+
+    seconds = days * 86400 + hour * 3600 + minute * 60 + second
+    return seconds.astype("datetime64[s]")
+
+
 def format_date_string(date_string: str) -> str:
     """Helper function to format dates into a standard '%Y-%m-%dT%H:%M:%SZ'
     format"""
@@ -59,7 +193,7 @@ def pull_records_from_api_response(
     """Pull the usable records from the API response"""
 
     if max_date is not None:
-        if not is_datetime(max_date):
+        if not is_datetime(max_date, source="nwea", field="max_date"):
             # WARNING: this might be buggy if the date format changes
             max_date = format_date_string(max_date)
             max_date = convert_str_to_date(max_date)
@@ -92,6 +226,16 @@ def is_datetime_with_pandas(value):
         return False
 
 
-def is_datetime(value):
-    """Check if value is a datetime object"""
+def is_datetime(value, source: str = "default", field: str = "default"):
+    """Check if value is a datetime object
+
+    Strings are checked against the format cached for the source and field,
+    the slower parsers are only tried when that doesn't match.
+    """
+    if is_date_value(value):
+        return True
+
+    if isinstance(value, str) and date_formats.matches(value, source, field):
+        return True
+
     return is_datetime_with_datetime_lib(value) or is_datetime_with_pandas(value)
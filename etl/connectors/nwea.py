@@ -1,7 +1,7 @@
 """
 Connector for the NWEA API, for both assessment and student data
 """
-import requests
+import asyncio
 import os
 import logging
 
@@ -9,12 +9,18 @@ from datetime import datetime
 from dotenv import load_dotenv
 
 import pandas as pd
+import requests
 
-from etl.connectors._base import _BaseAPIConnector
+from etl.connectors._base import _BaseAsyncAPIConnector
+from etl.connectors._auth import NWEATokenManager, get_nwea_token_manager
+from etl.connectors._dates import date_formats
+from etl.connectors._pagination import StalePageStopper, get_record_order
+from etl.connectors._retry import RetryPolicy
 from etl.connectors._utils import (
     pull_records_from_api_response,
     filter_based_on_max_dates,
 )
+from etl.transformers._compile import compile_projection
 
 
 # need to import .env from the root directory
@@ -26,7 +32,115 @@ env_path = os.path.join(base_dir, ".env")
 load_dotenv(env_path)
 
 
-class NWEAAssessmentConnector(_BaseAPIConnector):
+class _NWEAConnector(_BaseAsyncAPIConnector):
+    """Base class for NWEA connectors, every connector in the process shares
+    one token per token url, refreshed once however many requests a 401
+    rejects"""
+
+    def __init__(
+        self,
+        url: str,
+        params: dict = None,
+        headers: dict = None,
+        token_url: str = "https://api.nwea.org/auth/v1/token",
+        grant_type: str = "client_credentials",
+        retry_https_codes: list = [],
+        return_data=True,
+        max_concurrency: int = 10,
+        token_manager: NWEATokenManager = None,
+        retry_policy: RetryPolicy = None,
+        json_decoder: str = None,
+    ):
+        """Initialize the class
+        Args:
+            url (str): URL to connect to
+            params (dict): Parameters to pass to the API
+            headers (dict): Headers to pass to the API
+            token_url (str): URL to connect for authentication
+            grant_type (str): Type of grant to use for authentication
+            retry_https_codes (list): api status codes retried by the retry policy
+            return_data (bool): Whether or not to return the data from pull_data()
+            max_concurrency (int): Max number of API requests in flight
+            token_manager (NWEATokenManager): Caches the access token, defaults
+                to the token manager shared by the whole process
+            retry_policy (RetryPolicy): Backoff, retry budget and circuit breaker,
+                defaults to the retry policy shared by the whole process
+            json_decoder (str): JSON decoder for responses, one of auto, orjson,
+                ujson or stdlib, defaults to the ETL_JSON_DECODER env variable
+        """
+        super().__init__(
+            url,
+            params,
+            headers,
+            retry_https_codes,
+            return_data,
+            max_concurrency,
+            retry_policy,
+            json_decoder,
+        )
+        self.token_url = token_url
+        self.grant_type = grant_type
+        self.token_manager = (
+            token_manager
+            if token_manager is not None
+            else get_nwea_token_manager(token_url, grant_type)
+        )
+
+    async def _async_get_authenticated(
+        self, url: str, params: dict = None, max_attempts: int = 2
+    ):
+        """Make a GET request, re-authenticating on a 401, status codes in
+        retry_https_codes are retried by the retry policy
+
+        Args:
+            url (str): URL to connect to
+            params (dict): Parameters to pass to the API
+            max_attempts (int): # of times to try the request with a new token
+
+        Returns:
+            requests.Response: Last response from the API
+        """
+        for _ in range(max_attempts):
+            headers = self.headers
+            req = await self._async_get(
+                url, params=dict(params) if params is not None else None, headers=headers
+            )
+
+            if req.status_code != 401:
+                break
+
+            # the token manager only refreshes once, however many requests
+            # were rejected with the same token
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self._reauthenticate, headers)
+
+        return req
+
+    def _authenticate(self) -> None:
+        """Authenticate with the API, the token manager caches the token so
+        this only requests a new one when the cached token is about to expire
+        Returns:
+            None
+        """
+        try:
+            self.headers = self.token_manager.get_headers()
+
+        except Exception as e:
+            logging.info(f"Could not connect to API because: {e}")
+            return None
+
+    def _reauthenticate(self, headers: dict) -> None:
+        """Refresh the token after the API rejected it with a 401
+        Args:
+            headers (dict): Headers that were rejected
+        Returns:
+            None
+        """
+        self.token_manager.invalidate_headers(headers)
+        self._authenticate()
+
+
+class NWEAAssessmentConnector(_NWEAConnector):
     """Connector for the NWEA Assessment API
 
     Example Usage
@@ -47,6 +161,18 @@ class NWEAAssessmentConnector(_BaseAPIConnector):
     >>> data
     >>> bid  ...  modifiedDateTime
     >>> 0  test_bid  ...  2021-09-23 19:56:55.000
+
+    # many bids can be pulled concurrently, results come back per bid
+    >>> results = connector.pull_bids(
+        bids=["2c195342-9ea0-410c-afb5-0713dd0e6e0a", ...],
+        cutoffs={"2c195342-9ea0-410c-afb5-0713dd0e6e0a": pd.to_datetime("2021-09-23")}
+    )
+    >>> for bid, records, error in results:
+    >>>     ...
+
+    # or stream a dataframe per bid as each one finishes
+    >>> for bid, data, error in connector.pull_many(bids, cutoffs, max_concurrency=20):
+    >>>     ...
     """
 
     def __init__(
@@ -60,6 +186,12 @@ class NWEAAssessmentConnector(_BaseAPIConnector):
         grant_type: str = "client_credentials",
         retry_https_codes: list = [504, 404],
         return_data=True,
+        max_concurrency: int = 10,
+        token_manager: NWEATokenManager = None,
+        retry_policy: RetryPolicy = None,
+        json_decoder: str = None,
+        record_order: str = None,
+        stale_page_limit: int = 1,
     ):
         """Initialize the class
         Args:
@@ -70,29 +202,58 @@ class NWEAAssessmentConnector(_BaseAPIConnector):
             max_date (datetime): Max date to pull data for
             token_url (str): URL to connect for authentication
             grant_type (str): Type of grant to use for authentication
+            max_concurrency (int): Max number of API requests in flight when
+                pulling many bids at once with pull_bids()
+            token_manager (NWEATokenManager): Caches the access token, defaults
+                to the token manager shared by the whole process
+            retry_policy (RetryPolicy): Backoff, retry budget and circuit breaker,
+                defaults to the retry policy shared by the whole process
+            json_decoder (str): JSON decoder for responses, one of auto, orjson,
+                ujson or stdlib, defaults to the ETL_JSON_DECODER env variable
+            record_order (str): Order of modifiedDateTime within the results,
+                ascending or descending, defaults to the order declared for the
+                url in RECORD_ORDER_BY_ENDPOINT.  Descending results stop
+                paginating once pages have nothing newer than max_date
+            stale_page_limit (int): # of pages in a row with nothing newer than
+                max_date before paginating stops
         """
-        super().__init__(url, params, headers, retry_https_codes, return_data)
+        super().__init__(
+            url,
+            params,
+            headers,
+            token_url,
+            grant_type,
+            retry_https_codes,
+            return_data,
+            max_concurrency,
+            token_manager,
+            retry_policy,
+            json_decoder,
+        )
         self.bid = bid
         self.max_date = max_date
-        self.token_url = token_url
-        self.grant_type = grant_type
+        self.record_order = (
+            record_order if record_order is not None else get_record_order(url)
+        )
+        self.stale_page_limit = stale_page_limit
+        # pages never requested because every bid's later pages were stale
+        self.num_pages_skipped_ = 0
 
-    def _validate_response(self) -> None:
+    def _validate_response(self, refreshed: bool = False) -> None:
         """Validate the response from the API, meant to
-        check for different API response errors, recursively
-        reconnect with supplied status codes
+        check for different API response errors, status codes in
+        retry_https_codes have already been retried by the retry policy
+        Args:
+            refreshed (bool): Whether the token was already refreshed for
+                this request, a second 401 is an error like any other status
         Returns:
             None
         """
 
-        # retry connection if status code is in retry_https_codes
-        if self.req.status_code in self.retry_https_codes:
-            print("Connection error, retrying...")
-            self._recursive_api_connect()
-        elif self.req.status_code == 401:
-            self._authenticate()
+        if self.req.status_code == 401 and not refreshed:
+            self.token_manager.invalidate_headers(self.headers)
             self._connect()
-            self._validate_response()
+            self._validate_response(refreshed=True)
         elif self.req.status_code != 200:
             logging.error(
                 f"Could not connect to API. Status code: {self.req.status_code}"
@@ -114,28 +275,67 @@ class NWEAAssessmentConnector(_BaseAPIConnector):
         Returns:
             None
         """
-        self.json_response_ = self.req.json()
+        self.json_response_ = self.json_decoder.loads(self.req.content)
 
     def pull_data(self) -> None:
-        """Pull the data from the API
+        """Pull the data from the API, holding every record in memory, use
+        iter_record_batches() to stream large bids
         Returns:
             None
         """
+        self._paginate_response()
+        self._filter_data()
+        self._format_data()
+        if self.return_data:
+            return self.pulled_data_
+
+    def iter_pages(self):
+        """Iterate over the API's responses for the bid one page at a time
+
+        Yields:
+            dict: JSON response of each page
+        """
+        if self.params is not None:
+            self.params.pop("next-page", None)
+
+        stopper = self._make_stopper(self.max_date)
+        self.stale_pages_stopper_ = stopper
+
         self._connect()
         self._validate_response()
-        if self.req.status_code == 200:
-            self._parse_response()
-            self._paginate_response()
-            self._filter_data()
-            self._format_data()
-            if self.return_data:
-                return self.pulled_data_
-
-        else:
-            return pd.DataFrame()
-            logging.error(
-                f"Could not connect to API. Status code: {self.req.status_code}"
+        self._parse_response()
+
+        while True:
+            stop = stopper.check(
+                self.json_response_["testResults"],
+                self.json_response_["pagination"]["hasNextPage"],
             )
+            yield self.json_response_
+
+            if stop:
+                self.num_pages_skipped_ += stopper.num_pages_skipped_
+                logging.info(
+                    f"Stopped paginating bid {self.bid} after "
+                    f"{stopper.num_stale_pages_} stale pages, skipping its next page"
+                )
+                break
+            if not self.json_response_["pagination"]["hasNextPage"]:
+                break
+
+            self.params["next-page"] = self.json_response_["pagination"]["nextPage"]
+            self.connect()
+            self._validate_response()
+            self._parse_response()
+
+    def _make_stopper(self, max_date: datetime) -> StalePageStopper:
+        """Make the stopper that ends paginating a bid early, when the
+        results are ordered newest first
+        Args:
+            max_date (datetime): Max date to pull data for
+        Returns:
+            StalePageStopper: Stopper for one bid
+        """
+        return StalePageStopper(max_date, self.record_order, self.stale_page_limit)
 
     def _filter_data(self) -> None:
         """Filter the data
@@ -149,75 +349,492 @@ class NWEAAssessmentConnector(_BaseAPIConnector):
         Returns:
             None
         """
-        self.pulled_data_ = pd.DataFrame(self.api_results_)
-        self.pulled_data_["modifiedDateTime"] = pd.to_datetime(
-            self.pulled_data_["modifiedDateTime"]
-        )
+        self.pulled_data_ = self._format_records(self.api_results_)
+
+    def _get_page_records(self, page: dict) -> list:
+        """Get the records newer than max_date from a page of the API response
+        Returns:
+            list: Records on the page
+        """
+        return pull_records_from_api_response(page, self.max_date)
+
+    def _format_records(self, records: list, bid: str = None) -> pd.DataFrame:
+        """Format records returned from the API into a dataframe
+        Args:
+            records (list): Records returned from the API
+            bid (str): school bid the records were pulled for, defaults to self.bid
+        Returns:
+            pd.DataFrame: Formatted records
+        """
+        data = pd.DataFrame(records)
+        if "modifiedDateTime" in data.columns:
+            data["modifiedDateTime"] = date_formats.parse(
+                data["modifiedDateTime"], "nwea", "modifiedDateTime"
+            )
         # done to keep track of which school bid the data is for
         # multiple bids can be pulled for a single bid passed to API
-        self.pulled_data_["PARENT_SCHOOL_BID"] = self.bid
+        data["PARENT_SCHOOL_BID"] = bid if bid is not None else self.bid
+
+        return data
 
     def _paginate_response(self):
         """Paginate through the API response to retrieve all entries
         Returns:
             None
         """
-        api_pull_complete = False
-        has_next_page = True
-
         self.api_results_ = []
 
-        # have to do this now because we've already connected to the api
-        api_records = pull_records_from_api_response(self.json_response_, self.max_date)
+        for json_response in self.iter_pages():
+            api_records = pull_records_from_api_response(json_response, self.max_date)
+            self.api_results_.extend(api_records)
 
-        self.api_results_.extend(api_records)
+    def pull_many(self, bids: list, cutoffs: dict = None, max_concurrency: int = None):
+        """Pull the data for many school bids concurrently, yielding each
+        bid's data as soon as all of its pages have been pulled
 
-        while not api_pull_complete:
-            if not has_next_page:
-                break
+        Each bid is paginated with its own params and records, so nothing
+        on the connector (bid, max_date, params) changes.  Bids keep being
+        pulled while the caller transforms and exports the ones already
+        yielded.
+
+        Args:
+            bids (list): school bids to pull data for
+            cutoffs (dict): Mapping of school bid to max date, bids without a
+                cutoff are pulled in full
+            max_concurrency (int): Max number of API requests in flight,
+                defaults to the connector's max_concurrency
+
+        Yields:
+            tuple: (bid, data, error) in the order the bids completed, data is
+                a dataframe of the records pulled before any error, error is
+                None if the bid was pulled successfully
+        """
+        results = self._iter_async(self.pull_bids_async(bids, cutoffs, max_concurrency))
+        for bid, records, error in results:
+            yield bid, self._format_records(records, bid), error
+
+    def pull_bids(self, bids: list, cutoffs: dict = None) -> list:
+        """Pull the data for many school bids concurrently
+
+        Args:
+            bids (list): school bids to pull data for
+            cutoffs (dict): Mapping of school bid to max date, bids without a
+                cutoff are pulled in full
+
+        Returns:
+            list: (bid, records, error) tuples in the order the bids completed,
+                error is None if the bid was pulled successfully
+        """
+
+        async def collect():
+            return [result async for result in self.pull_bids_async(bids, cutoffs)]
+
+        return asyncio.run(collect())
+
+    async def pull_bids_async(
+        self, bids: list, cutoffs: dict = None, max_concurrency: int = None
+    ):
+        """Pull the data for many school bids concurrently, yielding each bid
+        as soon as all of its pages have been pulled
+
+        Args:
+            bids (list): school bids to pull data for
+            cutoffs (dict): Mapping of school bid to max date
+            max_concurrency (int): Max number of API requests in flight,
+                defaults to the connector's max_concurrency
+
+        Yields:
+            tuple: (bid, records, error) for each bid
+        """
+        cutoffs = cutoffs if cutoffs is not None else {}
+
+        # one token is shared by every bid, refreshed on a 401
+        self._authenticate()
+
+        coros = [self._pull_bid_async(bid, cutoffs.get(bid)) for bid in bids]
+        async for result in self._run_async(coros, max_concurrency):
+            yield result
 
-            has_next_page = self.json_response_["pagination"]["hasNextPage"]
+    async def _pull_bid_async(self, bid: str, max_date: datetime = None) -> tuple:
+        """Paginate through all of the API responses for a single bid
+
+        Args:
+            bid (str): school bid to pull data for
+            max_date (datetime): Max date to pull data for
+
+        Returns:
+            tuple: (bid, records, error)
+        """
+        # each bid keeps its own params, since they change with every page
+        params = {**(self.params or {}), "school-bid": bid}
+        records = []
+        stopper = self._make_stopper(max_date)
 
-            if has_next_page:
-                self.params["next-page"] = self.json_response_["pagination"]["nextPage"]
-                self.connect()
-                self._validate_response()
-                self._parse_response()
-                api_records = pull_records_from_api_response(
-                    self.json_response_, self.max_date
+        try:
+            while True:
+                json_response = await self._async_get_page(params)
+                stop = stopper.check(
+                    json_response["testResults"], json_response["pagination"]["hasNextPage"]
                 )
-                self.api_results_.extend(api_records)
+                records.extend(pull_records_from_api_response(json_response, max_date))
+
+                if stop:
+                    # every bid's coroutine runs on the one event loop thread
+                    self.num_pages_skipped_ += stopper.num_pages_skipped_
+                    logging.info(
+                        f"Stopped paginating bid {bid} after "
+                        f"{stopper.num_stale_pages_} stale pages, skipping its next page"
+                    )
+                    break
+                if not json_response["pagination"]["hasNextPage"]:
+                    break
+                params["next-page"] = json_response["pagination"]["nextPage"]
+
+        except (ValueError, KeyError, requests.RequestException) as e:
+            # one bid failing, ie a dropped connection, an open circuit or a
+            # malformed page, mustn't stop the other bids
+            logging.error(f"Could not pull data for bid {bid}: {e!r}")
+            error = {
+                "school-bid": bid,
+                "error-type": "api-error",
+                "message": str(e),
+                "date": datetime.now(),
+            }
+            return bid, records, error
+
+        return bid, records, None
+
+    async def _async_get_page(self, params: dict) -> dict:
+        """Get a single page of results, re-authenticating on a 401
+
+        Args:
+            params (dict): Parameters to pass to the API
 
-    def _authenticate(self) -> None:
-        """Authenticate with the API
         Returns:
-            None
+            dict: JSON response from the API
         """
-        auth_code = os.environ.get("NWEA_AUTH")
-        api_key = os.environ.get("NWEA_API")
+        req = await self._async_get_authenticated(self.url, params)
+
+        if req.status_code != 200:
+            raise ValueError(f"Could not connect to API. Status code: {req.status_code}")
+
+        return self.json_decoder.loads(req.content)
+
+
+# fields of a student profile that are loaded, the rest are dropped
+STUDENT_FIELDS = [
+    "dateOfBirth",
+    "districtBid",
+    "ethnicity",
+    "ethnicityCustom",
+    "firstName",
+    "gender",
+    "grade",
+    "gradeCustom",
+    "lastName",
+    "middleName",
+    "schoolBid",
+    "stateStudentId",
+    "studentBid",
+    "studentId",
+]
+
+
+class NWEAStudentConnector(_NWEAConnector):
+    """Connector for the NWEA Student API, fetches the profile of each
+    student bid with many requests in flight on threads, sharing one token
+    and one connection pool
+
+    Example Usage
+    -------------
+    >>> connector = NWEAStudentConnector(
+        bids=["9a4f2c9e-...", ...],
+        existing_students=current_students["STUDENT_BID"],
+        max_concurrency=32,
+    )
+
+    # profiles come back in dataframes of only the STUDENT_FIELDS
+    >>> for batch in connector.iter_record_batches(batch_size=5000):
+    >>>     ...
+    >>> connector.errors_
+
+    # or every response, in the order the requests complete
+    >>> for bid, profile, status_code in connector.pull_students(bids):
+    >>>     ...
+
+    # students whose school is known are served from one roster request per
+    # school, the rest fall back to a request per student
+    >>> connector = NWEAStudentConnector(
+        bids=assessments["STUDENT_BID"],
+        student_schools=dict(zip(assessments["STUDENT_BID"], assessments["SCHOOL_BID"])),
+    )
+    >>> connector.pull_data()
+    >>> connector.served_by_
+    {'9a4f2c9e-...': 'school-roster', ...}
+    """
+
+    def __init__(
+        self,
+        bids: list = None,
+        url: str = "https://api.nwea.org/students/v2",
+        fields: list = STUDENT_FIELDS,
+        existing_students: list = None,
+        headers: dict = None,
+        token_url: str = "https://api.nwea.org/auth/v1/token",
+        grant_type: str = "client_credentials",
+        retry_https_codes: list = [429, 503],
+        return_data=True,
+        max_concurrency: int = 32,
+        chunk_size: int = 5000,
+        student_schools: dict = None,
+        roster_url: str = "https://api.nwea.org/organizations/v1/schools/{}/students",
+        token_manager: NWEATokenManager = None,
+        retry_policy: RetryPolicy = None,
+        json_decoder: str = None,
+    ):
+        """Initialize the class
+        Args:
+            bids (list): student bids to pull profiles for
+            url (str): URL of the student API, the bid is added to the end
+            fields (list): Fields of each profile to keep
+            existing_students (list): student bids that are already loaded
+                and are skipped
+            headers (dict): Headers to pass to the API
+            token_url (str): URL to connect for authentication
+            grant_type (str): Type of grant to use for authentication
+            retry_https_codes (list): api status codes retried by the retry policy
+            return_data (bool): Whether or not to return the data from pull_data()
+            max_concurrency (int): Max number of API requests in flight
+            chunk_size (int): # of students scheduled at once, bounds the
+                memory used for pending requests on long lists of bids
+            student_schools (dict): Mapping of student bid to school bid, the
+                students of each school are pulled with one roster request
+            roster_url (str): URL of a school's roster, formatted with the school bid
+            token_manager (NWEATokenManager): Caches the access token, defaults
+                to the token manager shared by the whole process
+            retry_policy (RetryPolicy): Backoff, retry budget and circuit breaker,
+                defaults to the retry policy shared by the whole process
+            json_decoder (str): JSON decoder for responses, one of auto, orjson,
+                ujson or stdlib, defaults to the ETL_JSON_DECODER env variable
+        """
+        super().__init__(
+            url,
+            None,
+            headers,
+            token_url,
+            grant_type,
+            retry_https_codes,
+            return_data,
+            max_concurrency,
+            token_manager,
+            retry_policy,
+            json_decoder,
+        )
+        self.bids = bids if bids is not None else []
+        self.fields = fields
+        self.existing_students = set(existing_students if existing_students is not None else [])
+        self.chunk_size = chunk_size
+        self.student_schools = student_schools if student_schools is not None else {}
+        self.roster_url = roster_url
+        self.errors_ = []
+        self.served_by_ = {}
+
+    def pull_data(self) -> pd.DataFrame:
+        """Pull the profile of every student bid
+        Returns:
+            pd.DataFrame: Profiles, if return_data is True
+        """
+        self._paginate_response()
+        self._filter_data()
+        self.pulled_data_ = self._format_records(self.api_results_)
+
+        if self.return_data:
+            return self.pulled_data_
+
+    def pull_students(self, bids: list = None, max_concurrency: int = None):
+        """Pull student profiles concurrently, skipping existing students
+
+        Args:
+            bids (list): student bids, defaults to the connector's bids
+            max_concurrency (int): Max number of API requests in flight,
+                defaults to the connector's max_concurrency
 
-        # steps to authenticate w/ NWEA API:
-        token_headers = {
-            "Authorization": auth_code,
-            "apikey": api_key,
-            "grant_type": self.grant_type,
-            "Content-Length": "0",
+        Yields:
+            tuple: (bid, profile, status_code) in the order the requests
+                complete, profile is None unless the API returned one
+        """
+        bids = bids if bids is not None else self.bids
+        return self._iter_async(self._pull_students_async(bids, max_concurrency))
+
+    def iter_pages(self):
+        """Iterate over the profile of each student, errors and empty
+        responses are added to errors_
+
+        Yields:
+            dict: Profile of a student
+        """
+        self.errors_ = []
+
+        for bid, profile, status_code in self.pull_students():
+            if profile is None:
+                self.errors_.append(
+                    {
+                        "student-bid": bid,
+                        "error-type": "api-error" if status_code != 200 else "empty-response",
+                        "message": status_code,
+                        "date": datetime.now(),
+                    }
+                )
+                continue
+
+            yield profile
+
+    def _get_page_records(self, page: dict) -> list:
+        """Keep only the fields of a profile that are loaded, missing fields
+        are empty strings, with a projection compiled once for the fields
+        Returns:
+            list: The projected profile
+        """
+        return compile_projection(self.fields)([page])
+
+    def _format_records(self, records: list) -> pd.DataFrame:
+        """Format profiles into a dataframe with a column for every field
+        Returns:
+            pd.DataFrame: Formatted profiles
+        """
+        return pd.DataFrame(records, columns=self.fields)
+
+    def strategy_counts(self) -> dict:
+        """Count the students served by each strategy, school-roster or student"""
+        counts = {}
+        for strategy in self.served_by_.values():
+            counts[strategy] = counts.get(strategy, 0) + 1
+
+        return counts
+
+    async def _pull_students_async(self, bids: list, max_concurrency: int = None):
+        """Pull student profiles from school rosters first, then a chunk of
+        the remaining bids at a time
+
+        Yields:
+            tuple: (bid, profile, status_code) for each new student
+        """
+        remaining = {bid: None for bid in bids if bid not in self.existing_students}
+
+        # one token is shared by every request, refreshed on a 401
+        self._authenticate()
+
+        async for result in self._pull_rosters_async(remaining, max_concurrency):
+            self.served_by_[result[0]] = "school-roster"
+            del remaining[result[0]]
+            yield result
+
+        if self.student_schools:
+            logging.info(
+                f"{len(remaining)} students weren't on their school's roster, "
+                "pulling them one at a time"
+            )
+
+        remaining = list(remaining)
+        for start in range(0, len(remaining), self.chunk_size):
+            coros = [
+                self._pull_student_async(bid)
+                for bid in remaining[start : start + self.chunk_size]
+            ]
+            async for result in self._run_async(coros, max_concurrency):
+                self.served_by_[result[0]] = "student"
+                yield result
+
+    async def _pull_rosters_async(self, wanted: dict, max_concurrency: int = None):
+        """Pull the roster of every school with a wanted student
+
+        Args:
+            wanted (dict): student bids to pull, as keys
+            max_concurrency (int): Max number of API requests in flight
+
+        Yields:
+            tuple: (bid, profile, 200) for each wanted student on a roster
+        """
+        schools = {
+            self.student_schools[bid] for bid in wanted if bid in self.student_schools
         }
+        if not schools:
+            return
+
+        schools = sorted(schools)
+        for start in range(0, len(schools), self.chunk_size):
+            coros = [
+                self._pull_roster_async(school)
+                for school in schools[start : start + self.chunk_size]
+            ]
+            async for school, roster in self._run_async(coros, max_concurrency):
+                for profile in roster:
+                    bid = profile.get("studentBid")
+                    # served students are removed from wanted, so students
+                    # on more than one roster are only served once
+                    if bid in wanted:
+                        yield bid, profile, 200
+
+    async def _pull_roster_async(self, school: str) -> tuple:
+        """Get the roster of a single school
 
-        # get auth token to later connect to the api
+        Returns:
+            tuple: (school, profiles), profiles is empty if the roster
+                couldn't be pulled, so its students fall back to per-student calls
+        """
         try:
-            resp_json = requests.post(self.token_url, headers=token_headers).json()
-            access_token = resp_json["access_token"]
-            self.headers = {
-                "Content/Type": "application/json",
-                "apikey": api_key,
-                "Authorization": f"Bearer {access_token}",
-            }
+            req = await self._async_get_authenticated(self.roster_url.format(school))
+        except requests.RequestException as e:
+            logging.info(f"Could not pull the roster of school {school}: {e!r}")
+            return school, []
+
+        if req.status_code != 200 or not req.content:
+            logging.info(
+                f"Could not pull the roster of school {school}, status code: {req.status_code}"
+            )
+            return school, []
 
-        except Exception as e:
-            logging.info(f"Could not connect to API because: {e}")
-            return None
+        return school, self.json_decoder.loads(req.content)
 
+    async def _pull_student_async(self, bid: str) -> tuple:
+        """Get the profile of a single student
 
-class NWEAStudentConnector(_BaseAPIConnector):
-    pass
+        Returns:
+            tuple: (bid, profile, status_code), status_code is None if the
+                request failed without a response
+        """
+        try:
+            req = await self._async_get_authenticated(f"{self.url}/{bid}")
+        except requests.RequestException as e:
+            logging.error(f"Could not pull the profile of student {bid}: {e!r}")
+            return bid, None, None
+
+        if req.status_code != 200 or not req.content:
+            return bid, None, req.status_code
+
+        return bid, self.json_decoder.loads(req.content), req.status_code
+
+    def _validate_response(self) -> None:
+        """Responses are validated per student in _pull_student_async()"""
+        pass
+
+    def _parse_response(self) -> None:
+        """Responses are parsed per student in _pull_student_async()"""
+        pass
+
+    def _paginate_response(self) -> None:
+        """Pull the profile of every student, keeping only the loaded fields
+        Returns:
+            None
+        """
+        self.api_results_ = []
+
+        for profile in self.iter_pages():
+            self.api_results_.extend(self._get_page_records(profile))
+
+    def _filter_data(self) -> None:
+        """Existing students are skipped before they're requested
+        Returns:
+            None
+        """
+        pass
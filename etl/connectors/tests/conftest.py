@@ -0,0 +1,23 @@
+"""
+Fixtures shared by the connector tests
+"""
+import json
+
+import pytest
+import requests
+
+
+def make_response(status_code, json_data=None, body=b"", headers=None):
+    """Build a real requests.Response, json_data is encoded as its body"""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(json_data).encode() if json_data is not None else body
+    response.headers.update(headers or {})
+    response.encoding = "utf-8"
+    return response
+
+
+@pytest.fixture(name="make_response")
+def make_response_fixture():
+    """Factory for responses served by a mocked session"""
+    return make_response
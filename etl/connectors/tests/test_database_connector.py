@@ -0,0 +1,48 @@
+"""
+Unit tests for the _DatabaseConnector
+"""
+import pytest
+import pandas as pd
+
+from etl.connectors._base import _DatabaseConnector
+
+
+@pytest.fixture
+def connection_string(tmp_path):
+    connection_string = f"sqlite:///{tmp_path / 'roster.db'}"
+    df = pd.DataFrame({"student_id": range(25), "grade": [i % 12 for i in range(25)]})
+    df.to_sql("roster", _DatabaseConnector(connection_string)._get_connection(), index=False)
+    return connection_string
+
+
+def test_engine_is_reused(connection_string):
+    first = _DatabaseConnector(connection_string)
+    second = _DatabaseConnector(connection_string)
+
+    first.load("SELECT * FROM roster")
+    second.load("SELECT * FROM roster WHERE grade = 1")
+
+    assert first._get_connection() is second._get_connection()
+    assert len(first.data_) == 25
+    assert second.data_["student_id"].tolist() == [1, 13]
+
+
+def test_load_chunks(connection_string):
+    connector = _DatabaseConnector(connection_string, arraysize=4, prefetchrows=4)
+
+    chunks = list(connector.load_chunks("SELECT * FROM roster ORDER BY student_id", chunksize=10))
+
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert pd.concat(chunks)["student_id"].tolist() == list(range(25))
+
+
+def test_pull_data(connection_string):
+    connector = _DatabaseConnector(connection_string, return_data=True)
+
+    assert len(connector.pull_data("SELECT * FROM roster")) == 25
+
+
+@pytest.mark.parametrize("query", ["", "   "])
+def test_invalid_query(connection_string, query):
+    with pytest.raises(ValueError):
+        _DatabaseConnector(connection_string).load(query)
@@ -0,0 +1,70 @@
+"""
+Unit tests for the vectorized max date filter
+"""
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from etl.connectors._utils import (
+    filter_based_on_max_dates,
+    max_date_mask,
+    parse_date_array,
+)
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        ["2024-01-02T03:04:05.123Z", "1969-12-31T23:59:59Z"],
+        ["2024-01-02 03:04:05", "1969-12-31T23:59:59.5"],
+        [datetime(2024, 1, 2, 3, 4, 5, 600), datetime(1969, 12, 31, 23, 59, 59)],
+    ],
+)
+def test_parse_date_array(values):
+    expected = np.array(["2024-01-02T03:04:05", "1969-12-31T23:59:59"], dtype="datetime64[s]")
+
+    assert (parse_date_array(values) == expected).all()
+
+
+def test_parse_date_array_converts_offsets_to_utc():
+    values = ["2024-01-01T23:00:00-05:00", "2024-01-02T03:04:05.500+01:00", "2024-01-02T00:00:00Z"]
+    expected = np.array(
+        ["2024-01-02T04:00:00", "2024-01-02T02:04:05", "2024-01-02T00:00:00"], dtype="datetime64[s]"
+    )
+
+    assert (parse_date_array(values) == expected).all()
+    assert max_date_mask(values, "2024-01-02T01:00:00Z").tolist() == [True, True, False]
+
+
+def test_max_date_mask():
+    dates = ["2024-01-01T23:00:00Z", "2024-01-02T00:00:00Z", "2024-01-02T01:00:01.9Z"]
+
+    assert max_date_mask(dates, datetime(2024, 1, 2, 1)).tolist() == [False, False, True]
+    assert max_date_mask(dates, "2024-01-01T12:00:00Z", by_date=True).tolist() == [
+        False, True, True
+    ]
+
+
+def test_filter_based_on_max_dates():
+    records = [
+        {"id": 1, "modifiedDateTime": "2024-01-01T00:00:00.000Z"},
+        {"id": 2, "modifiedDateTime": "2024-03-01T08:30:00.000Z"},
+    ]
+
+    results = filter_based_on_max_dates(records, datetime(2024, 2, 1))
+
+    assert results == [{"id": 2, "modifiedDateTime": datetime(2024, 3, 1, 8, 30)}]
+    assert filter_based_on_max_dates([], datetime(2024, 2, 1)) == []
+
+
+def test_no_cutoff_keeps_every_record():
+    records = [
+        {"id": 1, "modifiedDateTime": "2024-01-01T00:00:00.000Z"},
+        {"id": 2, "modifiedDateTime": "2024-03-01T08:30:00.000Z"},
+    ]
+
+    results = filter_based_on_max_dates(records, None)
+
+    assert [result["id"] for result in results] == [1, 2]
+    assert results[0]["modifiedDateTime"] == datetime(2024, 1, 1)
@@ -0,0 +1,54 @@
+"""
+Unit tests for the cached date format detection
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from etl.connectors._dates import DateFormatCache, date_formats, infer_date_format
+from etl.connectors._utils import is_datetime
+
+
+@pytest.mark.parametrize(
+    "sample, expected",
+    [
+        (["2024-01-02T03:04:05.123Z", "2024-01-03T00:00:00.000Z"], "%Y-%m-%dT%H:%M:%S.%f%z"),
+        (["2024-01-02 03:04:05"], "%Y-%m-%d %H:%M:%S"),
+        (["2021-09-23"], "%Y-%m-%d"),
+        (["09/23/2021"], "%m/%d/%Y"),
+        (["not a date"], None),
+    ],
+)
+def test_infer_date_format(sample, expected):
+    assert infer_date_format(sample) == expected
+
+
+def test_format_is_detected_once():
+    date_formats = DateFormatCache(sample_size=2)
+    values = pd.Series(["2024-01-02", "2024-01-03", "not a date", None])
+
+    parsed = date_formats.parse(values, "nwea", "testDate")
+
+    assert date_formats.get_format("nwea", "testDate") == "%Y-%m-%d"
+    assert parsed[:2].tolist() == [pd.Timestamp("2024-01-02"), pd.Timestamp("2024-01-03")]
+    assert parsed[2:].isna().all()
+
+
+def test_rows_in_other_formats_are_parsed_slowly():
+    date_formats = DateFormatCache()
+    values = ["2024-01-02T03:04:05.000Z"] * 3 + ["2024-01-05"]
+
+    parsed = date_formats.parse(values, "nwea", "modifiedDateTime")
+
+    assert str(parsed.dt.tz) == "UTC"
+    assert parsed.iloc[-1] == pd.Timestamp("2024-01-05", tz="UTC")
+
+
+def test_is_datetime():
+    assert is_datetime(datetime(2024, 1, 2))
+    assert is_datetime("2021-09-23", source="test", field="cutoff")
+    assert is_datetime("2021-09-23T00:00:00Z", source="test", field="cutoff")
+    assert not is_datetime("not a date", source="test", field="cutoff")
+    # the odd value didn't replace the format detected from the first
+    assert date_formats.get_format("test", "cutoff") == "%Y-%m-%d"
@@ -31,4 +31,71 @@ class TestFileConnector:
         assert isinstance(loader.pulled_data_, pd.DataFrame)
         assert loader.pulled_data_.shape == (2, 3)
         assert loader.pulled_data_.columns.tolist() == ["a", "b", "c"]
-        assert loader.pulled_data_.values.tolist() == [[1, 2, 3], [4, 5, 6]]
\ No newline at end of file
+        assert loader.pulled_data_.values.tolist() == [[1, 2, 3], [4, 5, 6]]
+    def test_load_json(self, tmp_path):
+        """
+        Test that JSON files are loaded
+        """
+        test_file = tmp_path / "test.json"
+        test_file.write_text('{"a": [1, 2]}')
+
+        loader = FileConnector(method="json", file_path=test_file)
+        loader.pull_data()
+
+        assert loader.pulled_data_ == {"a": [1, 2]}
+
+    @pytest.mark.parametrize(
+        "method, file_name",
+        [("parquet", "test.parquet"), ("feather", "test.feather"), ("ipc", "test.arrow")],
+    )
+    def test_load_columnar_with_projection(self, tmp_path, method, file_name):
+        """
+        Test that columnar files only load the columns asked for
+        """
+        pa = pytest.importorskip("pyarrow")
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
+        data = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"], "c": [0.1, 0.2, 0.3]})
+        test_file = tmp_path / file_name
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        if method == "parquet":
+            pq.write_table(table, test_file)
+        elif method == "feather":
+            feather.write_feather(table, test_file)
+        else:
+            with pa.OSFile(str(test_file), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+        loader = FileConnector(method=method, file_path=test_file, columns=["c", "a"])
+        loader.pull_data()
+
+        assert loader.pulled_data_.columns.tolist() == ["c", "a"]
+        assert loader.pulled_data_["a"].tolist() == [1, 2, 3]
+
+        chunks = list(loader.pull_chunks(chunksize=2))
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        assert pd.concat(chunks, ignore_index=True).equals(loader.pulled_data_)
+
+    def test_pull_chunks_csv(self, tmp_path):
+        """
+        Test that csv files are read a chunk at a time
+        """
+        test_file = tmp_path / "test.csv"
+        test_file.write_text("a,b\n1,2\n3,4\n5,6\n")
+
+        loader = FileConnector(method="pandas", file_path=test_file, columns=["b"])
+        chunks = list(loader.pull_chunks(chunksize=2))
+
+        assert [chunk["b"].tolist() for chunk in chunks] == [[2, 4], [6]]
+
+    def test_invalid_method(self, tmp_path):
+        """
+        Test that unknown methods are rejected
+        """
+        test_file = tmp_path / "test.csv"
+        test_file.write_text("a\n1\n")
+
+        with pytest.raises(ValueError):
+            FileConnector(method="excel", file_path=test_file).pull_data()
@@ -0,0 +1,39 @@
+"""
+Unit tests for the JSON decoders
+"""
+import json
+
+import pytest
+import requests
+
+from etl.connectors._json import get_decoder, decode_response, benchmark
+
+
+PAGE = json.dumps({"classes": [{"sourcedId": "é", "grades": ["09"]}]}).encode()
+
+
+@pytest.mark.parametrize("name", ["auto", "orjson", "ujson", "stdlib"])
+def test_decoders_agree_with_stdlib(name):
+    # decoders that aren't installed fall back to the stdlib
+    decoder = get_decoder(name)
+
+    assert decoder.loads(PAGE) == json.loads(PAGE)
+
+
+def test_invalid_decoder():
+    with pytest.raises(ValueError):
+        get_decoder("yaml")
+
+
+def test_decode_response_uses_raw_bytes():
+    resp = requests.Response()
+    resp._content = PAGE
+
+    assert decode_response(resp, get_decoder("stdlib")) == json.loads(PAGE)
+
+
+def test_benchmark_reports_each_installed_decoder():
+    results = benchmark([PAGE], names=["stdlib"], repeat=1)
+
+    assert list(results) == ["stdlib"]
+    assert results["stdlib"] > 0
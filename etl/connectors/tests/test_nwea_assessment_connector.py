@@ -1,14 +1,27 @@
 """
 Unit tests for NWEA Assessment Connector
 """
+import json
 import pytest
+import requests
 from unittest.mock import patch, MagicMock
 from etl.connectors.nwea import NWEAAssessmentConnector
+from etl.connectors._auth import get_nwea_token_manager
+from etl.connectors._retry import CircuitBreaker, RetryPolicy
+from etl.connectors.tests.conftest import make_response
 
 import pandas as pd
 
 # TO DO:  update tests to match actual API response -- don't work right now
 
+# Keep cached tokens from leaking between tests
+@pytest.fixture(autouse=True)
+def isolated_token_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr("etl.connectors._auth.TOKEN_CACHE_DIR", str(tmp_path))
+    get_nwea_token_manager.cache_clear()
+    yield
+    get_nwea_token_manager.cache_clear()
+
 # Fixture for a successful API response
 @pytest.fixture
 def mock_successful_response():
@@ -24,6 +37,7 @@ def mock_successful_response():
         ],
         "pagination": {"hasNextPage": False}
     }
+    mock_response.content = json.dumps(mock_response.json.return_value).encode()
     mock_response.status_code = 200
     return mock_response
 
@@ -74,4 +88,242 @@ def test_pull_data_failure(mock_get, mock_post, mock_failed_response, mock_auth_
     )
 
     with pytest.raises(ValueError):
-        connector.pull_data()
\ No newline at end of file
+        connector.pull_data()
+
+def _paginated_get(method, url, params=None, headers=None):
+    """Serve two pages for bid_a, a server error for bid_b"""
+    if params["school-bid"] == "bid_b":
+        return make_response(500)
+
+    if params.get("next-page") is None:
+        return make_response(200, {
+            "testResults": [{"testResultBid": 1,
+                             "modifiedDateTime": "2024-01-01T00:00:00"}],
+            "pagination": {"hasNextPage": True, "nextPage": "page_2"},
+        })
+
+    return make_response(200, {
+        "testResults": [{"testResultBid": 2,
+                         "modifiedDateTime": "2022-01-01T00:00:00"}],
+        "pagination": {"hasNextPage": False},
+    })
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_pull_bids(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = _paginated_get
+
+    connector = NWEAAssessmentConnector(
+        url="http://example.api.com/data",
+        params={},
+        bid=None,
+        max_concurrency=2,
+    )
+
+    results = connector.pull_bids(
+        bids=["bid_a", "bid_b"],
+        cutoffs={"bid_a": pd.to_datetime("2023-09-23")},
+    )
+    results = {bid: (records, error) for bid, records, error in results}
+
+    records, error = results["bid_a"]
+    assert error is None
+    assert [record["testResultBid"] for record in records] == [1]
+
+    records, error = results["bid_b"]
+    assert records == []
+    assert error["school-bid"] == "bid_b"
+    assert error["error-type"] == "api-error"
+
+    # authenticated once for every bid, not once per page
+    assert mock_post.call_count == 1
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_pull_many(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = _paginated_get
+
+    connector = NWEAAssessmentConnector(
+        url="http://example.api.com/data",
+        params={},
+        bid=None,
+    )
+
+    results = connector.pull_many(
+        bids=["bid_a", "bid_b", "bid_c"],
+        cutoffs={"bid_a": pd.to_datetime("2023-09-23")},
+        max_concurrency=3,
+    )
+    results = {bid: (data, error) for bid, data, error in results}
+
+    data, error = results["bid_a"]
+    assert error is None
+    assert data["testResultBid"].tolist() == [1]
+    assert data["PARENT_SCHOOL_BID"].tolist() == ["bid_a"]
+
+    # bid_c has no cutoff, so every record is kept
+    data, error = results["bid_c"]
+    assert data["testResultBid"].tolist() == [1, 2]
+
+    data, error = results["bid_b"]
+    assert data.empty
+    assert error["school-bid"] == "bid_b"
+
+    # the connector's own state isn't touched
+    assert connector.bid is None
+    assert connector.params == {}
+
+
+def _broken_get(method, url, params=None, headers=None):
+    """Drop the connection for bid_b, serve a malformed page for bid_c"""
+    if params["school-bid"] == "bid_b":
+        raise requests.ConnectionError("Connection reset by peer")
+    if params["school-bid"] == "bid_c":
+        return make_response(200, {"unexpected": []})
+    return _paginated_get(method, url, params, headers)
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_pull_many_continues_after_failed_bids(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = _broken_get
+
+    connector = NWEAAssessmentConnector(
+        url="http://example.api.com/data",
+        params={},
+        bid=None,
+        retry_policy=RetryPolicy(max_attempts=1, circuit_breaker=CircuitBreaker()),
+    )
+
+    results = connector.pull_many(bids=["bid_b", "bid_c", "bid_a"], max_concurrency=1)
+    results = {bid: (data, error) for bid, data, error in results}
+
+    assert set(results) == {"bid_a", "bid_b", "bid_c"}
+    assert results["bid_a"][1] is None
+    assert results["bid_a"][0]["testResultBid"].tolist() == [1, 2]
+    assert results["bid_b"][1]["message"] == "Connection reset by peer"
+    assert "testResults" in results["bid_c"][1]["message"]
+
+
+def _newest_first_get(method, url, params=None, headers=None):
+    """Serve four pages of records ordered newest first"""
+    pages = {
+        None: ("2024-03-01T00:00:00", "page_2"),
+        "page_2": ("2024-01-01T00:00:00", "page_3"),
+        "page_3": ("2023-01-01T00:00:00", "page_4"),
+        "page_4": ("2022-01-01T00:00:00", None),
+    }
+    modified, next_page = pages[params.get("next-page")]
+    return make_response(200, {
+        "testResults": [{"testResultBid": modified, "modifiedDateTime": modified}],
+        "pagination": {"hasNextPage": next_page is not None, "nextPage": next_page},
+    })
+
+
+@pytest.mark.parametrize("record_order, num_requests", [(None, 4), ("descending", 3)])
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_stops_paginating_stale_pages(
+    mock_get, mock_post, mock_auth_response, record_order, num_requests
+):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = _newest_first_get
+
+    connector = NWEAAssessmentConnector(
+        url="http://example.api.com/data",
+        params={"school-bid": "test_bid"},
+        bid="test_bid",
+        max_date=pd.to_datetime("2023-09-23"),
+        record_order=record_order,
+    )
+    connector._paginate_response()
+
+    assert len(connector.api_results_) == 2
+    assert mock_get.call_count == num_requests
+    assert connector.stale_pages_stopper_.stopped_early_ == (record_order is not None)
+    assert connector.num_pages_skipped_ == 4 - num_requests
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_pull_bids_reauthenticates_on_401(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = [
+        make_response(401),
+        make_response(200, {"testResults": [], "pagination": {"hasNextPage": False}}),
+    ]
+
+    connector = NWEAAssessmentConnector(
+        url="http://example.api.com/data",
+        params={},
+        bid=None,
+        max_concurrency=1,
+    )
+
+    results = connector.pull_bids(bids=["bid_a"])
+
+    assert results == [("bid_a", [], None)]
+    assert mock_post.call_count == 2
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_iter_record_batches(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    pages = [
+        make_response(200, {
+            "testResults": [{"testResultBid": i,
+                             "modifiedDateTime": "2024-01-01T00:00:00"}
+                            for i in range(3)],
+            "pagination": {"hasNextPage": True, "nextPage": "page_2"},
+        }),
+        make_response(200, {
+            "testResults": [{"testResultBid": i,
+                             "modifiedDateTime": "2024-01-01T00:00:00"}
+                            for i in range(3, 5)],
+            "pagination": {"hasNextPage": False},
+        }),
+    ]
+    mock_get.side_effect = pages
+
+    connector = NWEAAssessmentConnector(
+        url="http://example.api.com/data",
+        params={"school-bid": "test_bid"},
+        bid="test_bid",
+    )
+
+    batches = connector.iter_record_batches(batch_size=2)
+
+    # pages are only requested as batches are consumed
+    first_batch = next(batches)
+    assert mock_get.call_count == 1
+    assert first_batch["testResultBid"].tolist() == [0, 1]
+    assert (first_batch["PARENT_SCHOOL_BID"] == "test_bid").all()
+
+    rest = [batch["testResultBid"].tolist() for batch in batches]
+    assert rest == [[2, 3], [4]]
+    assert mock_get.call_count == 2
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_refreshes_token_once_on_repeated_401(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.return_value = make_response(401)
+
+    connector = NWEAAssessmentConnector(
+        url="http://example.api.com/data",
+        params={"school-bid": "test_bid"},
+        bid="test_bid",
+    )
+
+    with pytest.raises(ValueError, match="401"):
+        connector.pull_data()
+
+    assert mock_get.call_count == 2
+    assert connector.error_["message"] == 401
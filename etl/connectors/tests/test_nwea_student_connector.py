@@ -0,0 +1,194 @@
+"""
+Unit tests for NWEA Student Connector
+"""
+import time
+
+import pytest
+from unittest.mock import patch, MagicMock
+
+import pandas as pd
+import requests
+
+from etl.connectors.nwea import NWEAStudentConnector
+from etl.connectors._auth import get_nwea_token_manager
+from etl.connectors._retry import CircuitBreaker, RetryPolicy
+from etl.connectors.tests.conftest import make_response
+
+
+# Keep cached tokens from leaking between tests
+@pytest.fixture(autouse=True)
+def isolated_token_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr("etl.connectors._auth.TOKEN_CACHE_DIR", str(tmp_path))
+    get_nwea_token_manager.cache_clear()
+    yield
+    get_nwea_token_manager.cache_clear()
+
+
+@pytest.fixture
+def mock_auth_response():
+    mock_response = MagicMock()
+    mock_response.json.return_value = {"access_token": "test_token"}
+    return mock_response
+
+
+def _student_get(method, url, params=None, headers=None):
+    """Serve a profile for every student, but student_3 errors and student_4 is empty"""
+    bid = url.rsplit("/", 1)[-1]
+    if bid == "student_3":
+        return make_response(404)
+    if bid == "student_4":
+        return make_response(200)
+
+    return make_response(200, {
+        "studentBid": bid,
+        "firstName": "Ada",
+        "grade": 5,
+        "middleName": None,
+        "personalNeedsProfile": {"large": "payload"},
+    })
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_iter_record_batches(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = _student_get
+
+    connector = NWEAStudentConnector(
+        bids=[f"student_{i}" for i in range(6)],
+        existing_students=["student_0"],
+        fields=["studentBid", "firstName", "grade", "middleName"],
+        max_concurrency=3,
+        chunk_size=2,
+    )
+
+    batches = list(connector.iter_record_batches(batch_size=2))
+    data = pd.concat(batches, ignore_index=True)
+
+    # existing students are never requested
+    assert mock_get.call_count == 5
+    assert sorted(data["studentBid"]) == ["student_1", "student_2", "student_5"]
+    assert data.columns.tolist() == ["studentBid", "firstName", "grade", "middleName"]
+    assert data["grade"].tolist() == ["5"] * 3
+    assert data["middleName"].tolist() == [""] * 3
+
+    errors = {error["student-bid"]: error for error in connector.errors_}
+    assert errors["student_3"]["error-type"] == "api-error"
+    assert errors["student_4"]["error-type"] == "empty-response"
+
+    # one token for every student
+    assert mock_post.call_count == 1
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_reauthenticates_on_401(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = [make_response(401), make_response(200, {"studentBid": "student_1"})]
+
+    connector = NWEAStudentConnector(bids=["student_1"], max_concurrency=1)
+
+    assert connector.pull_data()["studentBid"].tolist() == ["student_1"]
+    assert mock_post.call_count == 2
+
+
+def _roster_get(method, url, params=None, headers=None):
+    """Serve school_a's roster, fail school_b's, and every student's profile"""
+    if url.endswith("school_a/students"):
+        return make_response(200, [
+            {"studentBid": "student_1", "firstName": "Roster"},
+            {"studentBid": "student_9", "firstName": "Not wanted"},
+        ])
+    if url.endswith("school_b/students"):
+        return make_response(500)
+
+    return make_response(200, {"studentBid": url.rsplit("/", 1)[-1], "firstName": "Single"})
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_school_rosters_with_fallback(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = _roster_get
+
+    connector = NWEAStudentConnector(
+        bids=["student_1", "student_2", "student_3", "student_4"],
+        student_schools={
+            "student_1": "school_a",
+            "student_2": "school_a",
+            "student_3": "school_b",
+        },
+        fields=["studentBid", "firstName"],
+    )
+
+    data = connector.pull_data().set_index("studentBid")
+
+    assert data["firstName"].to_dict() == {
+        "student_1": "Roster",
+        "student_2": "Single",
+        "student_3": "Single",
+        "student_4": "Single",
+    }
+    assert connector.served_by_["student_1"] == "school-roster"
+    assert connector.strategy_counts() == {"school-roster": 1, "student": 3}
+    # 2 rosters and 3 students
+    assert mock_get.call_count == 5
+
+
+def _dropped_get(method, url, params=None, headers=None):
+    """Drop the connection for school_a's roster and student_2's profile"""
+    if url.endswith("school_a/students") or url.endswith("student_2"):
+        raise requests.ConnectionError("Connection reset by peer")
+
+    return make_response(200, {"studentBid": url.rsplit("/", 1)[-1], "firstName": "Single"})
+
+
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_failed_requests_dont_stop_the_pull(mock_get, mock_post, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = _dropped_get
+
+    connector = NWEAStudentConnector(
+        bids=["student_1", "student_2", "student_3"],
+        student_schools={"student_1": "school_a", "student_2": "school_a"},
+        fields=["studentBid", "firstName"],
+        retry_policy=RetryPolicy(max_attempts=1, circuit_breaker=CircuitBreaker()),
+    )
+
+    data = connector.pull_data()
+
+    # the failed roster falls back to a call per student
+    assert sorted(data["studentBid"]) == ["student_1", "student_3"]
+    assert [error["student-bid"] for error in connector.errors_] == ["student_2"]
+
+
+def test_iter_async_waits_for_a_slow_caller():
+    produced = []
+
+    async def profiles():
+        for i in range(50):
+            produced.append(i)
+            yield i
+
+    connector = NWEAStudentConnector(bids=[], max_concurrency=2)
+    results = connector._iter_async(profiles())
+
+    assert next(results) == 0
+    time.sleep(0.3)
+    # 2 queued and 1 waiting for room, not all 50 profiles
+    assert len(produced) <= 4
+    assert list(results) == list(range(1, 50))
+
+
+@patch('etl.connectors._base.session_pool')
+@patch('etl.connectors._http.session_pool.post')
+@patch('etl.connectors._http.session_pool.request')
+def test_connection_pool_fits_every_thread(mock_get, mock_post, mock_pool, mock_auth_response):
+    mock_post.return_value = mock_auth_response
+    mock_get.side_effect = _student_get
+
+    connector = NWEAStudentConnector(bids=["student_1"], max_concurrency=32)
+    connector.pull_data()
+
+    mock_pool.reserve.assert_called_once_with("https://api.nwea.org/students/v2", 32)
@@ -0,0 +1,102 @@
+"""
+Unit tests for the OffsetPaginator and StalePageStopper
+"""
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from etl.connectors._pagination import OffsetPaginator, StalePageStopper, get_record_order
+
+
+def _make_fetch_page(num_records, page_size, delays=None):
+    """Serve num_records in pages, recording every offset requested"""
+    requested = []
+    lock = threading.Lock()
+
+    def fetch_page(offset):
+        with lock:
+            requested.append(offset)
+        if delays is not None:
+            time.sleep(delays.get(offset, 0))
+        return list(range(offset, min(offset + page_size, num_records)))
+
+    return fetch_page, requested
+
+
+def test_pages_are_yielded_in_order():
+    # later pages finish first
+    delays = {0: 0.05, 10: 0.03, 20: 0.01}
+    fetch_page, requested = _make_fetch_page(45, 10, delays)
+
+    pages = list(OffsetPaginator(fetch_page, page_size=10, max_prefetch=4))
+
+    assert [offset for offset, _ in pages] == [0, 10, 20, 30, 40]
+    assert [record for _, page in pages for record in page] == list(range(45))
+
+
+def test_single_page_costs_one_request():
+    fetch_page, requested = _make_fetch_page(3, 10)
+
+    pages = list(OffsetPaginator(fetch_page, page_size=10, max_prefetch=8))
+
+    assert pages == [(0, [0, 1, 2])]
+    assert requested == [0]
+
+
+def test_prefetch_window_grows_and_is_bounded():
+    fetch_page, requested = _make_fetch_page(995, 10)
+    paginator = OffsetPaginator(fetch_page, page_size=10, max_prefetch=4)
+
+    pages = list(paginator)
+
+    assert len(pages) == 100
+    # offsets past the last page are requested at most max_prefetch - 1 times
+    assert 100 < paginator.num_requests_ <= 103
+
+
+def test_stops_on_failed_page():
+    def fetch_page(offset):
+        return None if offset == 20 else list(range(10))
+
+    pages = list(OffsetPaginator(fetch_page, page_size=10, max_prefetch=2))
+
+    assert [offset for offset, _ in pages] == [0, 10, 20]
+    assert pages[-1][1] is None
+
+
+def test_fetch_errors_are_raised_in_order():
+    def fetch_page(offset):
+        if offset == 10:
+            raise ConnectionError("reset")
+        return list(range(10))
+
+    paginator = iter(OffsetPaginator(fetch_page, page_size=10, max_prefetch=4))
+
+    assert next(paginator)[0] == 0
+    with pytest.raises(ConnectionError):
+        next(paginator)
+
+
+def test_pages_with_undated_records_are_not_stale():
+    stopper = StalePageStopper(datetime(2024, 1, 1), record_order="descending")
+
+    assert not stopper.check([{"modifiedDateTime": "2023-06-01"}, {"testResultBid": "t1"}])
+    assert stopper.num_stale_pages_ == 0
+    assert stopper.check([{"modifiedDateTime": "2023-06-01"}])
+    assert stopper.stopped_early_
+
+
+def test_last_page_saves_no_requests():
+    stopper = StalePageStopper(datetime(2024, 1, 1), record_order="descending")
+
+    assert not stopper.check([{"modifiedDateTime": "2023-06-01"}], has_next_page=False)
+    assert not stopper.stopped_early_
+    assert stopper.num_pages_skipped_ == 0
+    assert stopper.check([{"modifiedDateTime": "2023-06-01"}], has_next_page=True)
+    assert stopper.num_pages_skipped_ == 1
+
+
+def test_nwea_test_results_are_newest_first():
+    assert get_record_order("https://api.nwea.org/test-results/v1/growth/") == "descending"
@@ -0,0 +1,123 @@
+"""
+Unit tests for the shared AdaptiveRateLimiter
+"""
+import json
+from unittest.mock import MagicMock
+
+from etl.connectors._ratelimit import AdaptiveRateLimiter, TokenBucket
+from etl.connectors._retry import RetryPolicy
+
+
+URL = "https://api.example.com/data"
+
+
+def _make_limiter(**limiter_kwargs):
+    """Limiter that records its waits instead of sleeping"""
+    limiter = AdaptiveRateLimiter(**limiter_kwargs)
+    limiter.waits_ = []
+    limiter._sleep = limiter.waits_.append
+    return limiter
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=2, burst=2)
+
+    waits = [bucket.reserve() for _ in range(4)]
+
+    assert waits[:2] == [0.0, 0.0]
+    # each request past the burst waits another 1 / rate seconds
+    assert 0.45 < waits[2] <= 0.5
+    assert 0.95 < waits[3] <= 1.0
+
+
+def test_rate_increases_while_healthy():
+    limiter = _make_limiter(initial_rate=4, max_rate=5, increase_step=1)
+
+    for _ in range(4):
+        limiter.record(URL, 200)
+
+    # one second's worth of healthy responses adds about increase_step
+    assert 4.9 < limiter.get_rate(URL) <= 5
+
+    for _ in range(100):
+        limiter.record(URL, 200)
+
+    assert limiter.get_rate(URL) == 5
+
+
+def test_rate_decreases_once_per_burst_of_throttles():
+    limiter = _make_limiter(initial_rate=8, min_rate=1)
+
+    limiter.record(URL, 429)
+    # responses that were already in flight don't halve the rate again
+    limiter.record(URL, 429)
+    limiter.record(URL, 503)
+
+    assert limiter.get_rate(URL) == 4
+
+    limiter._buckets["api.example.com"].last_decrease_ -= 1
+    limiter.record(URL, 503)
+
+    assert limiter.get_rate(URL) == 2
+
+
+def test_buckets_per_host_and_tenant():
+    limiter = _make_limiter(initial_rate=8)
+
+    limiter.record(URL, 429, tenant="district_a")
+
+    assert limiter.get_rate(URL, tenant="district_a") == 4
+    assert limiter.get_rate(URL, tenant="district_b") == 8
+    assert limiter.get_rate(URL) == 8
+    assert limiter.get_rate("https://other.example.com/data") == 8
+
+
+def test_configured_throttle_statuses():
+    limiter = _make_limiter(initial_rate=8)
+    limiter.configure(URL, throttle_statuses=[403, 429])
+
+    limiter.record(URL, 403)
+
+    assert limiter.get_rate(URL) == 4
+    # other hosts keep the default throttle statuses
+    limiter.record("https://other.example.com/data", 403)
+    assert limiter.get_rate("https://other.example.com/data") > 8
+
+
+def test_learned_rates_persist_between_runs(tmp_path):
+    state_path = str(tmp_path / "rate_limits.json")
+
+    limiter = _make_limiter(initial_rate=8, state_path=state_path)
+    limiter.record(URL, 429)
+    limiter.save()
+
+    # another job saved a rate for a different host in the meantime
+    with open(state_path) as f:
+        rates = json.load(f)
+    rates["other.example.com"] = 3.0
+    with open(state_path, "w") as f:
+        json.dump(rates, f)
+
+    limiter.save()
+    next_run = _make_limiter(initial_rate=8, state_path=state_path)
+
+    assert next_run.get_rate(URL) == 4
+    assert next_run.get_rate("https://other.example.com") == 3
+
+
+def test_retry_policy_paces_and_records_every_attempt():
+    limiter = MagicMock()
+    session = MagicMock()
+    session.request.side_effect = [MagicMock(status_code=429, headers={}),
+                                   MagicMock(status_code=200, headers={})]
+    policy = RetryPolicy(session=session, rate_limiter=limiter)
+    policy._sleep = lambda wait_time: None
+
+    policy.get(URL, tenant="district_a")
+
+    assert limiter.acquire.call_count == 2
+    limiter.acquire.assert_called_with(URL, "district_a")
+    assert [c.args for c in limiter.record.call_args_list] == [
+        (URL, 429, "district_a"),
+        (URL, 200, "district_a"),
+    ]
@@ -0,0 +1,127 @@
+"""
+Unit tests for the on-disk ResponseCache
+"""
+import os
+
+import pytest
+from unittest.mock import MagicMock
+
+from etl.connectors._cache import ResponseCache, CacheMissError
+from etl.connectors._retry import RetryPolicy
+
+
+URL = "https://api.example.com/data"
+
+
+def test_conditional_request_served_from_cache(tmp_path, make_response):
+    session = MagicMock()
+    cache = ResponseCache(cache_dir=str(tmp_path), mode="revalidate")
+
+    session.request.return_value = make_response(
+        200, body=b'{"page": 1}', headers={"ETag": '"v1"', "Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"}
+    )
+    first = cache.request(session, "GET", URL, params={"page": 1}, headers={"apikey": "key"})
+
+    assert first.json() == {"page": 1}
+    assert "If-None-Match" not in session.request.call_args.kwargs["headers"]
+
+    session.request.return_value = make_response(304)
+    second = cache.request(session, "GET", URL, params={"page": 1}, headers={"apikey": "key"})
+
+    headers = session.request.call_args.kwargs["headers"]
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == "Mon, 05 Oct 2026 10:00:00 GMT"
+    assert headers["apikey"] == "key"
+    assert second.status_code == 200
+    assert second.json() == {"page": 1}
+    assert second.from_cache
+
+    assert cache.stats() == {"hits": 0, "not_modified": 1, "misses": 1, "stored": 1}
+
+
+def test_keyed_by_params_and_tenant(tmp_path):
+    keys = {
+        ResponseCache.make_key(URL, {"page": 1, "size": 10}),
+        ResponseCache.make_key(URL, {"page": 2, "size": 10}),
+        ResponseCache.make_key(URL, {"page": 1, "size": 10}, tenant="district_a"),
+    }
+
+    assert len(keys) == 3
+    # param order doesn't matter
+    assert ResponseCache.make_key(URL, {"page": 1, "size": 10}) == ResponseCache.make_key(
+        URL, {"size": 10, "page": 1}
+    )
+
+
+def test_identical_bodies_stored_once(tmp_path, make_response):
+    session = MagicMock()
+    session.request.return_value = make_response(200, body=b'{"same": true}')
+    cache = ResponseCache(cache_dir=str(tmp_path), mode="revalidate")
+
+    cache.request(session, "GET", URL, tenant="district_a")
+    cache.request(session, "GET", URL, tenant="district_b")
+
+    bodies = [f for _, _, files in os.walk(tmp_path / "bodies") for f in files]
+    entries = [f for _, _, files in os.walk(tmp_path / "entries") for f in files]
+    assert len(bodies) == 1
+    assert len(entries) == 2
+
+
+@pytest.mark.skipif(os.name != "posix", reason="file modes are POSIX only")
+def test_only_the_current_user_can_read_the_cache(tmp_path, make_response):
+    session = MagicMock()
+    session.request.return_value = make_response(200, body=b'{"student": "data"}')
+    cache_dir = tmp_path / "http_cache"
+    ResponseCache(cache_dir=str(cache_dir), mode="revalidate").request(session, "GET", URL)
+
+    for root, dirs, files in os.walk(cache_dir):
+        assert os.stat(root).st_mode & 0o777 == 0o700
+        for f in files:
+            assert os.stat(os.path.join(root, f)).st_mode & 0o777 == 0o600
+
+
+def test_replay_never_calls_the_api(tmp_path, make_response):
+    session = MagicMock()
+    session.request.return_value = make_response(200, body=b'{"page": 1}')
+    ResponseCache(cache_dir=str(tmp_path), mode="revalidate").request(
+        session, "GET", URL, tenant="district_a"
+    )
+    session.reset_mock()
+
+    cache = ResponseCache(cache_dir=str(tmp_path), mode="replay")
+
+    assert cache.request(session, "GET", URL, tenant="district_a").json() == {"page": 1}
+    with pytest.raises(CacheMissError):
+        cache.request(session, "GET", URL, tenant="district_b")
+    session.request.assert_not_called()
+
+
+def test_errors_and_posts_are_not_cached(tmp_path, make_response):
+    session = MagicMock()
+    cache = ResponseCache(cache_dir=str(tmp_path), mode="revalidate")
+
+    session.request.return_value = make_response(500)
+    cache.request(session, "GET", URL)
+    session.request.return_value = make_response(200, body=b"token")
+    cache.request(session, "POST", URL)
+
+    assert cache.stats()["stored"] == 0
+    assert not (tmp_path / "entries").exists()
+
+
+def test_retry_policy_replays_without_pacing(tmp_path, make_response):
+    session = MagicMock()
+    session.request.return_value = make_response(200, body=b"[]")
+    ResponseCache(cache_dir=str(tmp_path), mode="revalidate").request(session, "GET", URL)
+    session.reset_mock()
+
+    rate_limiter = MagicMock()
+    policy = RetryPolicy(
+        session=session,
+        rate_limiter=rate_limiter,
+        cache=ResponseCache(cache_dir=str(tmp_path), mode="replay"),
+    )
+
+    assert policy.get(URL).json() == []
+    session.request.assert_not_called()
+    rate_limiter.acquire.assert_not_called()
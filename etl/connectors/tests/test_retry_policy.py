@@ -0,0 +1,146 @@
+"""
+Unit tests for the shared RetryPolicy and CircuitBreaker
+"""
+import pytest
+import requests
+from unittest.mock import MagicMock
+
+from etl.connectors._retry import RetryPolicy, CircuitBreaker, CircuitOpenError
+
+
+URL = "https://api.example.com/data"
+
+
+def _make_policy(responses, **policy_kwargs):
+    """Policy whose session serves responses in order and records every wait"""
+    session = MagicMock()
+    session.request.side_effect = responses
+    policy = RetryPolicy(session=session, **policy_kwargs)
+    policy.waits_ = []
+    policy._sleep = policy.waits_.append
+    return policy
+
+
+def test_retries_until_success(make_response):
+    policy = _make_policy(
+        [make_response(503), make_response(503), make_response(200)],
+        jitter=False,
+    )
+
+    resp = policy.get(URL, params={"page": 1})
+
+    assert resp.status_code == 200
+    assert policy.session.request.call_count == 3
+    policy.session.request.assert_called_with("GET", URL, params={"page": 1})
+    # exponential backoff, no jitter
+    assert policy.waits_ == [1.0, 2.0]
+    assert policy.retries_used_ == 2
+
+
+def test_jitter_stays_within_backoff():
+    policy = _make_policy([], backoff_factor=4, max_backoff=10)
+
+    for num_attempts in range(1, 6):
+        wait_time = policy.get_wait_time(num_attempts)
+        assert 0 <= wait_time <= min(4 * 2 ** (num_attempts - 1), 10)
+
+
+def test_honours_retry_after(make_response):
+    policy = _make_policy(
+        [make_response(429, headers={"Retry-After": "7"}), make_response(200)],
+        max_retry_after=5,
+    )
+
+    policy.get(URL)
+
+    # capped at max_retry_after
+    assert policy.waits_ == [5]
+
+
+def test_returns_last_response_after_max_attempts(make_response):
+    policy = _make_policy([make_response(504)] * 3, max_attempts=3)
+
+    resp = policy.get(URL)
+
+    assert resp.status_code == 504
+    assert policy.session.request.call_count == 3
+    assert len(policy.waits_) == 2
+
+
+def test_per_request_retry_statuses(make_response):
+    policy = _make_policy([make_response(404)])
+
+    resp = policy.get(URL, retry_statuses=[504])
+
+    assert resp.status_code == 404
+    assert policy.session.request.call_count == 1
+
+
+def test_retry_budget_is_shared_by_every_request(make_response):
+    policy = _make_policy([make_response(503)] * 10, retry_budget=3)
+
+    policy.get(URL)
+    policy.get(URL)
+
+    assert policy.retries_used_ == 3
+    # 4 attempts for the first request, then 1 for the second
+    assert policy.session.request.call_count == 5
+
+    policy.reset_budget()
+    assert policy.retries_used_ == 0
+
+
+def test_retries_connection_errors(make_response):
+    policy = _make_policy(
+        [requests.exceptions.ConnectionError("reset"), make_response(200)]
+    )
+
+    assert policy.get(URL).status_code == 200
+
+    policy = _make_policy([requests.exceptions.Timeout("slow")] * 2, max_attempts=2)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        policy.get(URL)
+
+
+def test_circuit_breaker_stops_calling_failing_host(make_response):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    policy = _make_policy([make_response(502)] * 10, circuit_breaker=breaker)
+
+    with pytest.raises(CircuitOpenError):
+        policy.get(URL)
+
+    assert policy.session.request.call_count == 3
+    assert breaker.is_open("api.example.com")
+
+    # other hosts are unaffected
+    assert breaker.allow_request("other.example.com")
+
+
+@pytest.mark.parametrize("status_code", [403, 429, 503])
+def test_throttling_doesnt_open_circuit(status_code, make_response):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    policy = _make_policy(
+        [make_response(status_code)] * 4,
+        max_attempts=4,
+        retry_statuses=[403, 429, 503],
+        circuit_breaker=breaker,
+    )
+
+    assert policy.get(URL).status_code == status_code
+    assert policy.session.request.call_count == 4
+    assert not breaker.is_open("api.example.com")
+
+
+def test_circuit_breaker_closes_after_successful_trial(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure("api.example.com")
+    assert not breaker.allow_request("api.example.com")
+
+    # after reset_timeout one trial request is let through
+    now = breaker._opened_at["api.example.com"] + 61
+    monkeypatch.setattr("etl.connectors._retry.time.monotonic", lambda: now)
+    assert breaker.allow_request("api.example.com")
+
+    breaker.record_success("api.example.com")
+    assert not breaker.is_open("api.example.com")
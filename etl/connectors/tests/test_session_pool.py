@@ -0,0 +1,80 @@
+"""
+Unit tests for the shared SessionPool
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from etl.connectors._http import SessionPool
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    """Minimal handler that keeps connections open between requests"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_session_pool_reuses_connections(server_url):
+    pool = SessionPool()
+
+    for page in range(5):
+        resp = pool.get(f"{server_url}/data", params={"page": page}, timeout=5)
+        assert resp.status_code == 200
+
+    host = server_url.replace("http://", "")
+    stats = pool.stats()[host]
+    pool.close()
+
+    assert stats["requests"] == 5
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 4
+
+
+def test_session_pool_one_session_per_host():
+    pool = SessionPool(pool_sizes={"api.nwea.org": 20})
+
+    session = pool.get_session("https://api.nwea.org/students/v2/1")
+    assert pool.get_session("https://api.nwea.org/students/v2/2") is session
+    assert pool.get_session("https://api.clever.com/v3.0/courses") is not session
+    assert session.get_adapter("https://api.nwea.org")._pool_maxsize == 20
+
+    # reconfiguring recreates the sessions with the new pool sizes
+    pool.configure(pool_sizes={"api.nwea.org": 5})
+    session = pool.get_session("https://api.nwea.org/students/v2/1")
+    assert session.get_adapter("https://api.nwea.org")._pool_maxsize == 5
+
+
+def test_reserve_only_grows_the_pool():
+    pool = SessionPool(default_pool_size=10)
+    other = pool.get_session("https://api.clever.com/v3.0/courses")
+
+    pool.reserve("https://api.nwea.org/students/v2", 32)
+    pool.reserve("https://api.nwea.org/students/v2", 4)
+
+    session = pool.get_session("https://api.nwea.org/students/v2/1")
+    assert session.get_adapter("https://api.nwea.org")._pool_maxsize == 32
+    # other hosts keep their sessions
+    assert pool.get_session("https://api.clever.com/v3.0/courses") is other
@@ -0,0 +1,95 @@
+"""
+Unit tests for the token managers
+"""
+import threading
+from unittest.mock import patch, MagicMock
+
+from etl.connectors._auth import _BaseTokenManager, NWEATokenManager
+
+
+class CountingTokenManager(_BaseTokenManager):
+    """Token manager that hands out token_1, token_2, ..."""
+
+    def __init__(self, cache_path=None, refresh_margin=0, expires_in=3600):
+        super().__init__(cache_path, refresh_margin)
+        self.expires_in = expires_in
+
+    def _request_token(self):
+        return f"token_{self.num_refreshes_ + 1}", self.expires_in
+
+
+def test_token_is_cached_until_it_expires():
+    token_manager = CountingTokenManager()
+
+    assert token_manager.get_token() == "token_1"
+    assert token_manager.get_token() == "token_1"
+    assert token_manager.num_refreshes_ == 1
+
+
+def test_token_is_refreshed_ahead_of_expiry():
+    # expires in 60 seconds, but is refreshed when 120 seconds are left
+    token_manager = CountingTokenManager(refresh_margin=120, expires_in=60)
+
+    assert token_manager.get_token() == "token_1"
+    assert token_manager.get_token() == "token_2"
+
+
+def test_concurrent_401s_cause_one_refresh():
+    token_manager = CountingTokenManager()
+    rejected_token = token_manager.get_token()
+
+    def handle_401():
+        token_manager.invalidate(rejected_token)
+        token_manager.get_token()
+
+    threads = [threading.Thread(target=handle_401) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert token_manager.get_token() == "token_2"
+    assert token_manager.num_refreshes_ == 2
+
+
+def test_token_is_shared_through_the_cache_file(tmp_path):
+    cache_path = str(tmp_path / "token.json")
+    first_process = CountingTokenManager(cache_path=cache_path)
+    second_process = CountingTokenManager(cache_path=cache_path)
+
+    assert first_process.get_token() == "token_1"
+    assert second_process.get_token() == "token_1"
+    assert second_process.num_refreshes_ == 0
+
+    # a 401 in the first process makes it refresh the shared token...
+    first_process.invalidate("token_1")
+    assert first_process.get_token() == "token_2"
+
+    # ...and a late 401 with the old token in the second process doesn't
+    # trigger another refresh
+    second_process._expires_at = 0.0
+    second_process.invalidate("token_1")
+    assert second_process.get_token() == "token_2"
+    assert second_process.num_refreshes_ == 0
+
+
+@patch("etl.connectors._auth.session_pool.post")
+def test_nwea_token_manager_headers(mock_post, tmp_path):
+    mock_response = MagicMock()
+    mock_response.json.return_value = {"access_token": "abc", "expires_in": 3600}
+    mock_post.return_value = mock_response
+
+    token_manager = NWEATokenManager(
+        auth_code="auth", api_key="key", cache_path=str(tmp_path / "nwea.json")
+    )
+    headers = token_manager.get_headers()
+
+    assert headers["Authorization"] == "Bearer abc"
+    assert headers["apikey"] == "key"
+
+    token_manager.get_headers()
+    assert mock_post.call_count == 1
+
+    token_manager.invalidate_headers(headers)
+    token_manager.get_headers()
+    assert mock_post.call_count == 2
@@ -2,7 +2,6 @@
 import os
 import time
 import logging
-import requests
 
 import pandas as pd
 import numpy as np
@@ -10,25 +9,71 @@ import numpy as np
 from datetime import datetime
 from dateutil.parser import parse
 from tqdm import tqdm
-import multiprocessing
 
 from etl.api import (
     pull_data_from_api,
     generate_api_header,
+    refresh_api_header,
     connect_to_api,
     pull_api_data_from_bid_list,
 )
+from etl.connectors._cache import response_cache
+from etl.connectors._http import session_pool
+from etl.connectors._json import decode_response
+from etl.connectors._retry import retry_policy
+from etl.connectors._utils import filter_based_on_max_dates as _filter_based_on_max_dates
+from etl.connectors._utils import is_datetime as _is_datetime
+from etl.connectors.nwea import NWEAStudentConnector
+from etl.orchestrators._journal import RunJournal
+from etl.transformers.dataframe_transformers import MultiJSONFlattener
+from etl.transformers._utils import apply_eval, parse_literals
 from etl.config import data_cols_config, student_cols_config
 from etl.validation import validate_data, dtype_config
 
 
-def apply_eval(series_val):
-    """Helper function to apply eval to a series value"""
-    if type(series_val) in [str, bytes]:
-        return eval(series_val)
-    elif type(series_val) in [list, dict]:
-        return series_val
-    return None
+# nested fields of a test result and the columns they're flattened into
+ASSESSMENT_JSON_SPECS = {
+    "items": {
+        "col_mapping": {
+            "shown": "ITEMS_SHOWN",
+            "correct": "ITEMS_CORRECT",
+            "total": "ITEMS_TOTAL",
+        },
+    },
+    "norms": {
+        # reference and type aren't needed
+        "col_mapping": {"percentile": "NORMS_PERCENTILE"},
+        "explode_col": True,
+    },
+    "quantile": {
+        "col_mapping": {
+            "score": "QUANTILE_SCORE",
+            "maximum": "QUANTILE_MAX",
+            "minimum": "QUANTILE_MIN",
+            "range": "QUANTILE_RANGE",
+            "original": "QUANTILE_ORIGINAL",
+        },
+    },
+    "instructionalAreas": {
+        "col_mapping": {
+            "instructionalAreaBid": "INSTRUCTIONAL_AREA_BID",
+            "instructionalAreaName": "INSTRUCTIONAL_AREA_NAME",
+            "score": "INSTRUCTIONAL_AREA_SCORE",
+            "standardError": "INSTRUCTIONAL_AREA_STD_ERR",
+            "scoreLow": "INSTRUCTIONAL_AREA_LOW",
+            "scoreHigh": "INSTRUCTIONAL_AREA_HIGH",
+        },
+        "explode_col": True,
+    },
+    "lexile": {
+        "col_mapping": {
+            "score": "LEXILE_SCORE",
+            "min": "LEXILE_MIN",
+            "max": "LEXILE_MAX",
+            "range": "LEXILE_RANGE",
+        },
+    },
+}
 
 
 def is_datetime_with_datetime_lib(value):
@@ -54,8 +99,8 @@ def is_datetime_with_pandas(value):
 
 
 def is_datetime(value):
-    """Check if value is a datetime object"""
-    return is_datetime_with_datetime_lib(value) or is_datetime_with_pandas(value)
+    """Check if value is a datetime object, with the format cached for cutoff dates"""
+    return _is_datetime(value, source="nwea", field="max_date")
 
 
 def normalize_json_col(
@@ -70,9 +115,8 @@ def normalize_json_col(
     # touching the original data could disrupt later operations
     data_copy = data.copy(deep=True)
 
-    # unnormalized columns are sometimes strings, so eval them
-    # this step is slow, best to try and replace
-    data_copy[json_col] = data_copy[json_col].apply(apply_eval)
+    # unnormalized columns are sometimes strings, so parse them
+    data_copy[json_col] = parse_literals(data_copy[json_col])
 
     if explode_col:
         # must ignore index to match against original dataset
@@ -113,18 +157,8 @@ def filter_based_on_max_dates(
 ) -> list:
     """Filter result set based off of max date currently in results data"""
 
-    # format date so you can compare it
-    max_date = pd.to_datetime(max_date).to_pydatetime()
-    max_date = max_date.date()
-
-    results = []
-    for result in result_set:
-        date_string = format_date_string(result[date_col])
-        result[date_col] = convert_str_to_date(date_string)
-        if result[date_col].date() > max_date:
-            results.append(result)
-
-    return results
+    # the whole page is parsed and compared at once, by calendar day
+    return _filter_based_on_max_dates(result_set, max_date, date_col, by_date=True)
 
 
 def format_date_string(date_string: str) -> str:
@@ -159,8 +193,14 @@ def run_data_pull(
     bids_path: str = "data/nwea.csv",
     errors_path: str = "db/errors.csv",
     api_url: str = "https://api.nwea.org/test-results/v1/growth",
+    resume: bool = False,
+    journal_path: str = "data/run_journal.db",
 ) -> None:
-    """Final function to connect to the API & pull the data"""
+    """Final function to connect to the API & pull the data, with resume=True
+    an unfinished run carries on, skipping the bids it already finished"""
+
+    # a new job starts with the full retry budget of the shared policy
+    retry_policy.reset_budget()
 
     # keep track of time elapsed in function
     start_time = time.time()
@@ -178,8 +218,12 @@ def run_data_pull(
     bids = pd.read_csv(bids_path)
     bids = bids["schoolBid"].values.tolist()
 
-    # if data/temp directory exists, remove it
-    if os.path.exists("data/temp"):
+    # every finished or failed bid is journaled as soon as it's done
+    journal = RunJournal(journal_path, resume=resume)
+    json_flattener = MultiJSONFlattener(ASSESSMENT_JSON_SPECS)
+
+    # if data/temp directory exists, remove it, unless the run is resumed
+    if os.path.exists("data/temp") and not journal.resumed_:
         for file in os.listdir("data/temp"):
             os.remove(f"data/temp/{file}")
         os.rmdir("data/temp")
@@ -189,9 +233,13 @@ def run_data_pull(
 
     errors = []
 
+    if journal.resumed_:
+        logging.info(f"Resuming run, skipping {len(journal.finished())} finished bids")
+
     # pull data from api for each bid in the list
-    for bid in tqdm(bids):
+    for bid in tqdm(journal.pending(bids)):
         logging.info(f"Pulling data for school with bid: {bid}")
+        journal.start(bid)
 
         # check if bid exists in current data
         now = datetime.now()
@@ -219,10 +267,11 @@ def run_data_pull(
                     "date": now,
                 }
             )
+            journal.fail(bid, api_resp.status_code)
             continue
 
         elif api_resp.status_code == 401:
-            api_headers = generate_api_header()
+            api_headers = refresh_api_header(api_headers)
             api_resp = connect_to_api(
                 api_url=api_url, api_headers=api_headers, api_params=api_params
             )
@@ -236,6 +285,7 @@ def run_data_pull(
                         "date": now,
                     }
                 )
+                journal.fail(bid, api_resp.status_code)
                 continue
 
         api_data, error_dict = pull_data_from_api(
@@ -245,6 +295,9 @@ def run_data_pull(
             api_params=api_params,
             max_date=max_date.values[0] if bid_currently_exists else None,
         )
+        # only a failed pull is pulled again on resume, error_dict is
+        # reused for validation errors below, which don't stop the export
+        pull_error = error_dict
 
         
         if len(error_dict) > 0:
@@ -255,131 +308,16 @@ def run_data_pull(
             errors.append(error_dict)
 
         if len(api_data) > 0:
-            api_data = pd.DataFrame(api_data)
-            logging.info(f"Found {api_data.shape[0]} new rows for bid: {bid}")
+            logging.info(f"Found {len(api_data)} new rows for bid: {bid}")
 
             # if set to True, will abort this session
             has_formatting_errors = False
 
-            # normalize json columns
-            try:
-                if "items" in api_data.columns:
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="items",
-                        new_col_names=None,
-                        # this argument is necessary for non-exploded columns
-                        col_mapping={
-                            "shown": "ITEMS_SHOWN",
-                            "correct": "ITEMS_CORRECT",
-                            "total": "ITEMS_TOTAL",
-                        },
-                        explode_col=False,
-                    )
-                else:
-                    api_data["ITEMS_SHOWN"] = None
-                    api_data["ITEMS_CORRECT"] = None
-                    api_data["ITEMS_TOTAL"] = None
-            except Exception as e:
-                logging.error(f"Error normalizing json for column 'items': {e}")
-                error_dict = {
-                    "school-bid": bid,
-                    "error-type": "json-normalization-error",
-                    "message": e,
-                    "date": now,
-                }
-                errors.append(error_dict)
-                has_formatting_errors = True
-
-            try:
-                if "norms" in api_data.columns:
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="norms",
-                        new_col_names=[
-                            "NORMS_PERCENTILE",
-                            "NORMS_REFERENCE",
-                            "NORMS_TYPE",
-                        ],
-                        explode_col=True,
-                    )
-                else:
-                    api_data["NORMS_PERCENTILE"] = None
-                    api_data["NORMS_REFERENCE"] = None
-                    api_data["NORMS_TYPE"] = None
-
-                # don't need this column
-                # might be a faster way to do this
-                api_data.drop(["NORMS_REFERENCE", "NORMS_TYPE"], axis=1, inplace=True)
-            except Exception as e:
-                logging.error(f"Error normalizing json for column 'norms': {e}")
-                error_dict = {
-                    "school-bid": bid,
-                    "error-type": "json-normalization-error",
-                    "message": e,
-                    "date": now,
-                }
-                errors.append(error_dict)
-                has_formatting_errors = True
-
-            try:
-                if "quantile" in api_data.columns:
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="quantile",
-                        new_col_names=None,
-                        col_mapping={
-                            "score": "QUANTILE_SCORE",
-                            "maximum": "QUANTILE_MAX",
-                            "minimum": "QUANTILE_MIN",
-                            "range": "QUANTILE_RANGE",
-                            "original": "QUANTILE_ORIGINAL",
-                        },
-                        explode_col=False,
-                    )
-                else:
-                    api_data["QUANTILE_SCORE"] = None
-                    api_data["QUANTILE_MAX"] = None
-                    api_data["QUANTILE_MIN"] = None
-                    api_data["QUANTILE_RANGE"] = None
-                    api_data["QUANTILE_ORIGINAL"] = None
-            except Exception as e:
-                logging.error(f"Error normalizing json for column 'quantile': {e}")
-                error_dict = {
-                    "school-bid": bid,
-                    "error-type": "json-normalization-error",
-                    "message": e,
-                    "date": now,
-                }
-                errors.append(error_dict)
-                has_formatting_errors = True
-
+            # flatten every json column while building the dataframe
             try:
-                if "instructionalAreas" in api_data.columns:
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="instructionalAreas",
-                        new_col_names=[
-                            "INSTRUCTIONAL_AREA_BID",
-                            "INSTRUCTIONAL_AREA_NAME",
-                            "INSTRUCTIONAL_AREA_SCORE",
-                            "INSTRUCTIONAL_AREA_STD_ERR",
-                            "INSTRUCTIONAL_AREA_LOW",
-                            "INSTRUCTIONAL_AREA_HIGH",
-                        ],
-                        explode_col=True,
-                    )
-                else:
-                    api_data["INSTRUCTIONAL_AREA_BID"] = None
-                    api_data["INSTRUCTIONAL_AREA_NAME"] = None
-                    api_data["INSTRUCTIONAL_AREA_SCORE"] = None
-                    api_data["INSTRUCTIONAL_AREA_STD_ERR"] = None
-                    api_data["INSTRUCTIONAL_AREA_LOW"] = None
-                    api_data["INSTRUCTIONAL_AREA_HIGH"] = None
+                api_data = json_flattener.transform(api_data)
             except Exception as e:
-                logging.error(
-                    f"Error normalizing json for column 'instructionalAreas': {e}"
-                )
+                logging.error(f"Error normalizing json columns: {e}")
                 error_dict = {
                     "school-bid": bid,
                     "error-type": "json-normalization-error",
@@ -387,37 +325,8 @@ def run_data_pull(
                     "date": now,
                 }
                 errors.append(error_dict)
-                has_formatting_errors = True
-
-            try:
-                if "lexile" in api_data.columns:
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="lexile",
-                        new_col_names=None,
-                        col_mapping={
-                            "score": "LEXILE_SCORE",
-                            "min": "LEXILE_MIN",
-                            "max": "LEXILE_MAX",
-                            "range": "LEXILE_RANGE",
-                        },
-                        explode_col=False,
-                    )
-                else:
-                    api_data["LEXILE_SCORE"] = None
-                    api_data["LEXILE_MIN"] = None
-                    api_data["LEXILE_MAX"] = None
-                    api_data["LEXILE_RANGE"] = None
-            except Exception as e:
-                logging.error(f"Error normalizing json for column 'lexile': {e}")
-                error_dict = {
-                    "school-bid": bid,
-                    "error-type": "json-normalization-error",
-                    "message": e,
-                    "date": now,
-                }
-                errors.append(error_dict)
-                has_formatting_errors = True
+                journal.fail(bid, "json-normalization-error")
+                continue
 
             api_data.drop_duplicates(
                 subset=["testResultBid", "modifiedDateTime", "INSTRUCTIONAL_AREA_BID"],
@@ -469,6 +378,7 @@ def run_data_pull(
                 has_formatting_errors = True
 
             if has_formatting_errors:
+                journal.fail(bid, "formatting-error")
                 continue
 
             # make sure column values are in the correct order
@@ -479,6 +389,18 @@ def run_data_pull(
             # export data to csv file
             api_data.to_csv(f"data/temp/{bid}.csv", index=False)
 
+        # a bid that stopped part way is pulled again on resume
+        if len(pull_error) > 0:
+            journal.fail(bid, pull_error.get("message"))
+        elif len(api_data) > 0:
+            journal.complete(
+                bid,
+                output=f"data/temp/{bid}.csv",
+                watermark=api_data["MODIFIED_DATE_TIME"].max(),
+            )
+        else:
+            journal.complete(bid)
+
     # concatenate all files in temp system into one file
     nwea_records = pd.concat(
         [pd.read_csv(f"data/temp/{file}") for file in os.listdir("data/temp")]
@@ -502,6 +424,8 @@ def run_data_pull(
 
     logging.info(f"Data pull complete. {nwea_records.shape[0]} records added")
     logging.info(f"Time elapsed: {end_time - start_time} seconds")
+    session_pool.log_stats()
+    response_cache.log_stats()
 
     # export meta data to csv file
     meta_data = pd.DataFrame([meta_info])
@@ -510,11 +434,16 @@ def run_data_pull(
     current_meta_data.to_csv("db/meta.csv", index=False)
     logging.info("Meta data exported to csv file, process completed")
 
+    # the next run starts from scratch
+    journal.finish()
+    journal.close()
+
 
 def api_request(student_bid, api_headers):
-    """Function to handle API request for a single student."""
+    """Function to handle API request for a single student, served from the
+    response cache when it's enabled."""
     api_url = f"https://api.nwea.org/students/v2/{student_bid}"
-    api_resp = requests.get(api_url, headers=api_headers)
+    api_resp = retry_policy.get(api_url, retry_statuses=[429, 503], headers=api_headers)
     return api_resp, student_bid
 
 
@@ -525,7 +454,7 @@ def process_student_data(student_bid, existing_students, api_headers):
         # Return the necessary data or error information
         return {
             "student_bid": student_bid,
-            "data": api_resp.json() if api_resp.status_code == 200 else None,
+            "data": decode_response(api_resp) if api_resp.status_code == 200 else None,
             "error": api_resp.status_code,
         }
 
@@ -537,96 +466,74 @@ def chunked_student_list(student_list, chunk_size=50000):
 
 
 def run_student_data_pull(
-    src="data/current_students.csv", current_list="db/students.csv"
+    src="data/current_students.csv",
+    current_list="db/students.csv",
+    resume: bool = False,
+    journal_path: str = "data/student_journal.db",
+    chunk_size: int = 10000,
 ):
-    student_list = pd.read_csv(src)["STUDENT_BID"].values.tolist()
+    """Pull the profile of every new student, with resume=True an unfinished
+    run carries on, skipping the chunks of students it already finished"""
+    # a new job starts with the full retry budget of the shared policy
+    retry_policy.reset_budget()
+    students = pd.read_csv(src)
+    student_list = students["STUDENT_BID"].values.tolist()
     existing_students = pd.read_csv(current_list)["STUDENT_BID"].values.tolist()
 
-    os.makedirs("data/student_temp", exist_ok=False)
-    api_headers = generate_api_header()
-
-    if api_headers is None:
-        raise ValueError("Could not generate API headers")
-
-    batch_number = 0
-
-    # Process each chunk of students
-    for idx, students_chunk in enumerate(
-        chunked_student_list(student_list, chunk_size=10000)
-    ):
-        # filter out students that already exist
-        students_chunk = [
-            student_bid
-            for student_bid in students_chunk
-            if student_bid not in existing_students
-        ]
-
-        if len(students_chunk) == 0:
-            print(f"No new students to process, stepping over batch #{batch_number}")
-            continue
-
-        print(f"Processing batch #{batch_number} with {len(students_chunk)} students")
-
-        # check if the api headers are still valid
-        test_resp = requests.get(
-            f"https://api.nwea.org/students/v2/{students_chunk[0]}", headers=api_headers
-        )
-        
-        if test_resp.status_code == 401:
-            print(f"Got a status code 401, reconnecing to API")
-            api_headers = generate_api_header()
-
-        print(f"Processing batch #{batch_number}")
-        with multiprocessing.Pool(processes=multiprocessing.cpu_count()) as pool:
-            results = pool.starmap(
-                process_student_data,
-                [
-                    (student_bid, existing_students, api_headers)
-                    for student_bid in students_chunk
-                ],
-            )
-
-        # Handle results for this chunk
-        student_data_batch = [result["data"] for result in results if result["data"]]
-        print(f"Found {len(student_data_batch)} new students in batch #{batch_number}")
+    # students with a known school are pulled from their school's roster
+    student_schools = None
+    if "SCHOOL_BID" in students.columns:
+        student_schools = dict(zip(students["STUDENT_BID"], students["SCHOOL_BID"]))
 
-        errors_batch = [
-            {
-                "student-bid": result["student_bid"],
-                "error-type": "api-error",
-                "message": result["error"],
-                "date": datetime.now(),
-            }
-            for result in results
-            if not result["data"]
-        ]
+    # every finished chunk is journaled as soon as its file is written
+    journal = RunJournal(journal_path, resume=resume)
 
-        batch_number += 1
+    # if data/student_temp directory exists, remove it, unless the run is resumed
+    if os.path.exists("data/student_temp") and not journal.resumed_:
+        for file in os.listdir("data/student_temp"):
+            os.remove(f"data/student_temp/{file}")
+        os.rmdir("data/student_temp")
 
-        student_data_df = pd.DataFrame(student_data_batch)
+    os.makedirs("data/student_temp", exist_ok=True)
 
-        if "personalNeedsProfile" in student_data_df.columns:
-            student_data_df.drop("personalNeedsProfile", axis=1, inplace=True)
+    if journal.resumed_:
+        logging.info(f"Resuming run, skipping {len(journal.finished())} finished chunks")
 
-        if "englishLearner" in student_data_df.columns:
-            student_data_df.drop("englishLearner", axis=1, inplace=True)
+    # profiles are fetched on threads that share one token and connection
+    # pool, the rate limiter paces them, so batches don't need a sleep between
+    connector = NWEAStudentConnector(
+        existing_students=existing_students,
+        student_schools=student_schools,
+        retry_policy=retry_policy,
+    )
 
-        if "individualizedPrograms" in student_data_df.columns:
-            student_data_df.drop("individualizedPrograms", axis=1, inplace=True)
+    for idx, students_chunk in enumerate(chunked_student_list(student_list, chunk_size)):
+        chunk_id = f"students_{idx}"
+        if chunk_id in journal.finished():
+            continue
+        journal.start(chunk_id)
 
+        connector.bids = students_chunk
+        student_data_df = pd.concat(
+            [batch for batch in connector.iter_record_batches(batch_size=chunk_size)]
+            or [pd.DataFrame(columns=connector.fields)],
+            ignore_index=True,
+        )
         # rename columns to match database
         student_data_df = student_data_df.rename(columns=student_cols_config)
 
-        # student_data_df = student_data_df.drop_duplicates()
         print(f"Adding {student_data_df.shape[0]} students to the database")
-        student_data_df.to_csv(f"data/student_temp/{batch_number}.csv", index=False)
+        output = f"data/student_temp/{chunk_id}.csv"
+        student_data_df.to_csv(output, index=False)
 
-        # export errors
-        student_errors_df = pd.DataFrame(errors_batch).drop_duplicates()
-        student_errors_df.to_csv(
-            f"data/student_temp/errors_{batch_number}.csv", index=False
-        )
+        # export errors per chunk, so a resumed run keeps the earlier ones
+        student_errors_df = pd.DataFrame(connector.errors_).drop_duplicates()
+        student_errors_df.to_csv(f"data/student_temp/errors_{idx}.csv", index=False)
+
+        journal.complete(chunk_id, output=output)
+
+    print(f"Students served by each strategy: {connector.strategy_counts()}")
 
-        # wait 20 minutes between batches
-        print(f"Finished batch #{batch_number}, waiting 10 minutes")
-        time.sleep(600)
+    # the next run starts from scratch
+    journal.finish()
+    journal.close()
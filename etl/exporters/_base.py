@@ -4,9 +4,12 @@ These are meant to export data from the ETL pipeline to somewhere else.
 The "L" in the ETL pipeline.  Export locations include databases and files.
 """
 import os
+import logging
 
 from abc import ABCMeta, abstractmethod
 
+import pandas as pd
+
 
 class _BaseExporter(metaclass=ABCMeta):
     """Base class for all loaders"""
@@ -16,6 +19,26 @@ class _BaseExporter(metaclass=ABCMeta):
         """Export the data"""
         pass
 
+    @abstractmethod
+    def export_batch(self, data):
+        """Export one batch of data, adding it to what's already been exported"""
+        pass
+
+    @abstractmethod
+    def export_tables(self, tables: dict):
+        """Export child tables, each separately from the main data"""
+        pass
+
+    @abstractmethod
+    def export_tables_batch(self, tables: dict):
+        """Export one batch of child tables, adding them to what's already
+        been exported"""
+        pass
+
+    def reset(self):
+        """Start a new export with the next export_batch()"""
+        pass
+
 
 class FileExporter(_BaseExporter):
     """Base class for all file exporters
@@ -26,6 +49,13 @@ class FileExporter(_BaseExporter):
         >>> data = pd.DataFrame({'a': [1, 2, 3], 'b': [4, 5, 6]})
         >>> exporter = FileExporter(file_name="test.csv", base_path = 'data/results')
         >>> exporter.export(data)
+
+        # or stream batches into the same file as they arrive
+        >>> for batch in connector.iter_record_batches(batch_size=5000):
+        >>>     exporter.export_batch(batch)
+
+        # child tables go to files next to it, ie data/results/test_norms.csv
+        >>> exporter.export_tables({"norms": norms})
     """
 
     def __init__(self, file_name: str, base_path: str):
@@ -37,6 +67,8 @@ class FileExporter(_BaseExporter):
         """
         self.file_name = file_name
         self.base_path = base_path
+        self.columns_ = None
+        self._table_exporters = {}
 
     def export(self, data) -> None:
         """Export the data to defined file path
@@ -59,6 +91,89 @@ class FileExporter(_BaseExporter):
         # Export the data
         file_path = os.path.join(self.base_path, self.file_name)
         data.to_csv(file_path, index=False)
+        self.columns_ = list(data.columns)
+
+    def export_batch(self, data) -> None:
+        """Append a batch of data to the file, the first batch since export()
+        or reset() overwrites it
+
+        Batches are lined up to the file's columns, if a batch has columns the
+        file doesn't the file is rewritten with them, so no data is dropped.
+
+        Args:
+            data (pd.DataFrame): Dataframe to append
+        """
+        if self.columns_ is None:
+            self._export_to_file(data)
+            return
+
+        new_columns = [col for col in data.columns if col not in self.columns_]
+        if new_columns:
+            self._add_columns(new_columns)
+
+        file_path = os.path.join(self.base_path, self.file_name)
+        data.reindex(columns=self.columns_).to_csv(
+            file_path, mode="a", header=False, index=False
+        )
+
+    def export_tables(self, tables: dict) -> None:
+        """Export each child table to its own file, named after the table
+
+        Args:
+            tables (dict): Mapping of table name to dataframe
+        """
+        for table, data in tables.items():
+            self._table_exporter(table).export(data)
+
+    def export_tables_batch(self, tables: dict) -> None:
+        """Append a batch of each child table to its own file
+
+        Args:
+            tables (dict): Mapping of table name to dataframe
+        """
+        for table, data in tables.items():
+            self._table_exporter(table).export_batch(data)
+
+    def reset(self) -> None:
+        """Start a new file with the next export_batch()"""
+        self.columns_ = None
+        for exporter in self._table_exporters.values():
+            exporter.reset()
+
+    def _table_exporter(self, table: str) -> "FileExporter":
+        """Get the exporter writing a child table"""
+        if table not in self._table_exporters:
+            stem, extension = os.path.splitext(self.file_name)
+            self._table_exporters[table] = FileExporter(
+                file_name=f"{stem}_{table.lower()}{extension}", base_path=self.base_path
+            )
+
+        return self._table_exporters[table]
+
+    def _add_columns(self, new_columns: list, chunk_size: int = 100000) -> None:
+        """Rewrite the file with extra, empty columns
+
+        Args:
+            new_columns (list): Columns to add to the file
+            chunk_size (int): # of rows to rewrite at a time
+        """
+        logging.info(f"Adding columns {new_columns} to {self.file_name}")
+
+        file_path = os.path.join(self.base_path, self.file_name)
+        tmp_path = f"{file_path}.tmp"
+        columns = self.columns_ + new_columns
+
+        # rewritten in chunks as text, so memory and values are unchanged
+        pd.DataFrame(columns=columns).to_csv(tmp_path, index=False)
+        for chunk in pd.read_csv(
+            file_path, dtype=str, keep_default_na=False, chunksize=chunk_size
+        ):
+            chunk.reindex(columns=columns).to_csv(
+                tmp_path, mode="a", header=False, index=False
+            )
+
+        os.replace(tmp_path, file_path)
+        self.columns_ = columns
 
 
 class _DatabaseExporter(_BaseExporter):
@@ -26,3 +26,37 @@ def test_file_exporter(tmp_path):
     # check that the data is correct
     assert file_path.exists()
     assert file_path.read_text() == "a,b\n1,4\n2,5\n3,6\n"
+
+
+def test_file_exporter_batches(tmp_path):
+    """
+    Test that batches are appended, and new columns are added to the file
+    """
+    exporter = FileExporter(file_name="test.csv", base_path=tmp_path)
+
+    exporter.export_batch(pd.DataFrame({"a": [1, 2], "b": [3, 4]}))
+    exporter.export_batch(pd.DataFrame({"b": [5], "a": [6]}))
+    exporter.export_batch(pd.DataFrame({"a": [7], "c": ["x"]}))
+
+    assert (tmp_path / "test.csv").read_text() == (
+        "a,b,c\n1,3,\n2,4,\n6,5,\n7,,x\n"
+    )
+
+    # a new run starts a new file
+    exporter.reset()
+    exporter.export_batch(pd.DataFrame({"a": [8]}))
+
+    assert (tmp_path / "test.csv").read_text() == "a\n8\n"
+
+
+def test_file_exporter_child_tables(tmp_path):
+    """
+    Test that child tables are written next to the main file, batches appended
+    """
+    exporter = FileExporter(file_name="test.csv", base_path=tmp_path)
+
+    exporter.export_tables_batch({"NORMS": pd.DataFrame({"id": [1], "p": [10]})})
+    exporter.export_tables_batch({"NORMS": pd.DataFrame({"id": [2], "p": [20]})})
+
+    assert (tmp_path / "test_norms.csv").read_text() == "id,p\n1,10\n2,20\n"
+    assert not (tmp_path / "test.csv").exists()
@@ -0,0 +1,195 @@
+"""
+Crash-safe journal of the entities (ie school bids) a run has finished.
+
+Every start, completion and failure is appended to a SQLite database in WAL
+mode, so a crash mid-run loses at most the entity being pulled.  A run
+started with resume=True carries on the last unfinished run, skipping the
+entities it already finished and re-pulling the ones that failed or never
+completed.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+STARTED = "started"
+DONE = "done"
+FAILED = "failed"
+
+# entity the start and end of a run are recorded under
+_RUN = "__run__"
+
+
+class RunJournal:
+    """Append-only journal of a run's entities
+
+    Example Usage
+    -------------
+        >>> journal = RunJournal("data/assessment_journal.db", resume=True)
+        >>> for bid in journal.pending(bids):
+        >>>     journal.start(bid)
+        >>>     ...
+        >>>     journal.complete(bid, output=f"data/temp/{bid}.csv", watermark=max_date)
+        >>> journal.finish()
+        >>> journal.outputs()
+        {'2c195342-...': 'data/temp/2c195342-....csv', ...}
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        """Initialize the class
+        Args:
+            path (str): Path of the SQLite journal
+            resume (bool): Carry on the last run if it didn't finish, otherwise
+                a new run is started
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                entity TEXT NOT NULL,
+                status TEXT NOT NULL,
+                output TEXT,
+                watermark TEXT,
+                message TEXT,
+                recorded_at TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS events_run ON events (run_id, entity, id)"
+        )
+
+        last_run, last_run_finished = self._last_run()
+        self.resumed_ = resume and last_run is not None and not last_run_finished
+
+        if self.resumed_:
+            self.run_id = last_run
+        else:
+            self.run_id = (last_run or 0) + 1
+            self._append(_RUN, STARTED)
+
+    def start(self, entity: str) -> None:
+        """Record that an entity is being pulled"""
+        self._append(entity, STARTED)
+
+    def complete(self, entity: str, output: str = None, watermark=None, message=None) -> None:
+        """Record that an entity finished
+
+        Args:
+            entity (str): Entity that finished, ie a school bid
+            output (str): Where its data was written, None if it had no new data
+            watermark: Newest modified date pulled for the entity
+            message: Anything else a resumed run needs, ie the ids left to retry
+        """
+        self._append(entity, DONE, output=output, watermark=watermark, message=message)
+
+    def fail(self, entity: str, message=None) -> None:
+        """Record that an entity failed, it's pulled again on resume"""
+        self._append(entity, FAILED, message=message)
+
+    def finish(self) -> None:
+        """Record that the run finished, the next run starts from scratch"""
+        self._append(_RUN, DONE)
+
+    def statuses(self) -> dict:
+        """Get the latest status of every entity in the run"""
+        rows = self._query(
+            """SELECT entity, status FROM events
+            WHERE id IN (
+                SELECT MAX(id) FROM events WHERE run_id = ? AND entity != ? GROUP BY entity
+            )""",
+            (self.run_id, _RUN),
+        )
+        return dict(rows)
+
+    def finished(self) -> set:
+        """Entities the run has finished"""
+        return {entity for entity, status in self.statuses().items() if status == DONE}
+
+    def pending(self, entities: list) -> list:
+        """Entities that still have to be pulled, in their original order"""
+        finished = self.finished()
+        return [entity for entity in entities if str(entity) not in finished]
+
+    def outputs(self) -> dict:
+        """Mapping of each finished entity to where its data was written"""
+        rows = self._query(
+            """SELECT entity, output FROM events
+            WHERE id IN (
+                SELECT MAX(id) FROM events WHERE run_id = ? AND entity != ? GROUP BY entity
+            ) AND status = ?""",
+            (self.run_id, _RUN, DONE),
+        )
+        return {entity: output for entity, output in rows if output is not None}
+
+    def watermarks(self) -> dict:
+        """Mapping of each finished entity to the newest modified date pulled"""
+        rows = self._query(
+            """SELECT entity, watermark FROM events
+            WHERE id IN (
+                SELECT MAX(id) FROM events WHERE run_id = ? AND entity != ? GROUP BY entity
+            ) AND status = ?""",
+            (self.run_id, _RUN, DONE),
+        )
+        return {entity: watermark for entity, watermark in rows if watermark is not None}
+
+    def messages(self) -> dict:
+        """Mapping of each finished entity to the message it was completed with"""
+        rows = self._query(
+            """SELECT entity, message FROM events
+            WHERE id IN (
+                SELECT MAX(id) FROM events WHERE run_id = ? AND entity != ? GROUP BY entity
+            ) AND status = ?""",
+            (self.run_id, _RUN, DONE),
+        )
+        return {entity: message for entity, message in rows if message is not None}
+
+    def close(self) -> None:
+        """Close the journal"""
+        with self._lock:
+            self._conn.close()
+
+    def _last_run(self) -> tuple:
+        """Get the id of the last run and whether it finished"""
+        rows = self._query(
+            """SELECT run_id, MAX(CASE WHEN status = ? THEN 1 ELSE 0 END)
+            FROM events WHERE entity = ? GROUP BY run_id ORDER BY run_id DESC LIMIT 1""",
+            (DONE, _RUN),
+        )
+        if not rows:
+            return None, False
+
+        run_id, finished = rows[0]
+        return run_id, bool(finished)
+
+    def _append(self, entity: str, status: str, output=None, watermark=None, message=None):
+        """Append an event, committed as soon as it's written"""
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO events
+                (run_id, entity, status, output, watermark, message, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    self.run_id,
+                    str(entity),
+                    status,
+                    output,
+                    str(watermark) if watermark is not None else None,
+                    str(message) if message is not None else None,
+                    datetime.now().isoformat(),
+                ),
+            )
+
+    def _query(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
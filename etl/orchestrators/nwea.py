@@ -11,6 +11,7 @@ import os
 import pandas as pd
 
 from etl.orchestrators._base import APIOrchestrator
+from etl.orchestrators._journal import RunJournal
 
 
 class NWEAAssessmentOrchestrator(APIOrchestrator):
@@ -37,17 +38,23 @@ class NWEAAssessmentOrchestrator(APIOrchestrator):
     orchestrator.run()
     """
 
-    def __init__(self, entities: list, cutoff_dates: dict, pipeline):
+    def __init__(self, entities: list, cutoff_dates: dict, pipeline, journal: RunJournal = None):
         """Initialize the class
         Args:
             entities (list): List of entities to run the pipeline on
             cutoff_dates (dict): Mapping of entities to cutoff dates
             pipeline (ETLPipeline): Pipeline to run
+            journal (RunJournal): Records the entities that finished or failed
+                when they're pulled concurrently, so failed ones can be pulled again
         """
         super().__init__(entities, cutoff_dates, pipeline)
+        self.journal = journal
 
     def _run(self):
         """Run the orchestrator"""
+        if hasattr(self.pipeline.connector, "pull_many"):
+            return self._run_concurrently()
+
         # Loop through the entities
         for entity in self.entities:
             logging.info(f"Running pipeline for {entity}")
@@ -74,6 +81,40 @@ class NWEAAssessmentOrchestrator(APIOrchestrator):
                 f"Exported data to {os.path.join(exporter.base_path, exporter.file_name)}"
             )
 
+    def _run_concurrently(self):
+        """Pull every entity concurrently with the connector's pull_many(),
+        each entity's data is transformed, validated and exported as soon as
+        it has been pulled, while the others are still being pulled"""
+        self.errors_ = []
+        exporter = self.pipeline.exporter
+        exporter.reset()
+
+        results = self.pipeline.connector.pull_many(self.entities, self.cutoff_dates)
+        for entity, data, error in results:
+            if error is not None:
+                # the records pulled before the error aren't exported, the
+                # entity is pulled again in full, so they're counted instead
+                logging.error(
+                    f"Could not pull data for {entity}: {error['message']}, "
+                    f"discarding {len(data)} records pulled before the error"
+                )
+                self.errors_.append({**error, "records-discarded": len(data)})
+                if self.journal is not None:
+                    self.journal.fail(entity, error["message"])
+                continue
+
+            if data.empty:
+                logging.info(f"No new data for {entity}")
+            else:
+                exporter.export_batch(self.pipeline.transform_batch(data))
+                if self.pipeline.child_tables_:
+                    exporter.export_tables_batch(self.pipeline.child_tables_)
+                logging.info(f"Exported {len(data)} records for {entity}")
+
+            if self.journal is not None:
+                self.journal.complete(entity)
+
+
 class NWEAStudentOrchestrator(APIOrchestrator):
     """
     Orchestrator for the NWEA Student dataset
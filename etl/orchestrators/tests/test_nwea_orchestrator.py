@@ -0,0 +1,36 @@
+"""
+Unit tests for the NWEAAssessmentOrchestrator
+"""
+import pandas as pd
+from unittest.mock import MagicMock
+
+from etl.orchestrators._journal import RunJournal
+from etl.orchestrators.nwea import NWEAAssessmentOrchestrator
+from etl.pipelines._base import ETLPipeline
+from etl.transformers.dataframe_transformers import ColumnNameTransformer
+
+
+def test_failed_entities_are_journaled_with_their_discarded_records(tmp_path):
+    connector = MagicMock()
+    connector.pull_many.return_value = [
+        ("bid-1", pd.DataFrame({"id": [1, 2]}), None),
+        ("bid-2", pd.DataFrame({"id": [3]}), {"school-bid": "bid-2", "message": "503"}),
+    ]
+    exporter = MagicMock()
+    pipeline = ETLPipeline(
+        connector=connector,
+        exporter=exporter,
+        transformers=[ColumnNameTransformer({"id": "ID"})],
+    )
+    journal = RunJournal(str(tmp_path / "journal.db"))
+
+    orchestrator = NWEAAssessmentOrchestrator(["bid-1", "bid-2"], {}, pipeline, journal=journal)
+    orchestrator.run()
+
+    exported = exporter.export_batch.call_args.args[0]
+    assert exported["ID"].tolist() == [1, 2]
+    assert orchestrator.errors_ == [
+        {"school-bid": "bid-2", "message": "503", "records-discarded": 1}
+    ]
+    assert journal.finished() == {"bid-1"}
+    assert journal.pending(["bid-1", "bid-2"]) == ["bid-2"]
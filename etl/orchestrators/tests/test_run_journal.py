@@ -0,0 +1,72 @@
+"""
+Unit tests for the RunJournal
+"""
+from etl.orchestrators._journal import RunJournal
+
+
+BIDS = ["bid-1", "bid-2", "bid-3"]
+
+
+def test_resume_skips_finished_and_repulls_failed(tmp_path):
+    path = str(tmp_path / "journal.db")
+
+    journal = RunJournal(path)
+    journal.start("bid-1")
+    journal.complete("bid-1", output="data/temp/bid-1.csv", watermark="2024-01-02")
+    journal.start("bid-2")
+    journal.fail("bid-2", 503)
+    # the run crashes while pulling bid-3
+    journal.start("bid-3")
+    journal.close()
+
+    resumed = RunJournal(path, resume=True)
+
+    assert resumed.resumed_
+    assert resumed.pending(BIDS) == ["bid-2", "bid-3"]
+    assert resumed.outputs() == {"bid-1": "data/temp/bid-1.csv"}
+    assert resumed.watermarks() == {"bid-1": "2024-01-02"}
+
+    resumed.complete("bid-2")
+    assert resumed.pending(BIDS) == ["bid-3"]
+
+
+def test_finished_run_starts_fresh(tmp_path):
+    path = str(tmp_path / "journal.db")
+
+    journal = RunJournal(path)
+    for bid in BIDS:
+        journal.complete(bid)
+    journal.finish()
+    journal.close()
+
+    journal = RunJournal(path, resume=True)
+
+    assert not journal.resumed_
+    assert journal.pending(BIDS) == BIDS
+
+
+def test_without_resume_every_bid_is_pulled(tmp_path):
+    path = str(tmp_path / "journal.db")
+
+    journal = RunJournal(path)
+    journal.complete("bid-1")
+    journal.close()
+
+    journal = RunJournal(path)
+
+    assert not journal.resumed_
+    assert journal.pending(BIDS) == BIDS
+
+
+def test_resume_keeps_the_message_of_finished_entities(tmp_path):
+    path = str(tmp_path / "journal.db")
+
+    journal = RunJournal(path)
+    journal.start("students_0")
+    journal.complete("students_0", output="data/temp/0.csv", message='["bid-2"]')
+    journal.start("students_1")
+    journal.close()
+
+    resumed = RunJournal(path, resume=True)
+
+    assert resumed.messages() == {"students_0": '["bid-2"]'}
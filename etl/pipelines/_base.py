@@ -1,10 +1,15 @@
 """
 Pipelines to run ETL steps
 """
+import logging
+import tracemalloc
 from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager, nullcontext
 
 import pandas as pd
 
+from etl.transformers.dataframe_transformers import ColumnNameTransformer
+
 
 class _BasePipeline(metaclass=ABCMeta):
     """Base class for all pipelines"""
@@ -32,10 +37,26 @@ class ETLPipeline(_BasePipeline):
         >>>     validators = [ColumnNameValidator(..args..)],
         >>>     loader = FileLoader(..args..))
         >>> pipeline.run()
+
+        # stream the data through the pipeline 5,000 records at a time
+        >>> pipeline = ETLPipeline(..args.., batch_size = 5000)
+
+        # transform the pulled data in place and report memory per stage
+        >>> pipeline = ETLPipeline(..args.., inplace = True, profile_memory = True)
+        >>> pipeline.run()
+        >>> pipeline.stage_memory_
+        [{'stage': 'connector', 'peak_mb': 412.3, 'data_mb': 230.1}, ...]
     """
 
     def __init__(
-        self, connector, exporter, transformers: list = [], validators: list = []
+        self,
+        connector,
+        exporter,
+        transformers: list = [],
+        validators: list = [],
+        batch_size: int = None,
+        inplace: bool = False,
+        profile_memory: bool = False,
     ):
         """Initialize the class
         Args:
@@ -43,12 +64,26 @@ class ETLPipeline(_BasePipeline):
             exporter (BaseLoader): Exporter to use to export data to somewhere else
             transformers (list): Transformers to use
             validators (list): Validators to use
+            batch_size (int): # of records to transform, validate and export at a
+                time, None to pull all of the data first
+            inplace (bool): The pipeline owns the data its connector pulls, so
+                transformers change it in place, with copy-on-write, instead
+                of copying it at every step
+            profile_memory (bool): Record the peak memory of every stage in
+                stage_memory_, tracing allocations slows the run down.  Not
+                recorded when batch_size is set
         """
         self.connector = connector
         self.transformers = transformers
         self.validators = validators
         self.exporter = exporter
+        self.batch_size = batch_size
+        self.inplace = inplace
+        self.profile_memory = profile_memory
         self.validated_ = False
+        self.stage_memory_ = []
+        self.child_tables_ = {}
+        self.child_keys_ = []
 
     def _run(self) -> pd.DataFrame:
         """Run the pipeline, in order of connector, transformers, validators
@@ -56,10 +91,41 @@ class ETLPipeline(_BasePipeline):
         Returns:
             pd.DataFrame: Final dataframe
         """
-        data = self.connector.pull_data()
-        self._run_transformers(data)
-        self._run_validators()
-        self.exporter.export(self.final_data_)
+        self.stage_memory_ = []
+        if self.batch_size is not None:
+            return self._run_batches()
+
+        with self._copy_on_write():
+            with self._measure("connector") as stage:
+                data = self.connector.pull_data()
+                stage["data"] = data
+            self._run_transformers(data)
+            with self._measure("validators"):
+                self._run_validators()
+            with self._measure("exporter"):
+                self.exporter.export(self.final_data_)
+                if self.child_tables_:
+                    self.exporter.export_tables(self.child_tables_)
+
+    def _run_batches(self) -> None:
+        """Run every batch from the connector through the transformers,
+        validators and exporter as it arrives, so peak memory depends on
+        batch_size rather than on the size of the data
+
+        Returns:
+            None
+        """
+        self.num_records_ = 0
+        self.exporter.reset()
+
+        with self._copy_on_write():
+            for batch in self.connector.iter_record_batches(self.batch_size):
+                num_records = len(batch)
+                self.transform_batch(batch)
+                self.exporter.export_batch(self.final_data_)
+                if self.child_tables_:
+                    self.exporter.export_tables_batch(self.child_tables_)
+                self.num_records_ += num_records
 
     def run(self) -> pd.DataFrame:
         """Public method to run the pipeline
@@ -69,18 +135,139 @@ class ETLPipeline(_BasePipeline):
         """
         self._run()
 
+    def transform_batch(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Run a batch of data pulled outside the pipeline, ie by an
+        orchestrator pulling many entities at once, through the transformers
+        and validators.  Its child tables are kept in child_tables_
+
+        Args:
+            data (pd.DataFrame): Batch of records
+
+        Returns:
+            pd.DataFrame: Transformed and validated batch
+        """
+        with self._copy_on_write():
+            self._run_transformers(data)
+            self._run_validators()
+
+        return self.final_data_
+
     def _run_transformers(self, data) -> None:
         """Run the transformers, each transformer will transform the data
-        that's passed into it
+        that's passed into it.  Child tables split off by a transformer,
+        ie nested lists of a MultiJSONFlattener, are kept in child_tables_
 
         Returns:
             None
         """
+        self.child_tables_ = {}
+        self.child_keys_ = []
         for transformer in self.transformers:
-            data = transformer.transform(data)
+            with self._measure(type(transformer).__name__) as stage:
+                data = self._transform(transformer, data)
+                stage["data"] = data
+
+            if isinstance(transformer, ColumnNameTransformer) and self.child_tables_:
+                self._rename_child_tables(transformer.col_mapping)
+            child_tables = getattr(transformer, "child_tables_", {})
+            if child_tables:
+                self.child_tables_.update(child_tables)
+                key = transformer.key
+                self.child_keys_ = [key] if isinstance(key, str) else list(key)
 
+        if self.child_tables_:
+            self._drop_orphaned_child_rows(data)
         self.final_data_ = data
 
+    def _rename_child_tables(self, col_mapping: dict) -> None:
+        """Rename the columns of the child tables like their parent's, so the
+        key columns still match the parent's after a ColumnNameTransformer
+
+        Args:
+            col_mapping (dict): Mapping of old column names to new column names
+        """
+        self.child_tables_ = {
+            table: child.rename(columns=col_mapping)
+            for table, child in self.child_tables_.items()
+        }
+        self.child_keys_ = [col_mapping.get(col, col) for col in self.child_keys_]
+
+    def _drop_orphaned_child_rows(self, data: pd.DataFrame) -> None:
+        """Keep the child rows whose parent is still in the data, ie not
+        dropped by a DuplicateValueTransformer, once each
+
+        Args:
+            data (pd.DataFrame): Transformed parent data
+        """
+        keys = self.child_keys_
+        if not keys or not set(keys).issubset(data.columns):
+            return
+
+        parent_keys = pd.MultiIndex.from_frame(data[keys])
+        for table, child in self.child_tables_.items():
+            kept = pd.MultiIndex.from_frame(child[keys]).isin(parent_keys)
+            self.child_tables_[table] = child[kept].drop_duplicates(ignore_index=True)
+
+    def _transform(self, transformer, data):
+        """Run a transformer, in place if the pipeline owns the data"""
+        if not self.inplace:
+            return transformer.transform(data)
+
+        inplace = transformer.inplace
+        transformer.inplace = True
+        try:
+            return transformer.transform(data)
+        finally:
+            transformer.inplace = inplace
+
+    def _copy_on_write(self):
+        """Turn on pandas copy-on-write while the pipeline owns the data, so
+        the frames transformers return share memory until they're changed.
+        It's always on from pandas 3"""
+        if not self.inplace or int(pd.__version__.split(".")[0]) >= 3:
+            return nullcontext()
+
+        return pd.option_context("mode.copy_on_write", True)
+
+    @contextmanager
+    def _measure(self, name: str):
+        """Record the peak memory allocated while a stage runs, and the size
+        of the data it returns, when profile_memory is set
+
+        Yields:
+            dict: Stage to put the data the stage returns in, under "data"
+        """
+        stage = {}
+        if not self.profile_memory or self.batch_size is not None:
+            yield stage
+            return
+
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+
+        try:
+            yield stage
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            if started:
+                tracemalloc.stop()
+
+            data = stage.get("data")
+            data_mb = None
+            if isinstance(data, pd.DataFrame):
+                data_mb = data.memory_usage(deep=True).sum() / 1e6
+
+            self.stage_memory_.append(
+                {"stage": name, "peak_mb": (peak - baseline) / 1e6, "data_mb": data_mb}
+            )
+            logging.info(
+                f"{name}: peak {(peak - baseline) / 1e6:.1f} MB"
+                + (f", data {data_mb:.1f} MB" if data_mb is not None else "")
+            )
+
     def _run_validators(self) -> None:
         """Run the validators, each validator will validate the data
         that's passed into it
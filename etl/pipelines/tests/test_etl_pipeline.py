@@ -0,0 +1,154 @@
+"""
+Unit tests for the ETLPipeline
+"""
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock
+
+from etl.exporters._base import FileExporter
+from etl.pipelines._base import ETLPipeline
+from etl.transformers.dataframe_transformers import (
+    ColumnDropTransformer,
+    ColumnNameTransformer,
+    ColumnTypeTransformer,
+    DuplicateValueTransformer,
+    MultiJSONFlattener,
+)
+
+
+def _make_pipeline(data, **kwargs):
+    connector = MagicMock()
+    connector.pull_data.return_value = data
+    transformers = [
+        DuplicateValueTransformer(subset=["id"]),
+        ColumnDropTransformer(["unused"]),
+        ColumnTypeTransformer({"score": "float32"}),
+        ColumnNameTransformer({"id": "ID", "score": "SCORE"}),
+    ]
+    return ETLPipeline(connector=connector, exporter=MagicMock(), transformers=transformers, **kwargs)
+
+
+def _make_data(num_rows=1000):
+    return pd.DataFrame(
+        {
+            "id": np.arange(num_rows) // 2,
+            "score": np.arange(num_rows, dtype="int64"),
+            "unused": np.zeros(num_rows),
+        }
+    )
+
+
+def test_inplace_matches_copying():
+    expected = _make_pipeline(_make_data())
+    expected.run()
+
+    data = _make_data()
+    pipeline = _make_pipeline(data, inplace=True)
+    pipeline.run()
+
+    pd.testing.assert_frame_equal(pipeline.final_data_, expected.final_data_)
+    # the pipeline owns the pulled data, so it's the frame that was changed
+    assert pipeline.final_data_ is data
+    # transformers go back to copying outside the pipeline
+    assert not any(transformer.inplace for transformer in pipeline.transformers)
+
+
+def test_copying_leaves_the_pulled_data_alone():
+    data = _make_data()
+    pipeline = _make_pipeline(data)
+    pipeline.run()
+
+    assert data.columns.tolist() == ["id", "score", "unused"]
+    assert len(data) == 1000
+
+
+def test_reports_peak_memory_per_stage():
+    pipeline = _make_pipeline(_make_data(100_000), inplace=True, profile_memory=True)
+    pipeline.run()
+
+    stages = [stage["stage"] for stage in pipeline.stage_memory_]
+    assert stages == [
+        "connector",
+        "DuplicateValueTransformer",
+        "ColumnDropTransformer",
+        "ColumnTypeTransformer",
+        "ColumnNameTransformer",
+        "validators",
+        "exporter",
+    ]
+    assert all(stage["peak_mb"] >= 0 for stage in pipeline.stage_memory_)
+    assert pipeline.stage_memory_[-2]["data_mb"] is None
+    assert pipeline.stage_memory_[1]["data_mb"] > 0
+
+
+def test_child_tables_are_exported_separately(tmp_path):
+    records = [
+        {
+            "testResultBid": f"t{i}",
+            "rit": 200 + i,
+            "norms": [{"percentile": p} for p in (10, 20)],
+            "instructionalAreas": [{"instructionalAreaBid": f"a{k}"} for k in range(4)],
+        }
+        for i in range(3)
+    ]
+    connector = MagicMock()
+    connector.pull_data.return_value = records
+    flattener = MultiJSONFlattener(
+        {
+            "norms": {"col_mapping": {"percentile": "NORMS_PERCENTILE"}, "child_table": "NORMS"},
+            "instructionalAreas": {
+                "col_mapping": {"instructionalAreaBid": "INSTRUCTIONAL_AREA_BID"},
+                "child_table": "INSTRUCTIONAL_AREAS",
+            },
+        },
+        key="testResultBid",
+    )
+    pipeline = ETLPipeline(
+        connector=connector,
+        exporter=FileExporter(file_name="results.csv", base_path=tmp_path),
+        transformers=[flattener],
+    )
+    pipeline.run()
+
+    results = pd.read_csv(tmp_path / "results.csv")
+    norms = pd.read_csv(tmp_path / "results_norms.csv")
+    areas = pd.read_csv(tmp_path / "results_instructional_areas.csv")
+
+    # the sum of the tables rather than 3 x 2 x 4 rows
+    assert results.columns.tolist() == ["testResultBid", "rit"]
+    assert len(results) + len(norms) + len(areas) == 3 + 6 + 12
+    assert norms.columns.tolist() == ["testResultBid", "NORMS_PERCENTILE"]
+    assert areas.loc[areas["testResultBid"] == "t1", "INSTRUCTIONAL_AREA_BID"].tolist() == [
+        "a0", "a1", "a2", "a3",
+    ]
+
+
+def test_child_tables_follow_renames_and_dedupes():
+    records = [
+        {"testResultBid": "t1", "modifiedDateTime": "2024-01-01", "norms": [{"percentile": 10}]},
+        {"testResultBid": "t1", "modifiedDateTime": "2024-01-01", "norms": [{"percentile": 10}]},
+        {"testResultBid": "t1", "modifiedDateTime": "2024-02-01", "norms": [{"percentile": 30}]},
+        {"testResultBid": "t2", "modifiedDateTime": "2024-01-01", "norms": [{"percentile": 50}]},
+    ]
+    connector = MagicMock()
+    connector.pull_data.return_value = records
+    flattener = MultiJSONFlattener(
+        {"norms": {"col_mapping": {"percentile": "NORMS_PERCENTILE"}, "child_table": "NORMS"}},
+        key=["testResultBid", "modifiedDateTime"],
+    )
+    pipeline = ETLPipeline(
+        connector=connector,
+        exporter=MagicMock(),
+        transformers=[
+            flattener,
+            DuplicateValueTransformer(subset=["testResultBid", "modifiedDateTime"], keep=False),
+            ColumnNameTransformer({"testResultBid": "TEST_RESULT_BID", "modifiedDateTime": "MODIFIED_DATE_TIME"}),
+        ],
+    )
+    pipeline.run()
+
+    norms = pipeline.child_tables_["NORMS"]
+    assert norms.columns.tolist() == ["TEST_RESULT_BID", "MODIFIED_DATE_TIME", "NORMS_PERCENTILE"]
+    # keep=False drops both copies of t1's first result, and their norms with them
+    assert norms.values.tolist() == [["t1", "2024-02-01", 30], ["t2", "2024-01-01", 50]]
+    pipeline.exporter.export_tables.assert_called_once_with(pipeline.child_tables_)
@@ -7,6 +7,10 @@ from abc import ABCMeta, abstractmethod
 class _BaseTransformer(metaclass=ABCMeta):
     """Base class for all transformers"""
 
+    # set by a pipeline that owns the data it passes in, so the data can be
+    # changed in place instead of copied
+    inplace = False
+
     @abstractmethod
     def transform(self, data):
         """Transform the data
@@ -0,0 +1,271 @@
+"""
+Compiler turning flattening specs into specialised Python functions.
+
+Applying a spec generically means looping over its fields and keys, and
+looking up defaults, for every record.  Instead the spec is compiled once
+into the source of a function with every column, key and default written
+out, so flattening a record is a handful of dict.get calls and one tuple.
+Flat records, ie student profiles, are projected onto their fields the same
+way.  Compiled functions are cached by spec, so every bid and page of a run
+reuses the same function.
+"""
+import threading
+
+from etl.transformers._utils import parse_literal
+
+
+_compiled = {}
+_lock = threading.Lock()
+
+
+def compile_flattener(
+    specs: dict, columns: list, column_defaults: dict = None, key=None
+):
+    """Compile a flattening spec into a function
+
+    Args:
+        specs (dict): Mapping of each JSON field to its spec, as taken by
+            MultiJSONFlattener
+        columns (list): Columns kept as they are, in order
+        column_defaults (dict): Value of each kept column when it's missing or
+            None, defaults to None
+        key (str | list): Column, or columns, identifying a record, the
+            first columns of every child table
+
+    Returns:
+        function: Takes a list of records and returns the rows, a tuple of
+            values in the order of flattened_columns(specs, columns), and a
+            mapping of each child table to its rows
+    """
+    column_defaults = column_defaults or {}
+    if key is None and any(spec.get("child_table") for spec in specs.values()):
+        raise ValueError("A key column is needed to write child tables")
+
+    key = _key_columns(key)
+    cache_key = (_make_key(specs, columns, column_defaults), key)
+
+    with _lock:
+        flatten = _compiled.get(cache_key)
+    if flatten is not None:
+        return flatten
+
+    source, namespace = _generate_source(specs, columns, column_defaults, key)
+    exec(compile(source, "<compiled flattener>", "exec"), namespace)
+    flatten = namespace["flatten"]
+    flatten.source = source
+
+    with _lock:
+        return _compiled.setdefault(cache_key, flatten)
+
+
+def compile_projection(fields: list):
+    """Compile the projection of flat records, ie student profiles, onto a
+    list of fields into a function
+
+    Args:
+        fields (list): Fields kept, in order, missing or None fields are
+            empty strings and every other value is converted to a string
+
+    Returns:
+        function: Takes a list of records and returns a tuple of values for
+            each, in the order of fields
+    """
+    cache_key = ("projection", tuple(fields))
+
+    with _lock:
+        project = _compiled.get(cache_key)
+    if project is not None:
+        return project
+
+    values = "".join(f"('' if (_v := get({field!r})) is None else str(_v)), " for field in fields)
+    source = (
+        "def project(records):\n"
+        "    rows = []\n"
+        "    append = rows.append\n"
+        "    for record in records:\n"
+        "        get = record.get\n"
+        f"        append(({values}))\n"
+        "    return rows\n"
+    )
+    namespace = {}
+    exec(compile(source, "<compiled projection>", "exec"), namespace)
+    project = namespace["project"]
+    project.source = source
+
+    with _lock:
+        return _compiled.setdefault(cache_key, project)
+
+
+def projected_columns(fields: list, rename: dict = None) -> list:
+    """Column names of the rows a compiled projection returns, renamed once
+    here instead of renaming every batch's dataframe"""
+    rename = rename or {}
+    return [rename.get(field, field) for field in fields]
+
+
+def flattened_columns(specs: dict, columns: list) -> list:
+    """Column names of the rows a compiled flattener returns"""
+    return list(columns) + [
+        col
+        for spec in specs.values()
+        if not spec.get("child_table")
+        for col in spec.get("col_mapping", {}).values()
+    ]
+
+
+def child_table_columns(specs: dict, key) -> dict:
+    """Column names of each child table a compiled flattener returns"""
+    key = list(_key_columns(key) or ())
+    return {
+        spec["child_table"]: key + list(spec.get("col_mapping", {}).values())
+        for spec in specs.values()
+        if spec.get("child_table")
+    }
+
+
+def clear_cache() -> None:
+    """Forget every compiled function"""
+    with _lock:
+        _compiled.clear()
+
+
+def _key_columns(key) -> tuple:
+    """Key columns as a tuple, None if there's no key"""
+    if key is None:
+        return None
+    if isinstance(key, str):
+        return (key,)
+    return tuple(key)
+
+
+def _make_key(specs: dict, columns: list, column_defaults: dict) -> tuple:
+    """Hashable key identifying a spec"""
+    return (
+        tuple(
+            (
+                field,
+                tuple(spec.get("col_mapping", {}).items()),
+                bool(spec.get("explode_col")),
+                spec.get("child_table"),
+                repr(sorted((spec.get("missing_cols_mapping") or {}).items())),
+            )
+            for field, spec in specs.items()
+        ),
+        tuple(columns),
+        repr(sorted(column_defaults.items())),
+    )
+
+
+def _generate_source(specs: dict, columns: list, column_defaults: dict, key: tuple) -> tuple:
+    """Write the source of the flattening function
+
+    Returns:
+        tuple: Source code and the namespace it's executed in
+    """
+    namespace = {"_parse": parse_literal, "_get_nested": _get_nested}
+    constants = []
+
+    def constant(value) -> str:
+        """Name of a constant, values like np.nan can't be written as literals"""
+        if value is None or isinstance(value, (bool, int, str)):
+            return repr(value)
+        name = f"_c{len(constants)}"
+        constants.append(name)
+        namespace[name] = value
+        return name
+
+    def get(obj: str, getter: str, key: str, default) -> str:
+        """Expression getting a key, nested keys are joined with '.'"""
+        if "." in key:
+            expr = f"_get_nested({obj}, {tuple(key.split('.'))!r})"
+        else:
+            expr = f"{getter}({key!r})"
+
+        if default is None:
+            return expr
+        return f"({constant(default)} if (_v := {expr}) is None else _v)"
+
+    lines = [
+        "def flatten(records):",
+        "    rows = []",
+        "    append = rows.append",
+        "    children = {}",
+    ]
+    child_tables = [
+        (i, spec["child_table"]) for i, spec in enumerate(specs.values()) if spec.get("child_table")
+    ]
+    for i, table in child_tables:
+        lines += [
+            f"    children[{table!r}] = c{i} = []",
+            f"    extend{i} = c{i}.extend",
+        ]
+    lines += [
+        "    for record in records:",
+        "        get = record.get",
+        f"        base = ({''.join(get('record', 'get', c, column_defaults.get(c)) + ', ' for c in columns)})",
+    ]
+    if child_tables:
+        lines.append(f"        key = ({''.join(f'get({k!r}), ' for k in key)})")
+
+    parts = ["base"]
+    loops = []
+    for i, (field, spec) in enumerate(specs.items()):
+        col_mapping = spec.get("col_mapping", {})
+        missing = spec.get("missing_cols_mapping") or {}
+        obj = "e" if spec.get("explode_col") or spec.get("child_table") else "value"
+        values = "".join(
+            get(obj, "g", key, missing.get(col)) + ", " for key, col in col_mapping.items()
+        )
+        empty = constant(tuple(missing.get(col) for col in col_mapping.values()))
+
+        lines += [
+            f"        value = get({field!r})",
+            "        if not isinstance(value, (dict, list)):",
+            "            value = _parse(value)",
+        ]
+        if spec.get("child_table"):
+            # a child row per element, keyed by the record, instead of
+            # repeating the record for every element
+            lines += [
+                "        if isinstance(value, list):",
+                f"            extend{i}([key + ({values}) for e in value if isinstance(e, dict) and (g := e.get)])",
+            ]
+        elif spec.get("explode_col"):
+            # one tuple per element, elements that aren't dicts get the defaults
+            lines += [
+                "        if isinstance(value, list) and value:",
+                f"            f{i} = [({values}) if isinstance(e, dict) and (g := e.get) else {empty} for e in value]",
+                "        else:",
+                f"            f{i} = ({empty},)",
+            ]
+            loops.append(i)
+            parts.append(f"e{i}")
+        else:
+            lines += [
+                "        if isinstance(value, dict):",
+                "            g = value.get",
+                f"            f{i} = ({values})",
+                "        else:",
+                f"            f{i} = {empty}",
+            ]
+            parts.append(f"f{i}")
+
+    # a row for every combination of exploded elements
+    indent = "        "
+    for i in loops:
+        lines.append(f"{indent}for e{i} in f{i}:")
+        indent += "    "
+    lines.append(f"{indent}append({' + '.join(parts)})")
+    lines.append("    return rows, children")
+
+    return "\n".join(lines) + "\n", namespace
+
+
+def _get_nested(value, parts: tuple):
+    """Walk nested dicts to the last part of a key"""
+    for part in parts:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+
+    return value
@@ -1,7 +1,78 @@
-def apply_eval(series_val):
-    """Helper function to apply eval to a series value"""
-    if type(series_val) in [str, bytes]:
-        return eval(series_val)
-    elif type(series_val) in [list, dict]:
+"""
+Parsing of JSON columns that were stringified on their way through a CSV.
+
+Cells are either JSON or the repr of a Python dict or list.  Instead of
+eval, which is slow and runs whatever is in the cell, they're decoded as
+JSON first and fall back to ast.literal_eval, which only accepts literals.
+"""
+import ast
+
+import numpy as np
+import pandas as pd
+
+from etl.connectors._json import default_decoder
+
+
+def parse_literal(series_val):
+    """Parse a stringified JSON or Python literal
+
+    Args:
+        series_val: Cell to parse, dicts and lists are returned as they are
+
+    Returns:
+        Parsed value, None for cells that aren't strings, dicts or lists
+
+    Raises:
+        ValueError: If a string is neither JSON nor a Python literal
+    """
+    if isinstance(series_val, (list, dict)):
         return series_val
-    return None
\ No newline at end of file
+    if isinstance(series_val, bytes):
+        series_val = series_val.decode("utf-8")
+    if not isinstance(series_val, str):
+        return None
+
+    try:
+        return default_decoder.loads(series_val)
+    except ValueError:
+        pass
+
+    # reprs of Python objects, ie single quotes or None / True / False
+    try:
+        return ast.literal_eval(series_val)
+    except (SyntaxError, ValueError) as e:
+        raise ValueError(f"Could not parse {series_val[:100]!r}: {e}") from e
+
+
+def parse_literals(series: pd.Series) -> pd.Series:
+    """Parse every cell of a stringified JSON column
+
+    Each distinct string is only parsed once, so rows with the same string
+    share the parsed object.
+
+    Args:
+        series (pd.Series): Column to parse
+
+    Returns:
+        pd.Series: Parsed column, with the same index and name
+    """
+    values = series.to_numpy(dtype=object)
+    parsed = np.empty(len(values), dtype=object)
+    parsed_strings = {}
+
+    for i, value in enumerate(values):
+        if isinstance(value, (str, bytes)):
+            if value not in parsed_strings:
+                parsed_strings[value] = parse_literal(value)
+            parsed[i] = parsed_strings[value]
+        elif isinstance(value, (list, dict)):
+            parsed[i] = value
+        else:
+            parsed[i] = None
+
+    return pd.Series(parsed, index=series.index, name=series.name)
+
+
+def apply_eval(series_val):
+    """Helper function to parse a series value, kept for older callers"""
+    return parse_literal(series_val)
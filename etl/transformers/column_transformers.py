@@ -1,10 +1,11 @@
 """
 Public Column Transformers for use in ETL interfaces
 """
+import numpy as np
 import pandas as pd
 
 from etl.transformers._base import _BaseSingleColumnTransformer
-from etl.transformers._utils import apply_eval
+from etl.transformers._utils import parse_literals
 
 # TO DO: add add logic to handle non-existent columns
 
@@ -81,26 +82,15 @@ class JSONColumnNormalizer(_BaseSingleColumnTransformer):
         """
 
         if self.col in data.columns:
-            # touching the original data could disrupt later operations
-            data_copy = data.copy(deep=True)
+            # touching the original data could disrupt later operations,
+            # unless the pipeline owns it
+            data_copy = data if self.inplace else data.copy(deep=True)
 
-            # unnormalized columns are sometimes strings, so eval them
-            # this step is slow, best to try and replace
-            data_copy[self.col] = data_copy[self.col].apply(apply_eval)
+            # unnormalized columns are sometimes strings, so parse them
+            data_copy[self.col] = parse_literals(data_copy[self.col])
 
             if self.explode_col:
-                # must ignore index to match against original dataset
-                exploded_data = data_copy[self.col].explode(ignore_index=False)
-                exploded_index = exploded_data.index
-                normalized_data = pd.json_normalize(exploded_data)
-                normalized_data.columns = self.new_col_names
-                normalized_data.index = exploded_index
-                final_data = pd.merge(
-                    data_copy, normalized_data, left_index=True, right_index=True
-                )
-
-                # reset index to match original dataset
-                final_data.reset_index(drop=True, inplace=True)
+                final_data = explode_by_offsets(data_copy, self.col, self.new_col_names)
             else:
                 data_copy["key"] = data_copy.index
                 normalized_data = pd.json_normalize(data_copy[self.col])
@@ -121,3 +111,67 @@ class JSONColumnNormalizer(_BaseSingleColumnTransformer):
             final_data.drop(self.col, axis=1, inplace=True)
 
         self.transformed_data_ = final_data
+
+
+def explode_by_offsets(data: pd.DataFrame, col: str, new_col_names: list = None) -> pd.DataFrame:
+    """Explode a column of lists of dicts into a row per element
+
+    The length of every list is computed once, the parent rows are repeated
+    by position and the child columns are built straight from the flattened
+    elements, so no index has to be joined back together.  Empty lists and
+    missing values give one row with empty child columns, as explode does.
+
+    Args:
+        data (pd.DataFrame): Dataframe to explode, col holds parsed lists
+        col (str): Column to explode
+        new_col_names (list): Names of the child columns, in the order of the
+            keys of the elements, defaults to the keys
+
+    Returns:
+        pd.DataFrame: Parent columns followed by the child columns, with a
+            fresh index
+
+    Raises:
+        ValueError: If the elements don't have one key per new column name
+    """
+    values = data[col].to_numpy(dtype=object)
+    lengths = np.ones(len(values), dtype=np.int64)
+    elements = []
+
+    for i, value in enumerate(values):
+        if isinstance(value, list) and value:
+            lengths[i] = len(value)
+            elements.extend(item if isinstance(item, dict) else {} for item in value)
+        elif isinstance(value, dict):
+            elements.append(value)
+        else:
+            elements.append({})
+
+    # position of each element's parent row
+    parents = np.repeat(np.arange(len(values)), lengths)
+    final_data = data.take(parents)
+    final_data.index = pd.RangeIndex(len(final_data))
+
+    # keys in order of appearance, json_normalize only for nested elements
+    keys = list(dict.fromkeys(key for element in elements for key in element))
+    if any(isinstance(element.get(key), dict) for element in elements for key in keys):
+        children = pd.json_normalize(elements)
+        keys = children.columns.tolist()
+        child_values = [children[key].to_numpy() for key in keys]
+    else:
+        child_values = [[element.get(key) for element in elements] for key in keys]
+
+    if new_col_names is None:
+        new_col_names = keys
+    elif not keys:
+        child_values = [[None] * len(elements) for _ in new_col_names]
+    elif len(keys) != len(new_col_names):
+        raise ValueError(
+            f"{col} has {len(keys)} keys {keys}, but {len(new_col_names)} "
+            f"new column names were given: {new_col_names}"
+        )
+
+    for child_col, child in zip(new_col_names, child_values):
+        final_data[child_col] = child
+
+    return final_data
@@ -5,6 +5,11 @@ Transformers that transform dataframes, as opposed to single columns
 import pandas as pd
 
 from etl.transformers._base import _BaseDataFrameTransformer
+from etl.transformers._compile import (
+    child_table_columns,
+    compile_flattener,
+    flattened_columns,
+)
 
 class ColumnNameTransformer(_BaseDataFrameTransformer):
     """
@@ -46,7 +51,11 @@ class ColumnNameTransformer(_BaseDataFrameTransformer):
         Args:
             data (pd.DataFrame): Dataframe to transform
         """
-        self.transformed_data_ = data.rename(columns=self.col_mapping)
+        if self.inplace:
+            data.rename(columns=self.col_mapping, inplace=True)
+            self.transformed_data_ = data
+        else:
+            self.transformed_data_ = data.rename(columns=self.col_mapping)
 
 class ColumnTypeTransformer(_BaseDataFrameTransformer):
     """
@@ -88,7 +97,13 @@ class ColumnTypeTransformer(_BaseDataFrameTransformer):
         Args:
             data (pd.DataFrame): Dataframe to transform
         """
-        self.transformed_data_ = data.astype(self.col_types)
+        if self.inplace:
+            # only the converted columns are replaced, the rest aren't copied
+            for col, col_type in self.col_types.items():
+                data[col] = data[col].astype(col_type)
+            self.transformed_data_ = data
+        else:
+            self.transformed_data_ = data.astype(self.col_types)
 
 class ColumnDropTransformer(_BaseDataFrameTransformer):
     """
@@ -130,7 +145,11 @@ class ColumnDropTransformer(_BaseDataFrameTransformer):
         Args:
             data (pd.DataFrame): Dataframe to transform
         """
-        self.transformed_data_ = data.drop(columns=self.cols_to_drop)
+        if self.inplace:
+            data.drop(columns=self.cols_to_drop, inplace=True)
+            self.transformed_data_ = data
+        else:
+            self.transformed_data_ = data.drop(columns=self.cols_to_drop)
 
 class DuplicateValueTransformer(_BaseDataFrameTransformer):
     """
@@ -181,5 +200,145 @@ class DuplicateValueTransformer(_BaseDataFrameTransformer):
         Args:
             data (pd.DataFrame): Dataframe to transform
         """
-        self.transformed_data_ = data.drop_duplicates(keep=self.keep, subset=self.subset)
+        if self.inplace:
+            data.drop_duplicates(keep=self.keep, subset=self.subset, inplace=True)
+            self.transformed_data_ = data
+        else:
+            self.transformed_data_ = data.drop_duplicates(keep=self.keep, subset=self.subset)
 
+
+
+class MultiJSONFlattener(_BaseDataFrameTransformer):
+    """
+    Transformer to flatten several JSON fields of raw records in one pass
+
+    Chaining a JSONColumnNormalizer per field copies and merges the whole
+    dataframe once per field.  This flattener builds every output column
+    while walking the records once, and only then creates the dataframe.
+    Exploded fields give one row per element, and a row for every
+    combination when several fields are exploded.  Fields written to child
+    tables instead give a row per element in a separate dataframe, keyed by
+    the record's key column, so records aren't repeated for every element.
+
+    Example Usage
+    -------------
+        >>> from transformers.dataframe_transformers import MultiJSONFlattener
+        >>> records = [{'bid': 'a', 'items': {'shown': 5},
+                        'norms': [{'percentile': 10}, {'percentile': 20}]}]
+        >>> transformer = MultiJSONFlattener({
+                'items': {'col_mapping': {'shown': 'ITEMS_SHOWN'}},
+                'norms': {'col_mapping': {'percentile': 'NORMS_PERCENTILE'},
+                          'explode_col': True},
+            })
+        >>> transformer.transform(records)
+          bid  ITEMS_SHOWN  NORMS_PERCENTILE
+        0   a            5                10
+        1   a            5                20
+
+        # or write norms to a child table keyed by bid
+        >>> transformer = MultiJSONFlattener({
+                'items': {'col_mapping': {'shown': 'ITEMS_SHOWN'}},
+                'norms': {'col_mapping': {'percentile': 'NORMS_PERCENTILE'},
+                          'child_table': 'NORMS'},
+            }, key='bid')
+        >>> transformer.transform(records)
+          bid  ITEMS_SHOWN
+        0   a            5
+        >>> transformer.child_tables_['NORMS']
+          bid  NORMS_PERCENTILE
+        0   a                10
+        1   a                20
+    """
+
+    def __init__(
+        self,
+        specs: dict,
+        drop_original_cols: bool = True,
+        columns: list = None,
+        column_defaults: dict = None,
+        key=None,
+    ):
+        """Initialize the class
+
+        Args:
+            specs (dict): Mapping of each JSON field to its spec, with the keys
+                col_mapping (dict): Mapping of keys in the field to new column
+                    names, nested keys are joined with '.'
+                explode_col (bool): Whether the field is a list to explode
+                child_table (str): Name of the child table to write the
+                    elements of a list to, instead of exploding it
+                missing_cols_mapping (dict): Value of each new column when the
+                    field or key is missing, defaults to None
+            drop_original_cols (bool): Whether to drop the JSON fields
+            columns (list): Other columns to keep, defaults to every column of
+                the records.  Missing ones are filled in with column_defaults
+            column_defaults (dict): Value of each column when it's missing,
+                defaults to None
+            key (str | list): Column, or columns, identifying a record,
+                needed for child tables
+        """
+        super().__init__()
+        self.specs = specs
+        self.drop_original_cols = drop_original_cols
+        self.columns = columns
+        self.column_defaults = column_defaults
+        self.key = key
+
+    def transform(self, data) -> pd.DataFrame:
+        """Flatten the JSON fields
+
+        Args:
+            data (list | pd.DataFrame): Records or dataframe to transform
+        """
+        self._transform_dataframe(data)
+
+        return self.transformed_data_
+
+    def _transform_dataframe(self, data) -> None:
+        """Private method to transform the dataframe
+
+        Args:
+            data (list | pd.DataFrame): Records or dataframe to transform
+        """
+        if isinstance(data, pd.DataFrame):
+            data = data.to_dict("records")
+
+        columns, rows, child_tables = self.flatten_records(data)
+        self.transformed_data_ = pd.DataFrame.from_records(rows, columns=columns)
+        self.child_tables_ = {
+            table: pd.DataFrame.from_records(child_rows, columns=child_columns)
+            for table, (child_columns, child_rows) in child_tables.items()
+        }
+
+    def flatten_records(self, records: list) -> tuple:
+        """Flatten the JSON fields of raw records into rows
+
+        The spec is compiled into a function the first time it's used with a
+        set of columns, later bids and pages reuse the compiled function.
+
+        Args:
+            records (list): Records, JSON fields can be dicts, lists or strings
+
+        Returns:
+            tuple: Column names, a tuple of values for every row, and a
+                mapping of each child table to its column names and rows
+        """
+        columns = self.columns
+        if columns is None:
+            # columns outside the specs are kept as they are, in order of appearance
+            columns = {}
+            for record in records:
+                for col in record:
+                    if col not in columns and (col not in self.specs or not self.drop_original_cols):
+                        columns[col] = None
+            columns = list(columns)
+
+        flatten = compile_flattener(self.specs, columns, self.column_defaults, self.key)
+        rows, child_rows = flatten(records)
+        child_columns = child_table_columns(self.specs, self.key)
+
+        return (
+            flattened_columns(self.specs, columns),
+            rows,
+            {table: (child_columns[table], child_rows[table]) for table in child_columns},
+        )
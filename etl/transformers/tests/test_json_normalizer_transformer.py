@@ -58,3 +58,45 @@ def test_json_column_normalizer_explode():
     assert data.values.tolist() == [[41, '2020', 'achievement'], [79, '2020', 'achievement']]
     assert transformer.transformed_data_.equals(data)
     assert hasattr(transformer, "transformed_data_")
+
+def test_json_column_normalizer_explode_keeps_parent_rows():
+    """
+    Test exploding repeats each parent row once per element, in order
+    """
+
+    data = pd.DataFrame({'bid': ['a', 'b', 'c'],
+                         'areas': [[{'bid': 1, 'score': 10}, {'bid': 2, 'score': 20}],
+                                   [],
+                                   "[{'bid': 3, 'score': 30}]"]},
+                        index=[7, 8, 9])
+
+    transformer = JSONColumnNormalizer(col = 'areas',
+                                        new_col_names = ['AREA_BID', 'AREA_SCORE'],
+                                        drop_original_col = True,
+                                        explode_col = True)
+
+    data = transformer.transform(data)
+
+    assert data.columns.tolist() == ['bid', 'AREA_BID', 'AREA_SCORE']
+    assert data.index.tolist() == [0, 1, 2, 3]
+    assert data['bid'].tolist() == ['a', 'a', 'b', 'c']
+    assert data['AREA_SCORE'].tolist()[:2] == [10, 20]
+    assert pd.isna(data.loc[2, 'AREA_SCORE'])
+    assert data.loc[3, 'AREA_BID'] == 3
+
+
+def test_json_column_normalizer_explode_rejects_wrong_names():
+    """
+    Test exploding raises when the names don't match the keys of the elements
+    """
+
+    data = pd.DataFrame({'bid': ['a'],
+                         'areas': [[{'bid': 1, 'score': 10}]]})
+
+    transformer = JSONColumnNormalizer(col = 'areas',
+                                        new_col_names = ['AREA_BID'],
+                                        drop_original_col = True,
+                                        explode_col = True)
+
+    with pytest.raises(ValueError, match="2 keys"):
+        transformer.transform(data)
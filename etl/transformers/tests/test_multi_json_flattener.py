@@ -0,0 +1,128 @@
+"""
+Unit tests for the MultiJSONFlattener class.
+"""
+import pandas as pd
+
+from etl.transformers._compile import compile_flattener, compile_projection, projected_columns
+from etl.transformers.dataframe_transformers import MultiJSONFlattener
+
+
+SPECS = {
+    "items": {
+        "col_mapping": {"shown": "ITEMS_SHOWN", "total": "ITEMS_TOTAL"},
+        "missing_cols_mapping": {"ITEMS_TOTAL": 0},
+    },
+    "norms": {
+        "col_mapping": {"percentile": "NORMS_PERCENTILE"},
+        "explode_col": True,
+    },
+    "instructionalAreas": {
+        "col_mapping": {"instructionalAreaBid": "IA_BID", "goal.name": "IA_GOAL"},
+        "explode_col": True,
+    },
+}
+
+
+def test_flattens_every_field_in_one_pass():
+    records = [
+        {
+            "testResultBid": "t1",
+            "items": {"shown": 40, "total": 42},
+            "norms": [{"percentile": 10}, {"percentile": 20}],
+            "instructionalAreas": [
+                {"instructionalAreaBid": "a1", "goal": {"name": "Algebra"}},
+                {"instructionalAreaBid": "a2", "goal": {"name": "Geometry"}},
+            ],
+        },
+        {
+            # stringified fields from a CSV, and missing fields
+            "testResultBid": "t2",
+            "items": "{'shown': 30, 'total': None}",
+            "instructionalAreas": [],
+        },
+    ]
+
+    data = MultiJSONFlattener(SPECS).transform(records)
+
+    assert data.columns.tolist() == [
+        "testResultBid", "ITEMS_SHOWN", "ITEMS_TOTAL", "NORMS_PERCENTILE", "IA_BID", "IA_GOAL",
+    ]
+    assert data.shape == (5, 6)
+    assert data["testResultBid"].tolist() == ["t1", "t1", "t1", "t1", "t2"]
+    assert data["NORMS_PERCENTILE"].tolist()[:4] == [10, 10, 20, 20]
+    assert data["IA_BID"].tolist()[:4] == ["a1", "a2", "a1", "a2"]
+    assert data["IA_GOAL"].tolist()[:4] == ["Algebra", "Geometry", "Algebra", "Geometry"]
+    assert pd.isna(data.loc[4, "IA_BID"])
+    assert data.loc[4, "ITEMS_SHOWN"] == 30
+    assert data.loc[4, "ITEMS_TOTAL"] == 0
+    assert pd.isna(data.loc[4, "NORMS_PERCENTILE"])
+
+
+def test_accepts_dataframes():
+    df = pd.DataFrame(
+        {"testResultBid": ["t1"], "items": ['{"shown": 1, "total": 2}'], "norms": [None]}
+    )
+
+    data = MultiJSONFlattener(SPECS, drop_original_cols=False).transform(df)
+
+    assert "items" in data.columns
+    assert data.loc[0, "ITEMS_TOTAL"] == 2
+    assert pd.isna(data.loc[0, "IA_BID"])
+
+
+def test_compiled_once_and_fills_in_missing_columns():
+    transformer = MultiJSONFlattener(
+        SPECS, columns=["testResultBid", "rit"], column_defaults={"rit": -1}
+    )
+
+    first = transformer.transform([{"testResultBid": "t1", "extra": 1}])
+    columns, _, _ = transformer.flatten_records([{"testResultBid": "t2"}])
+
+    assert first.columns.tolist() == columns
+    assert first.columns.tolist()[:2] == ["testResultBid", "rit"]
+    assert first.loc[0, "rit"] == -1
+    assert "extra" not in first.columns
+    assert compile_flattener(SPECS, ["testResultBid", "rit"], {"rit": -1}) is compile_flattener(
+        SPECS, ["testResultBid", "rit"], {"rit": -1}
+    )
+
+
+def test_compiled_projection_fills_in_missing_fields():
+    project = compile_projection(["studentBid", "grade", "gender"])
+
+    rows = project([{"studentBid": "s1", "grade": 5, "gender": None, "extra": 1}, {}])
+
+    assert rows == [("s1", "5", ""), ("", "", "")]
+    assert compile_projection(["studentBid", "grade", "gender"]) is project
+    assert projected_columns(["studentBid", "grade"], {"studentBid": "STUDENT_BID"}) == [
+        "STUDENT_BID",
+        "grade",
+    ]
+
+
+def test_assessment_config_fills_in_missing_nested_fields():
+    from etl.configs.nwea_assessment_config import json_flattener
+
+    records = [
+        # a test result without any of the nested fields
+        {"testResultBid": "t1", "modifiedDateTime": "2024-01-01T00:00:00"},
+        {
+            "testResultBid": "t2",
+            "modifiedDateTime": "2024-01-02T00:00:00",
+            "norms": [{"reference": "2020"}],
+            "instructionalAreas": [{"instructionalAreaName": "Geometry"}],
+        },
+    ]
+
+    data = json_flattener.transform(records)
+    norms = json_flattener.child_tables_["NORMS"]
+    areas = json_flattener.child_tables_["INSTRUCTIONAL_AREAS"]
+
+    assert data["testResultBid"].tolist() == ["t1", "t2"]
+    assert data[["LEXILE_SCORE", "ITEMS_TOTAL"]].isna().all().all()
+    # a result without the lists has no child rows, missing fields of an element are NaN
+    assert norms["testResultBid"].tolist() == ["t2"]
+    assert norms["NORMS_PERCENTILE"].dtype == "float64"
+    assert norms.loc[0, "NORMS_REFERENCE"] == "2020"
+    assert areas["testResultBid"].tolist() == ["t2"]
+    assert areas["INSTRUCTIONAL_AREA_SCORE"].dtype == "float64"
@@ -0,0 +1,37 @@
+"""
+Unit tests for the parser of stringified JSON columns
+"""
+import pytest
+import pandas as pd
+
+from etl.transformers._utils import parse_literal, parse_literals
+
+
+def test_parses_json_and_python_reprs():
+    assert parse_literal('{"key1": "value1", "key2": null}') == {"key1": "value1", "key2": None}
+    assert parse_literal("[{'key1': 'value1', 'key2': None, 'key3': True}]") == [
+        {"key1": "value1", "key2": None, "key3": True}
+    ]
+    assert parse_literal(b'{"key1": 1}') == {"key1": 1}
+    assert parse_literal({"key1": 1}) == {"key1": 1}
+    assert parse_literal(float("nan")) is None
+
+
+def test_never_runs_code():
+    with pytest.raises(ValueError):
+        parse_literal("__import__('os').getcwd()")
+
+
+def test_parses_each_distinct_string_once():
+    series = pd.Series(
+        ['{"a": 1}', '{"a": 1}', "{'a': 2}", {"a": 3}, None],
+        index=[10, 11, 12, 13, 14],
+        name="col1",
+    )
+
+    parsed = parse_literals(series)
+
+    assert parsed.tolist() == [{"a": 1}, {"a": 1}, {"a": 2}, {"a": 3}, None]
+    assert parsed.index.tolist() == [10, 11, 12, 13, 14]
+    assert parsed.name == "col1"
+    assert parsed[10] is parsed[11]
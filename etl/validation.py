@@ -5,6 +5,7 @@ import pandas as pd
 from datetime import datetime
 
 from etl.config import dtype_config
+from etl.connectors._dates import date_formats
 
 def validate_data(data: pd.DataFrame, dtype_config: dict, max_date: datetime) -> None:
     """Validate the data"""
@@ -36,7 +37,8 @@ def duplicates_check(data: pd.DataFrame, subset: list[list, None]) -> None:
 
 def valid_date_check(data: pd.DataFrame, max_date: datetime, date_col: str) -> None:
     """Check for valid dates in the data"""
-    if data[date_col].max() < max_date:
+    dates = date_formats.parse(data[date_col], "validate_data", date_col)
+    if dates.max() < max_date:
         logging.error(f"Date found in {date_col} column is greater than max date")
         raise ValueError(f"Date found in {date_col} column is greater than max date")
 
@@ -9,8 +9,11 @@ import time
 import pandas as pd
 from prefect import task
 import requests
+import sys
 from src.env_config import *
-SLEEP_TIME = 600  # Sleep time in seconds
+sys.path.append(ROOT_DIR)
+from etl.connectors._retry import retry_policy
+from etl.connectors._json import decode_response
 
 
 
@@ -56,7 +59,9 @@ def apply_eval(series_val):
 
 def api_request(student_bid, api_headers):
     api_url = f'https://api.nwea.org/students/v2/{student_bid}/results'            
-    response = requests.get(api_url, headers=api_headers)
+    # 429 means the rate limit is used up, the shared retry policy backs off
+    # and honours Retry-After, and stops calling NWEA once its circuit opens
+    response = retry_policy.get(api_url, retry_statuses=[429], headers=api_headers)
     return response,student_bid
                       
 
@@ -241,7 +246,7 @@ def process_student_data(bid, api_headers):
     response,student_bid = api_request(bid, api_headers)
     
     if response and response.status_code == 200:
-        response_data = response.json()
+        response_data = decode_response(response)
         filtered_data=filter_columns(response_data)
         normalized_data = pd.json_normalize(filtered_data)
         data_df = pd.DataFrame(normalized_data)
@@ -257,11 +262,6 @@ def process_student_data(bid, api_headers):
                 "status_code": response.status_code, 
                 "reason": f"API error: HTTP {response.status_code}"
                 }
-    elif response and response.status_code == 429:  # HTTP status code 429 indicates rate limit exhaustion
-     # Sleep and retry after some time
-        time.sleep(SLEEP_TIME)
-        return process_student_data(bid, api_headers)  # Retry the API call
-    
     else:
         # General error, including connection issues
         return {"student_bid": bid,
@@ -277,6 +277,8 @@ def chunked_student_list(student_list, chunk_size=50000):
         yield student_list[i : i + chunk_size]
 
 def run_student_assessment_pull(src=None):
+    # a new job starts with the full retry budget of the shared policy
+    retry_policy.reset_budget()
     ''' Check if src is a string (assumed to be a CSV file) or a DataFrame'''
     if isinstance(src, str):
         student_list = pd.read_csv(src)["STUDENT_BID"].values.tolist()
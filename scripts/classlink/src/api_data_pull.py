@@ -6,16 +6,33 @@ from datetime import datetime, timedelta
 import datetime
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from prefect_email import EmailServerCredentials, email_send_message
-import requests
 from src.env_config import *
 sys.path.append(ROOT_DIR)
 from scripts.oracledb_connection.internals.db import *
+from etl.connectors._auth import ClassLinkTokenManager
+from etl.connectors._cache import response_cache
+from etl.connectors._http import session_pool
+from etl.connectors._json import decode_response
+from etl.connectors._pagination import OffsetPaginator
+from etl.connectors._ratelimit import rate_limiter
+from etl.connectors._retry import retry_policy
 from datetime import datetime 
 from prefect import flow, task
 
 
+# max # of a student's class pages requested at once
+CLASSES_MAX_PREFETCH = 4
+
+
+def _count_page_records(page):
+    """Count the records on a (response, data) page, None if the request failed"""
+    response, data = page
+    return None if data is None else len(data)
+
+
 def generate_timestamp():
     return datetime.now().strftime("%d-%m-%Y")
 
@@ -24,20 +41,16 @@ def generate_timestamp():
 
 
 def get_district_key():
-    url = 'https://oneroster-proxy.classlink.io/applications'
-    headers = {
-        'Authorization': F'Bearer {CLASSLINK_BEARER}'
-    }
-
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        data = response.json()['applications']
+    '''district tokens are cached until they expire, so re-runs don't list them again'''
+    try:
+        tokens = ClassLinkTokenManager(CLASSLINK_BEARER).get_token()
+    except Exception as e:
+        logging.error(f"Could not get district tokens: {e}")
+        return None
 
-        df = pd.json_normalize(data)
-        distrit_tokens = df[['bearer', 'oneroster_application_id']]
-        logging.info("Total district tokens:%d",len(distrit_tokens))
-        return distrit_tokens
+    distrit_tokens = pd.DataFrame(tokens, columns=['bearer', 'oneroster_application_id'])
+    logging.info("Total district tokens:%d",len(distrit_tokens))
+    return distrit_tokens
 
 
 
@@ -52,36 +65,33 @@ def get_all_classlink_students():
     for index, row in distrit_tokens.iterrows():
         bearer = row['bearer']
         oneroster_application_id = row['oneroster_application_id']
-        offset = 0
-        
-        while True:
-            url = f'https://oneroster-proxy.classlink.io/{oneroster_application_id}/ims/oneroster/v1p1/students/?limit=10000&offset={offset}&orderBy=asc'
-            headers = {
-                'Authorization': f'Bearer {bearer}'
-            }
-
-            response = requests.get(url, headers=headers)
-            
-            if response.status_code == 200:
-                data = response.json()['user']
+        headers = {
+            'Authorization': f'Bearer {bearer}'
+        }
 
-                if not data:
-                    logging.info(f"No data for oneroster_application_id {oneroster_application_id}")
-                    break
-
-                df_temp = pd.json_normalize(data)
-                df_temp['bearer'] = bearer
-                df_temp['oneroster_application_id'] = oneroster_application_id 
+        # bound as defaults, prefetched pages may still run after the loop moves on
+        def fetch_page(offset, oneroster_application_id=oneroster_application_id, headers=headers):
+            url = f'https://oneroster-proxy.classlink.io/{oneroster_application_id}/ims/oneroster/v1p1/students/?limit=10000&offset={offset}&orderBy=asc'
+            response = retry_policy.get(url, tenant=oneroster_application_id, headers=headers)
+            data = decode_response(response)['user'] if response.status_code == 200 else None
+            return response, data
+
+        # large districts have their next offsets requested while a page is parsed
+        paginator = OffsetPaginator(fetch_page, page_size=10000, count_records=_count_page_records)
+        for offset, (response, data) in paginator:
+            if data is None:
+                logging.info(f"Request failed with status code {response.status_code}")
+                break
 
-                df_all_students = pd.concat([df_all_students, df_temp], ignore_index=True)
+            if not data:
+                logging.info(f"No data for oneroster_application_id {oneroster_application_id}")
+                break
 
-                if len(data) < 10000:
-                    break
+            df_temp = pd.json_normalize(data)
+            df_temp['bearer'] = bearer
+            df_temp['oneroster_application_id'] = oneroster_application_id 
 
-                offset += 10000
-            else:
-                logging.info(f"Request failed with status code {response.status_code}")
-                break
+            df_all_students = pd.concat([df_all_students, df_temp], ignore_index=True)
 
     if not  os.path.exists(CLASSLINK_ALL_STUDENTS):
         os.makedirs(CLASSLINK_ALL_STUDENTS)
@@ -118,7 +128,10 @@ FROM
     JOIN dwh_data.fev_program_d         fpd ON fsf.program_skey = fpd.program_skey
     JOIN dwh_data.fev_program_ver_d     fpvd ON fsf.program_ver_skey = fpvd.program_ver_skey
     JOIN dwh_data.fev_school_d          fsd2 ON fsd1.school_id = fsd2.school_id'''
-    Classlink_Students=  execute_query_to_df(query)
+    # only the ids are merged with the API's students, so only they're fetched
+    Classlink_Students=  execute_query_to_df(
+        query, columns=['student_classlink_source_id'], use_arrow=True
+    )
     logging.info("Total ids returned by the query:%d",len(Classlink_Students))
     return Classlink_Students.drop_duplicates()
         
@@ -157,6 +170,9 @@ def get_final_classlink_students():
 '''gets classes for each student id'''
 @task
 def run_classes_data_pull():
+    # a new job starts with the full retry budget of the shared policy
+    retry_policy.reset_budget()
+
 
     if not os.path.exists(CLASSLINK_ERROR_LOGS):
         os.makedirs(CLASSLINK_ERROR_LOGS)
@@ -176,27 +192,57 @@ def run_classes_data_pull():
     num_requests = 0
     df_errored_records = pd.DataFrame()
 
+    # ClassLink answers 403 as well as 429 when a district is over its limit
+    rate_limiter.configure("https://oneroster-proxy.classlink.io", throttle_statuses=[403, 429])
+
+    # shared by every student's paginator, so threads aren't created per student
+    executor = ThreadPoolExecutor(max_workers=CLASSES_MAX_PREFETCH)
+
     for index, row in df_students.iterrows():
 
         bearer = row['bearer']
         oneroster_application_id = row['oneroster_application_id']
         student_id = row['student_classlink_source_id']
+        headers = {'Authorization': f'Bearer {bearer}'}
 
-        logging.info(f"Processing student id: {index + 1}")  
-        offset = 0
-        while True:
+        # bound as defaults, prefetched pages may still run after the loop moves on
+        def fetch_page(offset, oneroster_application_id=oneroster_application_id,
+                       student_id=student_id, headers=headers):
             url = f'https://oneroster-proxy.classlink.io/{oneroster_application_id}/ims/oneroster/v1p1/students/{student_id}/classes?limit=1000&offset={offset}&orderBy=asc'
-            headers = {'Authorization': f'Bearer {bearer}'}
+            # 403 and 429 are ClassLink's rate limits, each district is
+            # paced separately and the rate limiter slows down when it sees them
+            response = retry_policy.get(
+                url,
+                retry_statuses=[403, 429],
+                tenant=oneroster_application_id,
+                headers=headers,
+            )
+            data = decode_response(response)['classes'] if response.status_code == 200 else None
+            return response, data
 
-            try:
-                response = requests.get(url, headers=headers)
-            except Exception as e:
-                logging.error(f"An error occurred: {e}")
-                break
+        logging.info(f"Processing student id: {index + 1}")  
+        paginator = OffsetPaginator(
+            fetch_page,
+            page_size=1000,
+            count_records=_count_page_records,
+            max_prefetch=CLASSES_MAX_PREFETCH,
+            executor=executor,
+        )
+        try:
+            for offset, (response, data) in paginator:
+                num_requests += 1
+                if data is None:
+                    logging.error(f"Request failed with status code {response.status_code}")
+
+                    df_errored_records = pd.DataFrame({
+                        'CLASSLINK_STUDENT_ID': [student_id],
+                        'LOAD_DATE': [datetime.now().strftime("%d-%m-%Y")],
+                        'MESSAGE': [response.status_code]
+                    })
+                    df_errored_records.to_csv(filename_for_error, mode='a', header=not os.path.isfile(filename_for_error), index=False)
 
-            num_requests += 1
-            if response.status_code == 200:
-                data = response.json()['classes']
+                    logging.error(f"Encountered {response.status_code} response")
+                    break
 
                 if not data:
                     logging.info(f"No data for oneroster_application_id {oneroster_application_id}")
@@ -229,27 +275,21 @@ def run_classes_data_pull():
 
                 
                 df_temp.to_csv(filename_for_data, mode='a', header=not os.path.isfile(filename_for_data), index=False)
-
-                if len(data) < 1000:
-                    break
-
-                offset += 1000
-            else:
-                logging.error(f"Request failed with status code {response.status_code}")
-
-                df_errored_records = pd.DataFrame({
-                    'CLASSLINK_STUDENT_ID': [student_id],
-                    'LOAD_DATE': [datetime.now().strftime("%d-%m-%Y")],
-                    'MESSAGE': [response.status_code]
-                })
-                df_errored_records.to_csv(filename_for_error, mode='a', header=not os.path.isfile(filename_for_error), index=False)
-
-                if response.status_code == 403 or response.status_code == 429:
-                    logging.info(f"Encountered {response.status_code} response. Sleeping for 5 minutes.")
-                    time.sleep(600)
-                else :
-                    logging.error(f"Encountered {response.status_code} response")
-                    break
+        except Exception as e:
+            logging.error(f"An error occurred: {e}")
+            # ie a dropped connection or an open circuit, the student is
+            # logged like a failed response so it isn't silently missing
+            df_errored_records = pd.DataFrame({
+                'CLASSLINK_STUDENT_ID': [student_id],
+                'LOAD_DATE': [datetime.now().strftime("%d-%m-%Y")],
+                'MESSAGE': [repr(e)]
+            })
+            df_errored_records.to_csv(filename_for_error, mode='a', header=not os.path.isfile(filename_for_error), index=False)
+
+    executor.shutdown()
+    session_pool.log_stats()
+    response_cache.log_stats()
+    rate_limiter.save()
    
 
 
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import sys
 import numpy as np
@@ -8,52 +9,58 @@ import datetime
 import os
 import pandas as pd
 from prefect_email import EmailServerCredentials, email_send_message
-import requests
 from src.env_config import *
 sys.path.append(ROOT_DIR)
 from scripts.oracledb_connection.internals.db import *
+from etl.connectors._auth import CleverTokenManager
+from etl.connectors._cache import response_cache
+from etl.connectors._http import session_pool
+from etl.connectors._json import decode_response
+from etl.connectors._retry import retry_policy
+from etl.exporters._base import FileExporter
 from datetime import datetime 
 from prefect import flow, task
 timestamp = datetime.now().strftime("%d-%m-%Y")
 
 
 def get_districts_keys():
-    url = 'https://clever.com/oauth/tokens'
-    headers = {
-        'Authorization': F'Basic {CLEVER_BEARER}'
-    }
-    
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        data = response.json()['data']
-        df = pd.json_normalize(data)
-        df_at = df['access_token']
-        return df_at
-    else:
-        raise Exception(f"Failed to retrieve districts keys. Status code: {response.status_code}, Response: {response.text}")    
+    '''district tokens are cached until they expire, so re-runs don't list them again'''
+    tokens = CleverTokenManager(CLEVER_BEARER).get_token()
+    df_at = pd.Series(tokens, name='access_token')
+    return df_at
     
 
 
 
 @task        
 def get_courses_data ():
+    # a new job starts with the full retry budget of the shared policy
+    retry_policy.reset_budget()
 
     df_at = get_districts_keys()
-    df_responses = pd.DataFrame()
     error_tokens = []    
+
+    # each page is written as it arrives, instead of growing one dataframe
+    # with every district's courses
+    exporter = FileExporter(
+        file_name=f"Clever_courses_data_{timestamp}.csv", base_path=CLEVER_BULK_DATA
+    )
     for i, token in enumerate(df_at):
         headers = {
             'Authorization': f'Bearer {token}'
         }
+        tenant = hashlib.sha256(token.encode()).hexdigest()[:16]
         base_url = 'https://api.clever.com/v3.0/courses?limit=10000'
         next_link = base_url
         while next_link:
-            response = requests.get(next_link, headers=headers)
+            # the token identifies the district, so each district's pages are
+            # cached separately and unchanged pages aren't downloaded again
+            response = retry_policy.get(next_link, tenant=tenant, headers=headers)
             if response.status_code == 200:
-                data = response.json()
+                data = decode_response(response)
                 links = data.get('links', [])
                 df_temp = pd.json_normalize(data['data'])
-                df_responses = pd.concat([df_responses, df_temp], ignore_index=True)
+                exporter.export_batch(df_temp)
                 next_link = next((link.get('uri') for link in links if link.get('rel') == 'next'), None)
                 if not next_link:
                     break
@@ -74,11 +81,11 @@ def get_courses_data ():
         filename = f"{CLEVER_ERROR_LOGS}Clever_courses_error_{timestamp}.csv"
         error_df.to_csv(filename, index=False)
     
-    if not os.path.exists(CLEVER_BULK_DATA):
-        os.makedirs(CLEVER_BULK_DATA)                             
-    filename = f"{CLEVER_BULK_DATA}Clever_courses_data_{timestamp}.csv"
-    df_responses.to_csv(filename, index=False)
-    return df_responses
+    if exporter.columns_ is None:
+        # no district had any courses, still leave an empty file for the run
+        exporter.export(pd.DataFrame())
+    response_cache.log_stats()
+    return os.path.join(exporter.base_path, exporter.file_name)
 
 
 def get_latest_file_from_folder(folder_path, file_prefix="", file_extension=".csv", date_format="%d-%m-%Y"):
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import sys
 import numpy as np
@@ -7,10 +8,15 @@ import datetime
 import os
 import pandas as pd
 from prefect_email import EmailServerCredentials, email_send_message
-import requests
 from src.env_config import *
 sys.path.append(ROOT_DIR)
 from scripts.oracledb_connection.internals.db import *
+from etl.connectors._auth import CleverTokenManager
+from etl.connectors._cache import response_cache
+from etl.connectors._http import session_pool
+from etl.connectors._json import decode_response
+from etl.connectors._retry import retry_policy
+from etl.exporters._base import FileExporter
 from datetime import datetime 
 from prefect import flow, task
 
@@ -20,37 +26,43 @@ timestamp = datetime.now().strftime("%d-%m-%Y")
 
 @task
 def get_districts_keys():
+    '''district tokens are cached until they expire, so re-runs don't list them again'''
+    try:
+        tokens = CleverTokenManager(CLEVER_BEARER).get_token()
+    except Exception as e:
+        logging.error(f"Could not get district tokens: {e}")
+        return None
 
-    url = 'https://clever.com/oauth/tokens'
-    headers = {
-        'Authorization': F'Basic {CLEVER_BEARER}'
-    }
-
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        data = response.json()['data']
-        df = pd.json_normalize(data)
-        df_at = df['access_token']
-        return df_at
+    df_at = pd.Series(tokens, name='access_token')
+    return df_at
 
 
 
 @task
 def get_sections_data ():
+    # a new job starts with the full retry budget of the shared policy
+    retry_policy.reset_budget()
     df_at =  get_districts_keys()
-    df_responses = pd.DataFrame()
     failed_responses = []
+
+    # each page is written as it arrives, instead of growing one dataframe
+    # with every district's sections
+    exporter = FileExporter(
+        file_name=f"Clever_sections_data_{timestamp}.csv", base_path=CLEVER_BULK_DATA
+    )
     for i, token in enumerate(df_at):
         headers = {
             'Authorization': f'Bearer {token}'
-        }   
+        }
+        tenant = hashlib.sha256(token.encode()).hexdigest()[:16]   
         base_url = 'https://api.clever.com/v3.0/sections?limit=10000'
         next_url = base_url
         while next_url:
-            response = requests.get(next_url, headers=headers)
+            # the token identifies the district, so each district's pages are
+            # cached separately and unchanged pages aren't downloaded again
+            response = retry_policy.get(next_url, tenant=tenant, headers=headers)
             if response.status_code == 200:
-                data = response.json()
+                data = decode_response(response)
 
                 df = pd.json_normalize(data['data'])
     
@@ -60,7 +72,7 @@ def get_sections_data ():
                         df[column] = df[column].apply(lambda x: x if isinstance(x, list) else [])
                         df = df.explode(column)
                         df = df.join(pd.json_normalize(df[column]).add_prefix(f'{column}_'))
-                df_responses = pd.concat([df_responses, df], ignore_index=True)                
+                exporter.export_batch(df)
                 next_url = next((link.get('uri') for link in data.get('links', []) if link.get('rel') == 'next'), None)
     
                 if not next_url:
@@ -85,10 +97,10 @@ def get_sections_data ():
         failed_df.to_csv(failed_filename, index=False)
     
 
-    if not os.path.exists(CLEVER_BULK_DATA):
-        os.makedirs(CLEVER_BULK_DATA)
-    filename = f"{CLEVER_BULK_DATA}Clever_sections_data_{timestamp}.csv"
-    df_responses.to_csv(filename, index=False)
+    if exporter.columns_ is None:
+        # no district had any sections, still leave an empty file for the run
+        exporter.export(pd.DataFrame())
+    response_cache.log_stats()
 
 
 
@@ -3,70 +3,42 @@ Helper functions for the project.
 """
 import datetime
 import logging
-import time
+import sys
 
 import pandas as pd
-import requests
 import tqdm
 from src.env_config import *
+sys.path.append(ROOT_DIR)
+from etl.connectors._auth import get_nwea_token_manager
+from etl.connectors._json import decode_response
+from etl.connectors._pagination import StalePageStopper, get_record_order
+from etl.connectors._retry import retry_policy
 
 def generate_api_header(token_url: str = 'https://api.nwea.org/auth/v1/token',
                         grant_type = 'client_credentials'):
     
-    """Get access token and generate api headers to use for API connections"""
-    auth_code = NWEA_AUTH
-    api_key   =  NWEA_API_KEY
-    token_headers = {
-            'Authorization': auth_code,
-            'apikey': api_key,
-            'grant_type': grant_type,
-            'Content-Length': '0'
-    }
-    
-    # get auth token to later connect to the api
+    """Get access token and generate api headers to use for API connections,
+    the token is cached until it's about to expire"""
     try:
-        resp_json    = requests.post(token_url, headers = token_headers).json()
-        access_token = resp_json['access_token']
-        api_headers  = {
-            'Content/Type': 'application/json',
-            'apikey': api_key,
-            'Authorization': f'Bearer {access_token}'
-        }
-        return api_headers
+        token_manager = get_nwea_token_manager(token_url, grant_type, NWEA_AUTH, NWEA_API_KEY)
+        return token_manager.get_headers()
     except Exception as e:
         logging.info(f"Could not connect to API because: {e}")
         return None 
-    
-def connect_to_api(api_url, api_headers, api_params):
-    """Connect to API given certain parameters"""
-    resp = requests.get(api_url, headers = api_headers, params = api_params)
 
-    if resp.status_code != 504:
-        return resp
-    
-    # 504 means the server is busy, so retry the connection
-    return connect_to_api_with_504_error(api_url, api_headers, api_params)
-
-def connect_to_api_with_504_error(api_url, api_headers, api_params, 
-                                  resp = None, num_attempts = 1, wait_time = 5):
-    """Code to continually try to connect to endpoint if given a 504 error"""
-    if num_attempts >= 4:
-        return resp
-    
-    logging.info(f"Waiting {wait_time} seconds to reconnect to the API due to 504 or 401 status code")
-    time.sleep(wait_time)
-    
-    resp = requests.get(api_url, headers = api_headers, params = api_params)
+def refresh_api_header(api_headers: dict,
+                       token_url: str = 'https://api.nwea.org/auth/v1/token',
+                       grant_type = 'client_credentials'):
+    """Generate new api headers after the API rejected api_headers with a 401"""
+    token_manager = get_nwea_token_manager(token_url, grant_type, NWEA_AUTH, NWEA_API_KEY)
+    token_manager.invalidate_headers(api_headers)
+    return generate_api_header(token_url, grant_type)
     
-    if resp.status_code == 504:
-        # use recursion to continually call error until limit hits
-        # wait 5 more seconds to retry after each unsuccessful attempt
-        return connect_to_api_with_504_error(api_url, api_headers, api_params, resp = resp, 
-                                             num_attempts = num_attempts + 1,
-                                             wait_time = wait_time)
-    
-    else:
-        return resp
+def connect_to_api(api_url, api_headers, api_params):
+    """Connect to API given certain parameters, 504 means the server is busy,
+    so the shared retry policy backs off and retries the connection"""
+    return retry_policy.get(api_url, retry_statuses = [504],
+                            headers = api_headers, params = api_params)
     
 def pull_records_from_api_response(api_data: dict, max_date: datetime):
     """Pull the usable records from the API response"""
@@ -86,14 +58,22 @@ def pull_records_from_api_response(api_data: dict, max_date: datetime):
         
     return api_records
     
-def pull_data_from_api(api_resp, api_url, api_params, api_headers, max_date = None):
-    """If successful 200 status code, pull data from api until no records are left"""
+def pull_data_from_api(api_resp, api_url, api_params, api_headers, max_date = None,
+                       record_order = None, stale_page_limit = 1):
+    """If successful 200 status code, pull data from api until no records are left,
+    or until stale_page_limit pages in a row have nothing newer than max_date when
+    the endpoint returns its newest records first (record_order = 'descending')"""
     api_pull_complete = False
     has_next_page = True
     
-    api_data = api_resp.json()
+    api_data = decode_response(api_resp)
     
     api_results  = []
+
+    if record_order is None:
+        record_order = get_record_order(api_url)
+    stopper = StalePageStopper(max_date, record_order, stale_page_limit)
+    has_next_page = not stopper.check(api_data['testResults'], api_data['pagination']['hasNextPage'])
     
     # in case we get a 504 timeout error
     error_dict = {}
@@ -123,10 +103,15 @@ def pull_data_from_api(api_resp, api_url, api_params, api_headers, max_date = No
                 return api_results, error_dict
                 
             else:
-                api_data = resp.json()
+                api_data = decode_response(resp)
+                stop = stopper.check(api_data['testResults'], api_data['pagination']['hasNextPage'])
                 api_records = pull_records_from_api_response(api_data, max_date)
                 api_results.extend(api_records)
-                has_next_page = api_data['pagination']['hasNextPage']
+                has_next_page = api_data['pagination']['hasNextPage'] and not stop
+
+    if stopper.stopped_early_:
+        logging.info(f"Stopped paginating after {stopper.num_stale_pages_} stale pages, "
+                     f"{stopper.num_pages_skipped_} page(s) not requested")
                 
     return api_results, error_dict
                             
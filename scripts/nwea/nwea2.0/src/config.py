@@ -50,6 +50,50 @@ data_cols_config = {
     'accommodations': 'ACCOMMODATIONS'
 }
 
+# nested fields of a test result and the columns they're flattened into
+json_cols_config = {
+    "items": {
+        "col_mapping": {
+            "shown": "ITEMS_SHOWN",
+            "correct": "ITEMS_CORRECT",
+            "total": "ITEMS_TOTAL",
+        },
+    },
+    "norms": {
+        # reference and type aren't needed
+        "col_mapping": {"percentile": "NORMS_PERCENTILE"},
+        "explode_col": True,
+    },
+    "quantile": {
+        "col_mapping": {
+            "score": "QUANTILE_SCORE",
+            "maximum": "QUANTILE_MAX",
+            "minimum": "QUANTILE_MIN",
+            "range": "QUANTILE_RANGE",
+            "original": "QUANTILE_ORIGINAL",
+        },
+    },
+    "instructionalAreas": {
+        "col_mapping": {
+            "instructionalAreaBid": "INSTRUCTIONAL_AREA_BID",
+            "instructionalAreaName": "INSTRUCTIONAL_AREA_NAME",
+            "score": "INSTRUCTIONAL_AREA_SCORE",
+            "standardError": "INSTRUCTIONAL_AREA_STD_ERR",
+            "scoreLow": "INSTRUCTIONAL_AREA_LOW",
+            "scoreHigh": "INSTRUCTIONAL_AREA_HIGH",
+        },
+        "explode_col": True,
+    },
+    "lexile": {
+        "col_mapping": {
+            "score": "LEXILE_SCORE",
+            "min": "LEXILE_MIN",
+            "max": "LEXILE_MAX",
+            "range": "LEXILE_RANGE",
+        },
+    },
+}
+
 student_cols_config = {
     'dateOfBirth': 'DATE_OF_BIRTH',
     'districtBid': 'DISTRICT_BID',
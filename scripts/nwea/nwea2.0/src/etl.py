@@ -1,34 +1,43 @@
 """Functions to help with ETL process"""
 from ast import parse
-import multiprocessing
+import json
 import shutil
+import sys
 import time
 
 from prefect import task
-import requests
 from tqdm import tqdm
 from src.api import (
     pull_data_from_api,
     generate_api_header,
+    refresh_api_header,
     connect_to_api,
 )
 from src.env_config import *
-from src.config import data_cols_config, student_cols_config
+sys.path.append(ROOT_DIR)
+from etl.connectors._cache import response_cache
+from etl.connectors._http import session_pool
+from etl.connectors._json import decode_response
+from etl.connectors._ratelimit import rate_limiter
+from etl.connectors._retry import retry_policy
+from etl.connectors._utils import filter_based_on_max_dates as _filter_based_on_max_dates
+from etl.connectors._utils import is_datetime as _is_datetime
+from etl.connectors.nwea import STUDENT_FIELDS, NWEAStudentConnector
+from etl.orchestrators._journal import RunJournal
+from etl.transformers._compile import compile_projection, projected_columns
+from etl.transformers.dataframe_transformers import MultiJSONFlattener
+from etl.transformers._utils import apply_eval, parse_literals
+from src.config import data_cols_config, json_cols_config, student_cols_config
 from src.validation import *
 import dask.dataframe as dd
 
+# the rate limiter paces these threads, so there only needs to be enough of
+# them to keep the learned rate busy while requests are in flight
+STUDENT_PULL_THREADS = 32
 
 
 
 
-def apply_eval(series_val):
-    """Helper function to apply eval to a series value"""
-    if type(series_val) in [str, bytes]:
-        return eval(series_val)
-    elif type(series_val) in [list, dict]:
-        return series_val
-    return None
-
 
 def is_datetime_with_datetime_lib(value):
     """Check if value is a datetime object using datetime library"""
@@ -53,8 +62,8 @@ def is_datetime_with_pandas(value):
 
 
 def is_datetime(value):
-    """Check if value is a datetime object"""
-    return is_datetime_with_datetime_lib(value) or is_datetime_with_pandas(value)
+    """Check if value is a datetime object, with the format cached for cutoff dates"""
+    return _is_datetime(value, source="nwea", field="max_date")
 
 
 def normalize_json_col(
@@ -69,9 +78,8 @@ def normalize_json_col(
     # touching the original data could disrupt later operations
     data_copy = data.copy(deep=True)
 
-    # unnormalized columns are sometimes strings, so eval them
-    # this step is slow, best to try and replace
-    data_copy[json_col] = data_copy[json_col].apply(apply_eval)
+    # unnormalized columns are sometimes strings, so parse them
+    data_copy[json_col] = parse_literals(data_copy[json_col])
 
     if explode_col:
         # must ignore index to match against original dataset
@@ -112,18 +120,8 @@ def filter_based_on_max_dates(
 ) -> list:
     """Filter result set based off of max date currently in results data"""
 
-    # format date so you can compare it
-    max_date = pd.to_datetime(max_date).to_pydatetime()
-    max_date = max_date.date()
-
-    results = []
-    for result in result_set:
-        date_string = format_date_string(result[date_col])
-        result[date_col] = convert_str_to_date(date_string)
-        if result[date_col].date() > max_date:
-            results.append(result)
-
-    return results
+    # the whole page is parsed and compared at once, by calendar day
+    return _filter_based_on_max_dates(result_set, max_date, date_col, by_date=True)
 
 
 def format_date_string(date_string: str) -> str:
@@ -152,14 +150,18 @@ def get_max_date_from_results(result_set: list) -> datetime:
     """pull max date from the modifiedDateTime key in NWEA result set"""
     return max(result["modifiedDateTime"] for result in result_set)
 
-def filter_columns(data: list, columns: list = [
+# fields of a test result loaded into the database
+ASSESSMENT_COLUMNS = [
     'testResultBid', 'studentBid', 'schoolBid', 'termBid', 'subjectArea', 
     'grade', 'testName', 'testKey', 'testType', 'growthEventYn', 'duration', 
     'status', 'rit', 'standardError', 'ritScoreHigh', 'ritScoreLow', 'items', 
     'quantile','lexile', 'responseDisengagedPercentage', 'impactOfDisengagement', 
     'administrationStartDateTime', 'administrationEndDateTime', 
     'modifiedDateTime','instructionalAreas', 'accommodations', 'norms'
-]):
+]
+
+
+def filter_columns(data: list, columns: list = ASSESSMENT_COLUMNS):
     
     """Filters json data based on required columns"""
 
@@ -200,9 +202,14 @@ def run_assessment_data_pull(
     cutoffs_path: str = None,
     bids_path: str = SCHOOL_BIDS_PATH,
     api_url: str = "https://api.nwea.org/test-results/v1/growth",
+    resume: bool = False,
 ) -> None:
-    """Final function to connect to the API & pull the data"""
+    """Final function to connect to the API & pull the data, with resume=True
+    an unfinished run carries on, skipping the bids it already finished"""
     
+    # a new job starts with the full retry budget of the shared policy
+    retry_policy.reset_budget()
+
     # keep track of time elapsed in function
     start_time = time.time()
     api_headers = generate_api_header()
@@ -229,18 +236,32 @@ def run_assessment_data_pull(
     bids = pd.read_csv(bids_path)
     bids = bids["schoolBid"].values.tolist()
     
-    # if /temp directory exists, remove it
-    if os.path.exists(TEMP_FILE_PATH):
+    # every finished or failed bid is journaled as soon as it's done, the
+    # journal sits next to /temp since every file in /temp is concatenated
+    journal = RunJournal(f"{TEMP_FILE_PATH.rstrip('/')}_journal.db", resume=resume)
+    # compiled once, missing fields are filled in while the records are flattened
+    json_flattener = MultiJSONFlattener(
+        json_cols_config,
+        columns=[col for col in ASSESSMENT_COLUMNS if col not in json_cols_config],
+        column_defaults={"accommodations": []},
+    )
+
+    # if /temp directory exists, remove it, unless the run is resumed
+    if os.path.exists(TEMP_FILE_PATH) and not journal.resumed_:
         shutil.rmtree(TEMP_FILE_PATH)
         
 
     # create empty directory for temp files
     os.makedirs(TEMP_FILE_PATH, exist_ok=True)
 
+    if journal.resumed_:
+        logging.info(f"Resuming run, skipping {len(journal.finished())} finished bids")
+
     errors = []
     # pull data from api for each bid in the list
-    for bid in tqdm(bids[0:]):
+    for bid in tqdm(journal.pending(bids)):
         logging.info(f"Pulling data for school with bid: {bid}")
+        journal.start(bid)
 
         # check if bid exists in current data
         now = datetime.now()
@@ -268,10 +289,11 @@ def run_assessment_data_pull(
                     "date": now,
                 }
             )
+            journal.fail(bid, api_resp.status_code)
             continue
 
         elif api_resp.status_code == 401:
-            api_headers = generate_api_header()
+            api_headers = refresh_api_header(api_headers)
             api_resp = connect_to_api(
                 api_url=api_url, api_headers=api_headers, api_params=api_params
             )
@@ -285,6 +307,7 @@ def run_assessment_data_pull(
                         "date": now,
                     }
                 )
+                journal.fail(bid, api_resp.status_code)
                 continue
 
         api_data, error_dict = pull_data_from_api(
@@ -294,6 +317,9 @@ def run_assessment_data_pull(
             api_params=api_params,
             max_date=max_date,
         )
+        # only a failed pull is pulled again on resume, error_dict is
+        # reused for the later checks, which journal their own failures
+        pull_error = error_dict
         if len(error_dict) > 0:
             # some functions don't return a school-bid, so add it here
             if error_dict.get("school-bid") == None:
@@ -303,165 +329,16 @@ def run_assessment_data_pull(
 
 
         if len(api_data) > 0:
-            
-            filtered_api_data=filter_columns(api_data)
-            api_data = pd.DataFrame(filtered_api_data)
-            logging.info(f"Found {api_data.shape[0]} new rows for bid: {bid}")
+            logging.info(f"Found {len(api_data)} new rows for bid: {bid}")
 
             # if set to True, will abort this session
             has_formatting_errors = False
 
-            # normalize json columns
-            try:
-                if "items" in api_data.columns:
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="items",
-                        new_col_names=None,
-                        # this argument is necessary for non-exploded columns
-                        col_mapping={
-                            "shown": "ITEMS_SHOWN",
-                            "correct": "ITEMS_CORRECT",
-                            "total": "ITEMS_TOTAL",
-                        },
-                        explode_col=False,
-                    )
-                else:
-                    api_data["ITEMS_SHOWN"] = None
-                    api_data["ITEMS_CORRECT"] = None
-                    api_data["ITEMS_TOTAL"] = None
-            except Exception as e:
-                logging.error(f"Error normalizing json for column 'items': {e}")
-                error_dict = {
-                    "school-bid": bid,
-                    "error-type": "json-normalization-error",
-                    "message": e,
-                    "date": now,
-                }
-                errors.append(error_dict)
-                has_formatting_errors = True
-
-            try:
-                if "norms" in api_data.columns:
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="norms",
-                        new_col_names=[
-                            "NORMS_PERCENTILE",
-                            "NORMS_REFERENCE",
-                            "NORMS_TYPE",
-                        ],
-                        explode_col=True,
-                    )
-                else:
-                    api_data["NORMS_PERCENTILE"] = None
-                    api_data["NORMS_REFERENCE"] = None
-                    api_data["NORMS_TYPE"] = None
-
-                # don't need this column
-                # might be a faster way to do this
-                api_data.drop(["NORMS_REFERENCE", "NORMS_TYPE"], axis=1, inplace=True)
-            except Exception as e:
-                logging.error(f"Error normalizing json for column 'norms': {e}")
-                error_dict = {
-                    "school-bid": bid,
-                    "error-type": "json-normalization-error",
-                    "message": e,
-                    "date": now,
-                }
-                errors.append(error_dict)
-                has_formatting_errors = True
-
-            try:
-                if "quantile" in api_data.columns:
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="quantile",
-                        new_col_names=None,
-                        col_mapping={
-                            "score": "QUANTILE_SCORE",
-                            "maximum": "QUANTILE_MAX",
-                            "minimum": "QUANTILE_MIN",
-                            "range": "QUANTILE_RANGE",
-                            "original": "QUANTILE_ORIGINAL",
-                        },
-                        explode_col=False,
-                    )
-                else:
-                    api_data["QUANTILE_SCORE"] = None
-                    api_data["QUANTILE_MAX"] = None
-                    api_data["QUANTILE_MIN"] = None
-                    api_data["QUANTILE_RANGE"] = None
-                    api_data["QUANTILE_ORIGINAL"] = None
-            except Exception as e:
-                logging.error(f"Error normalizing json for column 'quantile': {e}")
-                error_dict = {
-                    "school-bid": bid,
-                    "error-type": "json-normalization-error",
-                    "message": e,
-                    "date": now,
-                }
-                errors.append(error_dict)
-                has_formatting_errors = True
-
-            try:
-                if "instructionalAreas" in api_data.columns and api_data['instructionalAreas'].notna().all():
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="instructionalAreas",
-                        new_col_names=[
-                            "INSTRUCTIONAL_AREA_BID",
-                            "INSTRUCTIONAL_AREA_NAME",
-                            "INSTRUCTIONAL_AREA_SCORE",
-                            "INSTRUCTIONAL_AREA_STD_ERR",
-                            "INSTRUCTIONAL_AREA_LOW",
-                            "INSTRUCTIONAL_AREA_HIGH",
-                        ],
-                        explode_col=True,
-                    )
-                else:
-                    api_data["INSTRUCTIONAL_AREA_BID"] = None
-                    api_data["INSTRUCTIONAL_AREA_NAME"] = None
-                    api_data["INSTRUCTIONAL_AREA_SCORE"] = None
-                    api_data["INSTRUCTIONAL_AREA_STD_ERR"] = None
-                    api_data["INSTRUCTIONAL_AREA_LOW"] = None
-                    api_data["INSTRUCTIONAL_AREA_HIGH"] = None
-                    api_data.drop('instructionalAreas', axis=1, inplace=True)
-            
-            except Exception as e:
-                logging.error(
-                    f"Error normalizing json for column 'instructionalAreas': {e}"
-                )
-                error_dict = {
-                    "school-bid": bid,
-                    "error-type": "json-normalization-error",
-                    "message": e,
-                    "date": now,
-                }
-                errors.append(error_dict)
-                has_formatting_errors = True
-
+            # flatten every json column while building the dataframe
             try:
-                if "lexile" in api_data.columns:
-                    api_data = normalize_json_col(
-                        api_data,
-                        json_col="lexile",
-                        new_col_names=None,
-                        col_mapping={
-                            "score": "LEXILE_SCORE",
-                            "min": "LEXILE_MIN",
-                            "max": "LEXILE_MAX",
-                            "range": "LEXILE_RANGE",
-                        },
-                        explode_col=False,
-                    )
-                else:
-                    api_data["LEXILE_SCORE"] = None
-                    api_data["LEXILE_MIN"] = None
-                    api_data["LEXILE_MAX"] = None
-                    api_data["LEXILE_RANGE"] = None
+                api_data = json_flattener.transform(api_data)
             except Exception as e:
-                logging.error(f"Error normalizing json for column 'lexile': {e}")
+                logging.error(f"Error normalizing json columns: {e}")
                 error_dict = {
                     "school-bid": bid,
                     "error-type": "json-normalization-error",
@@ -469,7 +346,8 @@ def run_assessment_data_pull(
                     "date": now,
                 }
                 errors.append(error_dict)
-                has_formatting_errors = True
+                journal.fail(bid, "json-normalization-error")
+                continue
 
             api_data.drop_duplicates(
                 subset=["testResultBid", "modifiedDateTime", "INSTRUCTIONAL_AREA_BID"],
@@ -509,6 +387,7 @@ def run_assessment_data_pull(
                 has_formatting_errors = True
 
             if has_formatting_errors:
+                journal.fail(bid, "formatting-error")
                 continue
 
             # make sure column values are in the correct order
@@ -519,6 +398,18 @@ def run_assessment_data_pull(
             # export data to csv file
             api_data.to_csv(f"{TEMP_FILE_PATH}/{bid}.csv", index=False)
 
+        # a bid that stopped part way is pulled again on resume
+        if len(pull_error) > 0:
+            journal.fail(bid, pull_error.get("message"))
+        elif len(api_data) > 0:
+            journal.complete(
+                bid,
+                output=f"{TEMP_FILE_PATH}/{bid}.csv",
+                watermark=api_data["MODIFIED_DATE_TIME"].max(),
+            )
+        else:
+            journal.complete(bid)
+
     # concatenate all files in temp system into one file
     nwea_records = pd.concat(
         [pd.read_csv(f"{TEMP_FILE_PATH}/{file}") for file in os.listdir(TEMP_FILE_PATH)]
@@ -552,6 +443,8 @@ def run_assessment_data_pull(
 
     logging.info(f"Data pull complete. {nwea_records.shape[0]} records added")
     logging.info(f"Time elapsed: {end_time - start_time} seconds")
+    session_pool.log_stats()
+    response_cache.log_stats()
 
     # export meta data to csv file
     meta_data = pd.DataFrame([meta_info])
@@ -560,6 +453,10 @@ def run_assessment_data_pull(
     meta_data.to_csv(f"{META_DATA_FILE_PATH}/meta_data_{timestamp}.csv", index=False)
     logging.info("Meta data exported to csv file, process completed")
 
+    # the next run starts from scratch
+    journal.finish()
+    journal.close()
+
 
  
 '''get the last pull data'''
@@ -692,8 +589,10 @@ def get_student_bids():
         logging.error("No new assessment data available.")
         return pd.DataFrame()  # Return an empty DataFrame if no data
        
-    # Collect STUDENT_BIDs to get student data
-    student_bids = assessment_data[['STUDENT_BID']].drop_duplicates()
+    # Collect STUDENT_BIDs to get student data, with their school so whole
+    # school rosters can be pulled at once
+    student_cols = [col for col in ['STUDENT_BID', 'SCHOOL_BID'] if col in assessment_data.columns]
+    student_bids = assessment_data[student_cols].drop_duplicates(subset=['STUDENT_BID'])
     
     timestamp = datetime.now().strftime("%d-%m-%Y")
 
@@ -709,9 +608,10 @@ def get_student_bids():
 
 
 def api_request(student_bid, api_headers):
-    """Function to handle API request for a single student."""
+    """Function to handle API request for a single student, paced by the
+    shared rate limiter, which slows down on 429 and speeds up otherwise."""
     api_url = f"https://api.nwea.org/students/v2/{student_bid}"
-    api_resp = requests.get(api_url, headers=api_headers)
+    api_resp = retry_policy.get(api_url, retry_statuses=[429, 503], headers=api_headers)
     return api_resp, student_bid
 
 
@@ -722,7 +622,7 @@ def process_student_data(student_bid, existing_students, api_headers):
         # Return the necessary data or error information
         return {
             "student_bid": student_bid,
-            "data": api_resp.json() if api_resp.status_code == 200 else None,
+            "data": decode_response(api_resp) if api_resp.status_code == 200 else None,
             "error": api_resp.status_code,
         }
 
@@ -739,13 +639,25 @@ def chunked_student_list(student_list, chunk_size=50000):
    - df as argument, when the function runs as a part of assessment ETL
 '''
 @task
-def run_student_data_pull(src=None, current_list=None, retry_count=0, max_retries=3):
+def run_student_data_pull(src=None, current_list=None, retry_count=0, max_retries=3, resume=False, journal=None):
+    ''' resume=True carries on an unfinished run, skipping the batches it already finished'''
+    if retry_count == 0:
+        ''' a new job starts with the full retry budget of the shared policy'''
+        retry_policy.reset_budget()
+    if journal is None:
+        journal = RunJournal(f"{STUDENT_TEMP_PATH.rstrip('/')}_journal.db", resume=resume)
+
     ''' Check if src is a string (assumed to be a CSV file) or a DataFrame'''
     if isinstance(src, str):
-        student_list = pd.read_csv(src)["STUDENT_BID"].values.tolist()
+        src = pd.read_csv(src)
+    ''' Assume src is a DataFrame'''
+    student_list = src["STUDENT_BID"].values.tolist()
+
+    ''' students with a known school are pulled from their school's roster'''
+    if "SCHOOL_BID" in src.columns:
+        student_schools = dict(zip(src["STUDENT_BID"], src["SCHOOL_BID"]))
     else:
-        ''' Assume src is a DataFrame'''
-        student_list = src["STUDENT_BID"].values.tolist()
+        student_schools = None
 
     ''' Only load current list if it is present'''
     if current_list is not None:
@@ -755,27 +667,29 @@ def run_student_data_pull(src=None, current_list=None, retry_count=0, max_retrie
         logging.info("No current student list provided, proceeding without filtering existing students.")
 
     # Clear the temporary directory if it's the first call
-    if retry_count == 0:
+    if retry_count == 0 and not journal.resumed_:
         if os.path.exists(STUDENT_TEMP_PATH):
             shutil.rmtree(STUDENT_TEMP_PATH)
 
         # Create empty directory for temp files
         os.makedirs(STUDENT_TEMP_PATH, exist_ok=False)
 
-    api_headers = generate_api_header()
-
-    if api_headers is None:
+    if generate_api_header() is None:
         raise ValueError("Could not generate API headers")
 
+    # threads share one token, connection pool and rate limiter, worker
+    # processes would each pace themselves and overshoot the API's limit together
+    existing_students = set(existing_students)
+    connector = NWEAStudentConnector(
+        existing_students=existing_students,
+        max_concurrency=STUDENT_PULL_THREADS,
+        student_schools=student_schools,
+        retry_policy=retry_policy,
+    )
+
     batch_number = 0
-    '''list of the required fields to get from the API'''
-    required_fields = [
-        "dateOfBirth", "districtBid", "ethnicity", "ethnicityCustom",
-        "firstName", "gender", "grade", "gradeCustom",
-        "lastName", "middleName", "schoolBid", "stateStudentId",
-        "studentBid", "studentId"
-    ]
-    
+    project_students = compile_projection(STUDENT_FIELDS)
+
     cumulated_empty_data_ids=[]
     # Process each chunk of students
     for  idx,students_chunk in enumerate(
@@ -791,25 +705,27 @@ def run_student_data_pull(src=None, current_list=None, retry_count=0, max_retrie
             logging.info(f"No new students to process, stepping over batch #{batch_number}")
             continue
 
+        # batches finished before the run was interrupted are already in the temp files
+        chunk_id = f"students_{idx}_retry_{retry_count}"
+        if chunk_id in journal.finished():
+            logging.info(f"Batch {chunk_id} finished in an earlier attempt, skipping it")
+            # its empty-data ids still need a retry
+            cumulated_empty_data_ids.extend(json.loads(journal.messages().get(chunk_id, "[]")))
+            batch_number += 1
+            continue
+        journal.start(chunk_id)
+
         logging.info(f"Processing batch #{batch_number} with {len(students_chunk)} students")
 
-        # Check if the API headers are still valid
-        test_resp = requests.get(
-            f"https://api.nwea.org/students/v2/{students_chunk[0]}", headers=api_headers
-        )
-        api_headers = generate_api_header()
-        if test_resp.status_code == 401:
-            logging.error("Got a status code 401, reconnecting to API")
-            api_headers = generate_api_header()
-        logging.info(f"Processing batch #{batch_number}")
-        with multiprocessing.Pool(processes=multiprocessing.cpu_count()) as pool:
-            results = pool.starmap(
-                process_student_data,
-                [
-                    (student_bid, existing_students, api_headers)
-                    for student_bid in students_chunk
-                ],
-            )
+        # the connector refreshes the shared token on a 401
+        results = [
+            {
+                "student_bid": student_bid,
+                "data": profile if profile is not None else '',
+                "error": status_code,
+            }
+            for student_bid, profile, status_code in connector.pull_students(students_chunk)
+        ]
         student_data_batch, errors_batch, empty_data_batch = [], [], []
 
         for result in results:
@@ -831,16 +747,20 @@ def run_student_data_pull(src=None, current_list=None, retry_count=0, max_retrie
             else:
                 data = result["data"]
                 if isinstance(data, dict):
-                    '''Retain only the required fields, adding empty strings if they are missing'''
-                    structured_data = {field: str(data.get(field, "")) for field in required_fields}
-                    student_data_batch.append(structured_data)
+                    student_data_batch.append(data)
                 
 
-        cumulated_empty_data_ids.extend([entry['STUDENT_BID'] for entry in empty_data_batch])
+        empty_data_ids = [entry['STUDENT_BID'] for entry in empty_data_batch]
+        cumulated_empty_data_ids.extend(empty_data_ids)
         
 
         batch_number += 1
-        student_data_df = pd.DataFrame(student_data_batch).rename(columns=student_cols_config)     
+        '''Retain only the required fields, adding empty strings if they are missing,
+        the projection is compiled once and the columns are named for the database'''
+        student_data_df = pd.DataFrame.from_records(
+            project_students(student_data_batch),
+            columns=projected_columns(STUDENT_FIELDS, student_cols_config),
+        )
         temp_file_path = f"{STUDENT_TEMP_PATH}/batch_{batch_number}_retry_{retry_count}.csv"
         student_data_df.to_csv(temp_file_path, index=False, header=True)
         logging.info(f"Adding {student_data_df.shape[0]} students to the temporary files.")
@@ -851,14 +771,24 @@ def run_student_data_pull(src=None, current_list=None, retry_count=0, max_retrie
             errors_logs_file = f"{STUDENT_ERRORS_PATH}/student_errors_{timestamp}.csv"
             pd.DataFrame(errors_batch).to_csv(errors_logs_file, index=False, mode='a', header=not os.path.exists(errors_logs_file))
 
-        logging.info(f"Finished batch #{batch_number}, waiting 00 minutes")
-        time.sleep(600)
+        # the empty-data ids are journaled too, so a resumed run still retries them
+        journal.complete(chunk_id, output=temp_file_path, message=json.dumps(empty_data_ids))
+
+        logging.info(
+            f"Finished batch #{batch_number} at "
+            f"{rate_limiter.get_rate('https://api.nwea.org'):.1f} requests/second"
+        )
+
+    logging.info(f"Students served by each strategy: {connector.strategy_counts()}")
+
+    # next run starts at the rate learned in this one
+    rate_limiter.save()
 
     # Retry if needed
     if len(cumulated_empty_data_ids) > 0 and retry_count < max_retries:    
         logging.info(f"Retrying with empty data for batch #{batch_number} (attempt {retry_count + 1})")
         retry_ids=pd.DataFrame(cumulated_empty_data_ids, columns=["STUDENT_BID"])
-        run_student_data_pull(src=retry_ids, current_list=current_list, retry_count=retry_count + 1,max_retries=max_retries)
+        run_student_data_pull(src=retry_ids, current_list=current_list, retry_count=retry_count + 1,max_retries=max_retries, journal=journal)
        
     
     #Concatenate all non-empty temporary CSVs
@@ -877,6 +807,11 @@ def run_student_data_pull(src=None, current_list=None, retry_count=0, max_retrie
     timestamp = datetime.now().strftime("%d-%m-%Y")
     nwea_student_records.to_csv(f"{STUDENT_DATA_PATH}/student_data_{timestamp}.csv", index=False)
     logging.info("All data appended to the actual data file after max retries.")
+
+    # the next run starts from scratch, retries finish with the first call
+    if retry_count == 0:
+        journal.finish()
+        journal.close()
     
     
     
@@ -1,13 +1,5 @@
 import pandas as pd
-
-
-def apply_eval(series_val):
-    """Helper function to apply eval to a series value"""
-    if type(series_val) in [str, bytes]:
-        return eval(series_val)
-    elif type(series_val) in [list, dict]:
-        return series_val
-    return None
+from etl.transformers._utils import apply_eval, parse_literals
 
 
 def normalize_json_col(
@@ -22,9 +14,8 @@ def normalize_json_col(
     # touching the original data could disrupt later operations
     data_copy = data.copy(deep=True)
 
-    # unnormalized columns are sometimes strings, so eval them
-    # this step is slow, best to try and replace
-    data_copy[json_col] = data_copy[json_col].apply(apply_eval)
+    # unnormalized columns are sometimes strings, so parse them
+    data_copy[json_col] = parse_literals(data_copy[json_col])
     print("dsdsdsdssdsf",data_copy[json_col])
     print(data_copy.columns)
 
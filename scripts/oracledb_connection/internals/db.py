@@ -1,5 +1,6 @@
 from contextlib import contextmanager
 import logging
+import os
 import oracledb
 from  .env_config import (
     ORACLE_DB_PASSWORD,
@@ -7,11 +8,13 @@ from  .env_config import (
     ORACLE_DB_USERNAME,
 )
 from pandas import DataFrame
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.pool import NullPool
 import cx_Oracle
 import pandas as pd
 oracle_pool = None
+oracle_engine = None
+oracle_engine_pid = None
 
 
 # def init_oracle_db():
@@ -19,13 +22,7 @@ oracle_pool = None
 #         oracledb.init_oracle_client(lib_dir=ORACLE_DRIVER_PATH)
 #     except Exception as e:
 #         print(e)
-@contextmanager
-def __get_oracle_connection():
-    # con = oracledb.connect(
-    #     user=ORACLE_DB_USERNAME,
-    #     password=ORACLE_DB_PASSWORD,
-    #     dsn=ORACLE_DB_TNS,
-    # )
+def __get_oracle_pool():
     global oracle_pool
     if not oracle_pool:
         oracle_pool = oracledb.create_pool(
@@ -37,7 +34,17 @@ def __get_oracle_connection():
             increment=5,        #1
             getmode=oracledb.POOL_GETMODE_NOWAIT,
         )
-    con = oracle_pool.acquire()
+    return oracle_pool
+
+
+@contextmanager
+def __get_oracle_connection():
+    # con = oracledb.connect(
+    #     user=ORACLE_DB_USERNAME,
+    #     password=ORACLE_DB_PASSWORD,
+    #     dsn=ORACLE_DB_TNS,
+    # )
+    con = __get_oracle_pool().acquire()
     try:
         yield con
     except Exception as e:
@@ -48,14 +55,122 @@ def __get_oracle_connection():
 
 
 
-def execute_query_to_df(sql: str):
-    engine = create_engine(
-    f"oracle://{ORACLE_DB_USERNAME}:{ORACLE_DB_PASSWORD}@{ORACLE_DB_TNS}/?encoding=UTF-8&nencoding=UTF-8",
-    max_identifier_length=128,pool_size=10, max_overflow=20
-)
-    df = pd.read_sql_query(sql, engine)
-    engine.dispose()
-    return df
+def __get_engine():
+    """
+    Get the SQLAlchemy engine for the data warehouse, creating it the first
+    time.  The engine and its connection pool are reused by every query and
+    insert in the process instead of being created and disposed each call.
+    """
+    global oracle_engine, oracle_engine_pid
+    if oracle_engine is None or oracle_engine_pid != os.getpid():
+        # a forked worker can't share its parent's connections
+        if oracle_engine is not None:
+            oracle_engine.dispose(close=False)
+        oracle_engine = create_engine(
+            f"oracle://{ORACLE_DB_USERNAME}:{ORACLE_DB_PASSWORD}@{ORACLE_DB_TNS}/?encoding=UTF-8&nencoding=UTF-8",
+            max_identifier_length=128, pool_size=10, max_overflow=20, pool_pre_ping=True
+        )
+        event.listen(oracle_engine, "before_cursor_execute", __set_cursor_fetch_sizes)
+        oracle_engine_pid = os.getpid()
+    return oracle_engine
+
+
+def __set_cursor_fetch_sizes(conn, cursor, statement, parameters, context, executemany):
+    options = context.execution_options if context is not None else {}
+    for option in ["arraysize", "prefetchrows"]:
+        if option in options and hasattr(cursor, option):
+            setattr(cursor, option, options[option])
+
+
+def execute_query_to_df(sql: str, columns: list = None, use_arrow: bool = False):
+    """
+    Run a query and return the results as a dataframe
+    Arguments:
+    sql, str:  query to run
+    columns, list:  only return these columns, selected in the database
+    use_arrow, bool:  build the dataframe from Arrow arrays fetched straight
+        from the cursor, instead of row by row through SQLAlchemy
+    Returns:
+    pd.DataFrame
+    """
+    if use_arrow:
+        return execute_query_to_arrow(sql, columns=columns).to_pandas()
+    return pd.read_sql_query(__select_columns(sql, columns), __get_engine())
+
+
+def execute_query_to_arrow(sql: str, columns: list = None, arraysize: int = 10000):
+    """
+    Run a query and return the results as an Arrow table.  Rows are fetched
+    into columnar buffers by the driver, so no Python object is made per row
+    Arguments:
+    sql, str:  query to run
+    columns, list:  only return these columns, selected in the database
+    arraysize, int:  number of rows fetched from the database per round trip
+    Returns:
+    pyarrow.Table
+    """
+    import pyarrow as pa
+
+    with __get_oracle_pool().acquire() as connection:
+        odf = connection.fetch_df_all(
+            statement=__select_columns(sql, columns), arraysize=arraysize
+        )
+        return __normalize_column_names(pa.table(odf))
+
+
+def execute_query_to_arrow_batches(sql: str, columns: list = None, batch_size: int = 100000):
+    """
+    Stream the results of a query as Arrow tables of batch_size rows
+    Arguments:
+    sql, str:  query to run
+    columns, list:  only return these columns, selected in the database
+    batch_size, int:  number of rows in each table
+    Returns:
+    generator of pyarrow.Table
+    """
+    import pyarrow as pa
+
+    with __get_oracle_pool().acquire() as connection:
+        for odf in connection.fetch_df_batches(
+            statement=__select_columns(sql, columns), size=batch_size
+        ):
+            yield __normalize_column_names(pa.table(odf))
+
+
+def __select_columns(sql: str, columns: list = None) -> str:
+    if not columns:
+        return sql
+    return f"SELECT {', '.join(columns)} FROM ({sql})"
+
+
+def __normalize_column_names(table):
+    # match SQLAlchemy, which returns case insensitive Oracle names in lower case
+    return table.rename_columns(
+        [name.lower() if name.isupper() else name for name in table.column_names]
+    )
+
+
+def execute_query_to_df_chunks(
+    sql: str, chunksize: int = 50000, arraysize: int = 10000, prefetchrows: int = 10000
+):
+    """
+    Stream the results of a query with a server-side cursor
+    Arguments:
+    sql, str:  query to run
+    chunksize, int:  number of rows in each dataframe
+    arraysize, int:  number of rows fetched from the database per round trip
+    prefetchrows, int:  number of rows returned with the query's first round trip
+    Returns:
+    generator of dataframes
+    """
+    with __get_engine().connect() as connection:
+        connection = connection.execution_options(
+            stream_results=True,
+            max_row_buffer=max(chunksize, arraysize),
+            arraysize=arraysize,
+            prefetchrows=prefetchrows,
+        )
+        yield from pd.read_sql_query(sql, connection, chunksize=chunksize)
 
 def execute_oracle_query(sql: str):
     with __get_oracle_connection() as connection:
@@ -101,13 +216,8 @@ def insert_dataframe(
     dtype=None,
    # method="multi",
 ):
-    engine = create_engine(
-    f"oracle://{ORACLE_DB_USERNAME}:{ORACLE_DB_PASSWORD}@{ORACLE_DB_TNS}/?encoding=UTF-8&nencoding=UTF-8",
-    max_identifier_length=128,
-)
-
     print(f"Value of if_exists: {if_exists}")
-    with engine.connect() as connection:
+    with __get_engine().connect() as connection:
         df.to_sql(
             table_name,
             connection,